@@ -0,0 +1,196 @@
+"""
+Minimal stand-ins for the discord.py objects the tick pipeline touches, so it can run without a live guild.
+"""
+import random
+from datetime import datetime, timedelta
+
+from discord import ChannelType, Status
+
+from src.Id.Categories import TrackedCategories, UniversityCategory
+from src.Id.GuildId import GuildId
+
+# share of the members that is online
+ONLINE_SHARE = 0.33
+# share of the members that is in a voice channel at the same time, even in the evening only a few percent are
+VOICE_SHARE = 0.05
+
+GAME_NAMES = ["Counter-Strike 2", "League of Legends", "Minecraft", "Rocket League", "Valorant", "Dota 2",
+              "Apex Legends", "Overwatch 2", "Fortnite", "Rainbow Six Siege", "Factorio", "Satisfactory", ]
+
+
+class FakeAsset:
+
+    def __init__(self, url: str):
+        self.url = url
+
+
+class FakeActivity:
+
+    def __init__(self, name: str, applicationId: int | None):
+        self.name = name
+        self.application_id = applicationId
+
+
+class FakeVoiceState:
+
+    def __init__(self, channel: "FakeVoiceChannel", rng: random.Random):
+        self.channel = channel
+        self.self_mute = rng.random() < 0.2
+        self.self_deaf = rng.random() < 0.05
+        self.self_stream = rng.random() < 0.1
+        self.self_video = rng.random() < 0.05
+        # server mutes are rare enough to be ignored
+        self.mute = False
+        self.deaf = False
+
+
+class FakeMember:
+
+    def __init__(self, id: int, guild: "FakeGuild"):
+        self.id = id
+        self.name = f"member{id}"
+        self.display_name = f"Member {id}"
+        self.display_avatar = FakeAsset(f"https://cdn.example/avatars/{id}.png")
+        self.avatar = self.display_avatar
+        self.bot = False
+        self.guild = guild
+        self.joined_at = datetime.now() - timedelta(days=400)
+        self.status = Status.offline
+        self.voice: FakeVoiceState | None = None
+        self.activities: list[FakeActivity] = []
+
+    async def send(self, *args, **kwargs):
+        pass
+
+    def __eq__(self, other):
+        return isinstance(other, FakeMember) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeVoiceChannel:
+    type = ChannelType.voice
+
+    def __init__(self, id: int, category: "FakeCategory"):
+        self.id = id
+        self.name = f"voice{id}"
+        self.category = category
+        self.category_id = category.id
+        self.members: list[FakeMember] = []
+
+    @property
+    def voice_states(self) -> dict[int, FakeVoiceState]:
+        return {member.id: member.voice for member in self.members}
+
+
+class FakeTextChannel:
+    type = ChannelType.text
+
+    def __init__(self, id: int):
+        self.id = id
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class FakeCategory:
+
+    def __init__(self, id: int):
+        self.id = id
+        self.voice_channels: list[FakeVoiceChannel] = []
+
+
+class FakeGuild:
+
+    def __init__(self):
+        self.id = GuildId.GUILD_KVGG.value
+        self.categories: list[FakeCategory] = []
+        self.members: list[FakeMember] = []
+        self.membersById: dict[int, FakeMember] = {}
+
+    @property
+    def voice_channels(self) -> list[FakeVoiceChannel]:
+        return [channel for category in self.categories for channel in category.voice_channels]
+
+    @property
+    def channels(self) -> list[FakeVoiceChannel]:
+        return self.voice_channels
+
+    def get_member(self, id: int) -> FakeMember | None:
+        return self.membersById.get(id)
+
+    def get_role(self, id: int):
+        return None
+
+    def get_channel(self, id: int) -> "FakeTextChannel":
+        return FakeTextChannel(id)
+
+
+class FakeClient:
+
+    def __init__(self, guild: FakeGuild):
+        self.guild = guild
+        self.textChannel = FakeTextChannel(1)
+
+    def get_guild(self, id: int) -> FakeGuild:
+        return self.guild
+
+    def get_all_members(self):
+        yield from self.guild.members
+
+    def get_all_channels(self):
+        yield from self.guild.voice_channels
+
+    def get_channel(self, id: int):
+        return self.textChannel
+
+    def get_user(self, id: int) -> FakeMember | None:
+        return self.guild.get_member(id)
+
+
+def createGuild(memberCount: int,
+                channelCount: int,
+                maxActivities: int,
+                seed: int = 0,
+                voiceShare: float = VOICE_SHARE, ) -> FakeClient:
+    """
+    Builds a guild with the given amount of members and tracked voice channels. About a third of the members is
+    online, voiceShare of them in a voice channel, and every member has between zero and maxActivities activities.
+
+    :param memberCount: Amount of members
+    :param channelCount: Amount of tracked voice channels
+    :param maxActivities: Maximum amount of activities per member
+    :param seed: Seed of the random generator to get comparable guilds across runs
+    :param voiceShare: Share of all members in a voice channel
+    """
+    rng = random.Random(seed)
+    guild = FakeGuild()
+    categoryIds = [category.value for category in TrackedCategories] + [UniversityCategory.UNIVERSITY.value]
+    guild.categories = [FakeCategory(categoryId) for categoryId in categoryIds]
+
+    for index in range(channelCount):
+        category = guild.categories[index % len(guild.categories)]
+        category.voice_channels.append(FakeVoiceChannel(10_000 + index, category))
+
+    channels = guild.voice_channels
+
+    for index in range(memberCount):
+        member = FakeMember(100_000_000_000_000_000 + index, guild)
+
+        if rng.random() < voiceShare:
+            channel = rng.choice(channels)
+            member.voice = FakeVoiceState(channel, rng)
+            channel.members.append(member)
+
+        # members in a voice channel are online
+        if member.voice or rng.random() < ONLINE_SHARE:
+            member.status = Status.online
+
+        member.activities = [FakeActivity(name, GAME_NAMES.index(name) + 1 if rng.random() < 0.5 else None)
+                             for name in rng.sample(GAME_NAMES, rng.randint(0, maxActivities))]
+
+        guild.members.append(member)
+        guild.membersById[member.id] = member
+
+    return FakeClient(guild)
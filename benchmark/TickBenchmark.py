@@ -0,0 +1,215 @@
+"""
+Benchmarks the tick pipeline (minutely job, relations and midnight statistics) against synthetic guilds.
+
+Runs against a throwaway SQLite database by default, pass --database-url / --async-database-url to use a local
+MySQL instead. Both run the whole pipeline, the upserts use ON CONFLICT on SQLite and ON DUPLICATE KEY on MySQL.
+Results are written as JSON to compare them across commits:
+
+    python -m benchmark.TickBenchmark --members 50 500 5000 --channels 5 50 --output benchmark.json
+
+By default 5 % of the members are in a voice channel, --voice-share simulates busier evenings.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+basepath = Path(__file__).parent.parent
+
+
+def parseArguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark of the tick pipeline with synthetic guilds")
+    parser.add_argument("--members", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--channels", type=int, nargs="+", default=[5, 50])
+    parser.add_argument("--max-activities", type=int, default=3)
+    parser.add_argument("--voice-share", type=float, default=None, help="share of the members in a voice channel")
+    parser.add_argument("--ticks", type=int, default=3, help="measured minutely ticks per guild")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured ticks creating the lazy rows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--async-database-url", default=None)
+    parser.add_argument("--output", default="benchmark.json")
+
+    return parser.parse_args()
+
+
+arguments = parseArguments()
+
+if not arguments.database_url:
+    databaseFile = Path(tempfile.gettempdir()).joinpath("kvgg_benchmark.db")
+    arguments.database_url = f"sqlite:///{databaseFile}"
+    arguments.async_database_url = arguments.async_database_url or f"sqlite+aiosqlite:///{databaseFile}"
+
+# must be set before the DatabaseManager creates its engines
+os.environ["DATABASE_URL"] = arguments.database_url
+os.environ["ASYNC_DATABASE_URL"] = arguments.async_database_url or ""
+os.environ.setdefault("PRODUCTION", "0")
+
+from sqlalchemy import BigInteger, insert  # noqa: E402
+from sqlalchemy.ext.compiler import compiles  # noqa: E402
+
+
+# SQLite only autoincrements INTEGER PRIMARY KEY columns
+# noinspection PyUnusedLocal
+@compiles(BigInteger, "sqlite")
+def _compileBigIntegerForSqlite(type_, compiler, **kwargs):
+    return "INTEGER"
+
+
+from benchmark.FakeDiscord import createGuild, VOICE_SHARE  # noqa: E402
+from src.DiscordParameters.QuestParameter import QuestDates  # noqa: E402
+from src.Entities.BaseClass import Base, getTables  # noqa: E402
+from src.Entities.Counter.Entity.Counter import Counter  # noqa: E402
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser  # noqa: E402
+from src.Entities.Quest.Entity.Quest import Quest  # noqa: E402
+from src.Manager import DatabaseManager  # noqa: E402
+from src.Manager.DatabaseManager import getEngine, getSession, trackStatements  # noqa: E402
+from src.Manager.DiscordUserIdManager import DiscordUserIdManager  # noqa: E402
+from src.Manager.GameCatalogueManager import GameCatalogueManager  # noqa: E402
+from src.Manager.LeaderboardManager import LeaderboardManager  # noqa: E402
+from src.Manager.MinutelyJobRunner import MinutelyJobRunner  # noqa: E402
+from src.Manager.StatisticManager import StatisticManager  # noqa: E402
+from src.Services import QuestService  # noqa: E402
+from src.Services.QuestService import QuestType  # noqa: E402
+from src.Services.RelationService import RelationService  # noqa: E402
+
+if arguments.voice_share is None:
+    arguments.voice_share = VOICE_SHARE
+
+logger = logging.getLogger("KVGG_BOT")
+
+
+class _ErrorCounter(logging.Handler):
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord):
+        self.count += 1
+
+
+errorCounter = _ErrorCounter()
+logger.addHandler(errorCounter)
+
+
+def _importEntities():
+    """
+    Imports all entities, so the schema can be created from their metadata.
+    """
+    for path in basepath.joinpath("src/Entities").glob("*/Entity/*.py"):
+        __import__(".".join(path.relative_to(basepath).with_suffix("").parts))
+
+
+def _resetDatabase(client):
+    Base.metadata.drop_all(getEngine(), tables=getTables())
+    Base.metadata.create_all(getEngine(), tables=getTables())
+
+    session = getSession()
+    session.execute(insert(Quest), [{"time_type": time.value,
+                                     "type": questType.value,
+                                     "description": f"{questType.value} ({time.value})",
+                                     "value_to_reach": 60 * 24, } for time in QuestDates for questType in QuestType])
+    session.execute(insert(Counter).values(name="felix", description="Felix-Counter"))
+    session.execute(insert(DiscordUser), [{"guild_id": str(member.guild.id),
+                                           "user_id": str(member.id),
+                                           "username": member.display_name,
+                                           "discord_name": member.name,
+                                           "created_at": datetime.now(),
+                                           "university_time_online": 0, }
+                                          for member in client.get_all_members()])
+    session.commit()
+    session.close()
+
+    # process-wide caches would otherwise carry ids of the previous database
+    DiscordUserIdManager().ids.clear()
+    GameCatalogueManager()._reset()
+    LeaderboardManager()._reset()
+    QuestService.questStates.clear()
+    QuestService.dirtyQuests.clear()
+
+
+async def _measure(name: str, function) -> dict:
+    errorsBefore = errorCounter.count
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    with trackStatements(name) as tracker:
+        await function()
+
+    wallTime = time.perf_counter() - start
+    allocatedBytes, peakBytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"wall_seconds": round(wallTime, 6),
+            "statements": tracker.statements,
+            "statement_seconds": round(tracker.duration, 6),
+            "allocated_bytes": allocatedBytes,
+            "peak_allocated_bytes": peakBytes,
+            "errors": errorCounter.count - errorsBefore, }
+
+
+async def runScenario(members: int, channels: int) -> dict:
+    client = createGuild(members, channels, arguments.max_activities, arguments.seed, arguments.voice_share)
+    _resetDatabase(client)
+
+    runner = MinutelyJobRunner(client)
+    relationService = RelationService(client)
+    statisticManager = StatisticManager(client)
+
+    for _ in range(arguments.warmup):
+        await runner.run()
+
+    ticks = [await _measure("benchmark_minutely", runner.run) for _ in range(arguments.ticks)]
+    relations = await _measure("benchmark_relations", relationService.increaseAllRelations)
+    midnight = await _measure("benchmark_midnight_statistics", statisticManager.midnightJob)
+
+    result = {"members": members,
+              "voice_channels": channels,
+              "members_in_voice": sum(len(channel.members) for channel in client.guild.voice_channels),
+              "activities": sum(len(member.activities) for member in client.get_all_members()),
+              "minutely": ticks,
+              "relations": relations,
+              "midnight_statistics": midnight, }
+
+    print(f"{members} members, {channels} channels: "
+          f"{min(tick['wall_seconds'] for tick in ticks) if ticks else 0:.3f} s / tick, "
+          f"{ticks[-1]['statements'] if ticks else 0} statements", file=sys.stderr)
+
+    return result
+
+
+def _getCommit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=basepath, text=True).strip()
+    except Exception:
+        return None
+
+
+async def main():
+    _importEntities()
+
+    results = [await runScenario(members, channels) for members in arguments.members for channels in arguments.channels]
+
+    with open(arguments.output, "w") as file:
+        json.dump({"commit": _getCommit(),
+                   "created_at": datetime.now().isoformat(),
+                   "database": DatabaseManager.getEngine().dialect.name,
+                   "max_activities": arguments.max_activities,
+                   "voice_share": arguments.voice_share,
+                   "seed": arguments.seed,
+                   "scenarios": results, }, file, indent=4)
+
+    print(f"wrote results to {arguments.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,12 @@
+# the place of a member is counted with COUNT(*) WHERE counter_id = ? AND value > ?, which this index answers without
+# reading the other counters
+ALTER TABLE counter_discord_mapping
+    ADD INDEX counter_discord_mapping_counter_value (counter_id, value);
+
+# places of every member per counter, members with the same value share the place
+CREATE OR REPLACE VIEW counter_ranking AS
+SELECT cdm.counter_id,
+       cdm.discord_id,
+       cdm.value,
+       RANK() OVER (PARTITION BY cdm.counter_id ORDER BY cdm.value DESC) AS place
+FROM counter_discord_mapping cdm;
@@ -0,0 +1,15 @@
+# open and closed voice, stream, webcam, mute and activity sessions, written from the voice state and presence
+# updates; credited_until is the point up to which the minutely job credited the interval
+CREATE TABLE presence_interval
+(
+    id             BIGINT       NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    discord_id     BIGINT       NOT NULL,
+    type           VARCHAR(20)  NOT NULL,
+    reference      VARCHAR(255) NULL,
+    started_at     DATETIME     NOT NULL,
+    ended_at       DATETIME     NULL,
+    credited_until DATETIME     NOT NULL,
+    CONSTRAINT presence_interval_discord_id_fk FOREIGN KEY (discord_id) REFERENCES discord (id),
+    INDEX presence_interval_open (discord_id, type, ended_at),
+    INDEX presence_interval_credited (ended_at, credited_until)
+);
@@ -0,0 +1,40 @@
+# relations are increased with INSERT ... ON DUPLICATE KEY UPDATE, therefore every couple may only have one row per
+# type, saved with the smaller id first
+
+START TRANSACTION;
+
+# merge couples that were saved in both directions into the row with the smaller id first
+UPDATE discord_user_relation AS kept
+    INNER JOIN discord_user_relation AS mirrored
+    ON kept.discord_user_id_1 = mirrored.discord_user_id_2
+        AND kept.discord_user_id_2 = mirrored.discord_user_id_1
+        AND kept.type <=> mirrored.type
+SET kept.value      = kept.value + mirrored.value,
+    kept.created_at = LEAST(kept.created_at, mirrored.created_at)
+WHERE kept.discord_user_id_1 < kept.discord_user_id_2;
+
+DELETE mirrored
+FROM discord_user_relation AS mirrored
+         INNER JOIN discord_user_relation AS kept
+                    ON kept.discord_user_id_1 = mirrored.discord_user_id_2
+                        AND kept.discord_user_id_2 = mirrored.discord_user_id_1
+                        AND kept.type <=> mirrored.type
+WHERE mirrored.discord_user_id_1 > mirrored.discord_user_id_2;
+
+# swap the remaining rows with the bigger id first
+CREATE TEMPORARY TABLE swapped_relation AS
+SELECT id, discord_user_id_1, discord_user_id_2
+FROM discord_user_relation
+WHERE discord_user_id_1 > discord_user_id_2;
+
+UPDATE discord_user_relation AS relation
+    INNER JOIN swapped_relation AS swapped ON relation.id = swapped.id
+SET relation.discord_user_id_1 = swapped.discord_user_id_2,
+    relation.discord_user_id_2 = swapped.discord_user_id_1;
+
+DROP TEMPORARY TABLE swapped_relation;
+
+COMMIT;
+
+ALTER TABLE discord_user_relation
+    ADD UNIQUE INDEX discord_user_relation_couple_type (discord_user_id_1, discord_user_id_2, type);
@@ -0,0 +1,4 @@
+# active boosts store the value of xp_boost_minutes at their activation instead of counting down every minute,
+# existing boosts have no activation value and count from 0
+ALTER TABLE experience
+    ADD COLUMN xp_boost_minutes BIGINT NOT NULL DEFAULT 0 AFTER active_xp_boosts;
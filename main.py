@@ -32,9 +32,12 @@ from src.Logger.CustomFormatterFile import CustomFormatterFile
 from src.Logger.FileAndConsoleHandler import FileAndConsoleHandler
 from src.Manager.BackgroundServiceManager import BackgroundServices
 from src.Manager.CommandManager import CommandService, Commands
-from src.Manager.DatabaseManager import getSession
+from src.Manager.DatabaseManager import getSession, trackStatements
 from src.Manager.DatabaseRefreshManager import DatabaseRefreshService
 from src.Manager.DiscordRoleManager import DiscordRoleManager
+from src.Manager.DiscordUserIdManager import DiscordUserIdManager
+from src.Manager.PlotManager import PlotManager
+from src.Manager.PresenceLedgerManager import PresenceLedgerManager
 from src.Manager.QuotesManager import QuotesManager
 from src.Manager.VoiceStateUpdateManager import VoiceStateUpdateService
 from src.Services.MemeService import MemeService
@@ -95,6 +98,7 @@ class MyClient(discord.Client):
         self.processUserInput = ProcessUserInput(self)
         self.databaseRefreshService = DatabaseRefreshService(self)
         self.discordRoleManager = DiscordRoleManager()
+        self.presenceLedgerManager = PresenceLedgerManager()
 
         thread = threading.Thread(target=FastAPI.run_server)
         thread.daemon = True
@@ -109,6 +113,9 @@ class MyClient(discord.Client):
     async def on_member_update(self, before: Member, after: Member):
         self.discordRoleManager.updateRoleOfMember(before, after)
 
+    async def on_presence_update(self, before: Member, after: Member):
+        self.presenceLedgerManager.recordPresenceUpdate(before, after)
+
     async def on_member_join(self, member: Member):
         """
         Automatically adds the roles Uni and Mitglieder to newly joined members of the guild.
@@ -164,6 +171,8 @@ class MyClient(discord.Client):
         from sqlalchemy import null
         from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
 
+        DiscordUserIdManager().removeMember(payload.user.id)
+
         if not (session := getSession()):
             logger.error("couldn't set member as inactive because no session was fetched")
 
@@ -322,9 +331,10 @@ class MyClient(discord.Client):
             return
 
         try:
-            await self.processUserInput.raiseMessageCounter(message.author, message.channel)
-            await self.quotesManager.checkForNewQuote(message)
-            await self.memeService.checkIfMemeAndPrepareReactions(message)
+            with trackStatements("on_message"):
+                await self.processUserInput.raiseMessageCounter(message.author, message.channel)
+                await self.quotesManager.checkForNewQuote(message)
+                await self.memeService.checkIfMemeAndPrepareReactions(message)
         except Exception as error:
             logger.error("failure to run message functions", exc_info=error)
 
@@ -363,7 +373,8 @@ class MyClient(discord.Client):
         """
         logger.debug("received voice state update")
 
-        await self.voiceStateUpdateService.handleVoiceStateUpdate(member, voiceStateBefore, voiceStateAfter)
+        with trackStatements("on_voice_state_update"):
+            await self.voiceStateUpdateService.handleVoiceStateUpdate(member, voiceStateBefore, voiceStateAfter)
 
 
 # reads the token
@@ -372,6 +383,9 @@ token = ReadParameters.getParameter(ReadParameters.Parameters.DISCORD_TOKEN)
 # sets the intents of the client to the default ones
 intents = discord.Intents.all()
 
+# the plot worker is forked before the client starts the thread of the API
+PlotManager().startWorker()
+
 # instantiates the client
 client = MyClient(intents=intents)
 
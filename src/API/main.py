@@ -1,11 +1,16 @@
-import html
+import ipaddress
 import logging
+import re
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 
 from src.Helper.ReadParameters import getParameter, Parameters
+from src.Manager.MetricManager import MetricManager
+from src.Manager.PlotManager import PLOT_FILE_PATTERN, getLatestPlotFileName
 
 # from src.Manager.BackgroundServiceManager import minutelyErrorCount
 
@@ -15,6 +20,19 @@ sendLog = False
 app = FastAPI()
 basepath = Path(__file__).parent.parent.parent
 
+# plots are named after the hash of their content, so a cached image never becomes stale
+PLOT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+PLOT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# names of the plots in links sent before the plots were named after their content, e.g. top_5_activities.png
+LEGACY_PLOT_NAME_PATTERN = re.compile(r"^[a-z0-9_]+\.png$")
+# the latest version behind such a link changes, so clients have to revalidate it with its ETag
+LEGACY_PLOT_CACHE_CONTROL = "no-cache"
+
+# file name -> content, least recently used first
+cachedPlots: OrderedDict[str, bytes] = OrderedDict()
+cachedPlotBytes = 0
+cachedPlotsLock = threading.Lock()
+
 
 def run_server():
     import uvicorn
@@ -29,24 +47,130 @@ def run_server():
                 ssl_keyfile=basepath.joinpath("Web/selfsigned.key").absolute().as_posix())
 
 
-@app.get("/backend/discord/plots/{name}/{random}")
-def get_plot(name: str, random):
+def _getCachedPlot(name: str) -> bytes | None:
     """
-    Returns the given image
+    Returns the content of the given plot from memory or disk, None if it does not exist
 
-    :param name: Name of the picture to export
-    :param random: Random number to avoid discord caching => ignore it
+    :param name: Content addressed file name of the plot
     """
-    name = html.escape(name)
+    global cachedPlotBytes
+
+    with cachedPlotsLock:
+        if name in cachedPlots:
+            cachedPlots.move_to_end(name)
+
+            return cachedPlots[name]
+
     path: Path = basepath.joinpath(f"data/plots/{name}")
 
-    if not path.exists():
-        logger.warning(f"plot at path: {path} does not exist")
+    try:
+        content = path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+    if len(content) > PLOT_CACHE_MAX_BYTES:
+        return content
+
+    with cachedPlotsLock:
+        if name not in cachedPlots:
+            cachedPlots[name] = content
+            cachedPlotBytes += len(content)
+
+        while cachedPlotBytes > PLOT_CACHE_MAX_BYTES:
+            _, evicted = cachedPlots.popitem(last=False)
+            cachedPlotBytes -= len(evicted)
+
+    return content
+
+
+def _matchesETag(ifNoneMatch: str | None, eTag: str) -> bool:
+    if not ifNoneMatch:
+        return False
+
+    # weak comparison, as required for If-None-Match
+    return any(tag.strip() in ("*", eTag, f"W/{eTag}") for tag in ifNoneMatch.split(","))
+
+
+def _servePlot(name: str, request: Request, cacheControl: str) -> Response:
+    """
+    Returns the given image with its hash as ETag, If-None-Match is answered with 304.
+
+    :param name: Content addressed file name of the plot
+    :param request: Request to answer If-None-Match with 304
+    :param cacheControl: Cache-Control header of the response
+    """
+    if not (match := PLOT_FILE_PATTERN.match(name)):
+        logger.warning("requested invalid plot name")
+
+        return JSONResponse(status_code=404, content={"message": "plot not found"})
+
+    eTag = f'"{match.group("hash")}"'
+    headers = {"ETag": eTag, "Cache-Control": cacheControl}
+
+    # the name contains the hash of the content, a client sending it already has the image
+    if _matchesETag(request.headers.get("if-none-match"), eTag):
+        return Response(status_code=304, headers=headers)
+
+    if (content := _getCachedPlot(name)) is None:
+        logger.warning(f"plot {name} does not exist")
 
         return JSONResponse(status_code=404, content={"message": f"{name} plot not found"})
 
     logger.debug("successfully returned plot")
-    return FileResponse(path, media_type="image/png")
+    return Response(content=content, media_type="image/png", headers=headers)
+
+
+@app.get("/backend/discord/plots/{name}")
+def get_plot(name: str, request: Request):
+    """
+    Returns the given image. The name contains the hash of the image, so it can be cached forever.
+
+    :param name: Name of the picture to export, e.g. top_5_activities-<hash>.png
+    :param request: Request to answer If-None-Match with 304
+    """
+    return _servePlot(name, request, PLOT_CACHE_CONTROL)
+
+
+@app.get("/backend/discord/plots/{name}/{random}")
+def get_latest_plot(name: str, random, request: Request):
+    """
+    Returns the latest version of the given image for links of already sent messages.
+
+    :param name: Name of the picture without hash, e.g. top_5_activities.png
+    :param random: Random number to avoid discord caching => ignore it
+    :param request: Request to answer If-None-Match with 304
+    """
+    if (not LEGACY_PLOT_NAME_PATTERN.match(name)
+            or not (fileName := getLatestPlotFileName(basepath.joinpath(f"data/plots/{name}")))):
+        logger.warning(f"plot {name} does not exist")
+
+        return JSONResponse(status_code=404, content={"message": "plot not found"})
+
+    return _servePlot(fileName, request, LEGACY_PLOT_CACHE_CONTROL)
+
+
+def _isLocalRequest(request: Request) -> bool:
+    if not request.client:
+        return False
+
+    try:
+        return ipaddress.ip_address(request.client.host).is_loopback
+    except ValueError:
+        return False
+
+
+@app.get("/metrics")
+def get_metrics(request: Request):
+    """
+    Returns the latency and query metrics of the background jobs in the Prometheus text format. The API is public,
+    so they are only returned to requests from the host itself.
+    """
+    if not _isLocalRequest(request):
+        logger.warning(f"denied metrics to {request.client.host if request.client else 'unknown client'}")
+
+        return JSONResponse(status_code=404, content={"message": "not found"})
+
+    return PlainTextResponse(MetricManager().render(), media_type="text/plain; version=0.0.4")
 
 # @app.get("/health")
 # def root():
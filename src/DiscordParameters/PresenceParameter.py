@@ -0,0 +1,33 @@
+from enum import Enum
+
+
+class PresenceType(Enum):
+    # in a voice channel of the tracked categories
+    ONLINE = "online"
+    # in a voice channel of the university category
+    UNIVERSITY = "university"
+    STREAM = "stream"
+    WEBCAM = "webcam"
+    MUTE = "mute"
+    FULL_MUTE = "full_mute"
+    # playing a game or using a program, the reference is its name
+    ACTIVITY = "activity"
+
+    @classmethod
+    def getCreditedValues(cls) -> list[str]:
+        """
+        Types whose minutes are credited to the times of the DiscordUser
+        """
+        return [cls.ONLINE.value,
+                cls.UNIVERSITY.value,
+                cls.STREAM.value,
+                cls.WEBCAM.value, ]
+
+
+class PresenceParameter(Enum):
+    # seconds a tick may be late before the minutes in between count as missed
+    TICK_TOLERANCE_SECONDS = 90
+    # minutes replayed at most per interval, e.g. after the minutely job was stuck for a long time
+    MAX_REPLAYED_MINUTES = 6 * 60
+    # failed flushes of the same changes until they are written one by one and the rejected ones are dropped
+    MAX_FLUSH_ATTEMPTS = 5
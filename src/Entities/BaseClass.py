@@ -1,5 +1,13 @@
+from sqlalchemy import Table
 from sqlalchemy.orm import DeclarativeBase
 
 
 class Base(DeclarativeBase):
     pass
+
+
+def getTables() -> list[Table]:
+    """
+    Returns the tables of all imported entities without the views, those are created by the migrations.
+    """
+    return [table for table in Base.metadata.sorted_tables if not table.info.get('is_view')]
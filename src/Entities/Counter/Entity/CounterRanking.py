@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, Table
+
+from src.Entities.BaseClass import Base
+
+
+class CounterRanking(Base):
+    # view of database/migrationForCounterRanking.sql, it must not be created as a table
+    __table__ = Table('counter_ranking',
+                      Base.metadata,
+                      Column('counter_id', Integer, primary_key=True),
+                      Column('discord_id', Integer, primary_key=True),
+                      Column('value', Integer),
+                      Column('place', Integer),
+                      info={'is_view': True, 'read_only': True}, )
+
+    def __repr__(self):
+        return (f"CounterRanking(counter_id={self.counter_id}, discord_id={self.discord_id}, value={self.value}, "
+                f"place={self.place})")
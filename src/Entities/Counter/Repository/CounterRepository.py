@@ -1,13 +1,15 @@
 import logging
 
 from discord import Member
-from sqlalchemy import select, insert
+from sqlalchemy import select, insert, func
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
 
 from src.Entities.Counter.Entity.Counter import Counter
 from src.Entities.Counter.Entity.CounterDiscordMapping import CounterDiscordMapping
+from src.Entities.Counter.Entity.CounterRanking import CounterRanking
 from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUserId
 
 logger = logging.getLogger("KVGG_BOT")
 
@@ -20,9 +22,7 @@ def getCounterDiscordMapping(member: Member, counterName: str, session: Session)
     """
     # noinspection PyTypeChecker
     getQuery = (select(CounterDiscordMapping)
-                .where(CounterDiscordMapping.discord_id == (select(DiscordUser.id)
-                                                            .where(DiscordUser.user_id == str(member.id))
-                                                            .scalar_subquery()),
+                .where(CounterDiscordMapping.discord_id == getDiscordUserId(member),
                        CounterDiscordMapping.counter_id == (select(Counter.id)
                                                             .where(Counter.name == counterName.lower())
                                                             .scalar_subquery())))
@@ -34,9 +34,7 @@ def getCounterDiscordMapping(member: Member, counterName: str, session: Session)
         insertQuery = insert(CounterDiscordMapping).values(counter_id=(select(Counter.id)
                                                                        .where(Counter.name == counterName.lower())
                                                                        .scalar_subquery()),
-                                                           discord_id=(select(DiscordUser.id)
-                                                                       .where(DiscordUser.user_id == str(member.id))
-                                                                       .scalar_subquery()), )
+                                                           discord_id=getDiscordUserId(member), )
 
         try:
             session.execute(insertQuery)
@@ -61,3 +59,55 @@ def getCounterDiscordMapping(member: Member, counterName: str, session: Session)
         return None
 
     return counterDiscordMapping
+
+
+def getRankingPlace(counterDiscordMapping: CounterDiscordMapping, session: Session) -> int | None:
+    """
+    Returns the place of the given CounterDiscordMapping within its counter, members with the same value share the
+    place.
+
+    :return: Place starting at 1 or None
+    """
+    # noinspection PyTypeChecker
+    getQuery = (select(func.count())
+                .select_from(CounterDiscordMapping)
+                .where(CounterDiscordMapping.counter_id == counterDiscordMapping.counter_id,
+                       CounterDiscordMapping.value > counterDiscordMapping.value))
+
+    try:
+        higherValues = session.scalars(getQuery).one()
+    except Exception as error:
+        logger.error(f"couldn't fetch place of {counterDiscordMapping}", exc_info=error)
+
+        return None
+
+    return higherValues + 1
+
+
+def getTopPlacesOfCounters(session: Session, places: int = 3) -> dict[int, list[tuple[int, str, int]]] | None:
+    """
+    Fetches the top places of every counter from the counter_ranking view, members without any count are left out.
+
+    :param places: Amount of places per counter
+    :return: {counter id: [(place, username, value)]} or None
+    """
+    # noinspection PyTypeChecker
+    getQuery = (select(CounterRanking.counter_id, CounterRanking.place, DiscordUser.username, CounterRanking.value)
+                .join(DiscordUser, DiscordUser.id == CounterRanking.discord_id)
+                .where(CounterRanking.place <= places,
+                       CounterRanking.value > 0, )
+                .order_by(CounterRanking.counter_id, CounterRanking.place))
+
+    try:
+        rows = session.execute(getQuery).all()
+    except Exception as error:
+        logger.error("couldn't fetch top places of the counters", exc_info=error)
+
+        return None
+
+    topPlaces: dict[int, list[tuple[int, str, int]]] = {}
+
+    for counterId, place, username, value in rows:
+        topPlaces.setdefault(counterId, []).append((place, username, value))
+
+    return topPlaces
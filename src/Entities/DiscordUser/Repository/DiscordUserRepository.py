@@ -1,17 +1,46 @@
 import logging
 from datetime import datetime
+from functools import partial
+from typing import Iterable
 
 from discord import Member, User
-from sqlalchemy import select, insert
+from sqlalchemy import select, insert, ScalarSelect
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import MultipleResultsFound
 from sqlalchemy.orm.exc import NoResultFound
 
 from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Manager.DatabaseManager import afterCommit
+from src.Manager.DiscordUserIdManager import DiscordUserIdManager
 
 logger = logging.getLogger("KVGG_BOT")
 
 
+def _isMember(member: Member) -> bool:
+    if not member or isinstance(member, User) or member.bot:
+        logger.debug("member was None (or a bot) or not the correct format")
+
+        return False
+
+    return True
+
+
+def _getInsertQuery(member: Member):
+    # noinspection PyTypeChecker
+    return insert(DiscordUser).values(guild_id=str(member.guild.id),
+                                      user_id=str(member.id),
+                                      username=member.display_name,
+                                      discord_name=member.name,
+                                      created_at=datetime.now(), )
+
+
+def _updateQuicklyChangingAttributes(dcUserDb: DiscordUser, member: Member):
+    dcUserDb.profile_picture_discord = member.display_avatar.url
+    dcUserDb.username = member.display_name
+    dcUserDb.discord_name = member.name
+
+
 def getDiscordUser(member: Member, session: Session) -> DiscordUser | None:
     """
     Returns the user from the database.
@@ -21,9 +50,7 @@ def getDiscordUser(member: Member, session: Session) -> DiscordUser | None:
     :param session: Session of the database connection
     :return: None | Dict[Any, Any] DiscordUser
     """
-    if not member or isinstance(member, User) or member.bot:
-        logger.debug("member was None (or a bot) or not the correct format")
-
+    if not _isMember(member):
         return None
 
     # noinspection PyTypeChecker
@@ -38,39 +65,144 @@ def getDiscordUser(member: Member, session: Session) -> DiscordUser | None:
     except NoResultFound:
         logger.debug("creating new DiscordUser")
 
-        insertQuery = insert(DiscordUser).values(guild_id=str(member.guild.id),
-                                                 user_id=str(member.id),
-                                                 username=member.display_name,
-                                                 discord_name=member.name,
-                                                 created_at=datetime.now(), )
-
         try:
-            session.execute(insertQuery)
+            session.execute(_getInsertQuery(member))
+            dcUserDb = session.scalars(getQuery).one()
+
+            # the id is only known to other statements once the row is committed
+            afterCommit(session, partial(DiscordUserIdManager().addId, member.id, dcUserDb.id))
             session.commit()
         except Exception as error:
             logger.error(f"couldn't insert new DiscordUser for {member.display_name}", exc_info=error)
+            session.rollback()
 
             return None
+    except Exception as error:
+        logger.error(f"an error occurred while fetching DiscordUser for {member.display_name}", exc_info=error)
+
+        return None
+    else:
+        DiscordUserIdManager().addDiscordUser(dcUserDb)
+
+    _updateQuicklyChangingAttributes(dcUserDb, member)
+
+    return dcUserDb
+
+
+async def getDiscordUserAsync(member: Member, session: AsyncSession) -> DiscordUser | None:
+    """
+    Awaitable variant of getDiscordUser, its queries are awaited on the async engine.
+
+    :param member: Member to retrieve all data from
+    :param session: Async session of the database connection
+    :return: None | DiscordUser
+    """
+    if not _isMember(member):
+        return None
+
+    # noinspection PyTypeChecker
+    getQuery = select(DiscordUser).where(DiscordUser.user_id == str(member.id), )
+
+    try:
+        dcUserDb = (await session.scalars(getQuery)).one()
+    except MultipleResultsFound as error:
+        logger.error(f"found multiple results for {member.display_name} in database", exc_info=error)
+
+        return None
+    except NoResultFound:
+        logger.debug("creating new DiscordUser")
 
         try:
-            dcUserDb = session.scalars(getQuery).one()
+            await session.execute(_getInsertQuery(member))
+            dcUserDb = (await session.scalars(getQuery)).one()
+
+            # the id is only known to other statements once the row is committed
+            afterCommit(session.sync_session, partial(DiscordUserIdManager().addId, member.id, dcUserDb.id))
+            await session.commit()
         except Exception as error:
-            logger.error(f"couldn't fetch newly inserted DiscordUser for {member.display_name}", exc_info=error)
+            logger.error(f"couldn't insert new DiscordUser for {member.display_name}", exc_info=error)
+            await session.rollback()
 
             return None
     except Exception as error:
         logger.error(f"an error occurred while fetching DiscordUser for {member.display_name}", exc_info=error)
 
         return None
+    else:
+        DiscordUserIdManager().addDiscordUser(dcUserDb)
 
-    # update quickly changing attributes
-    dcUserDb.profile_picture_discord = member.display_avatar.url
-    dcUserDb.username = member.display_name
-    dcUserDb.discord_name = member.name
+    _updateQuicklyChangingAttributes(dcUserDb, member)
 
     return dcUserDb
 
 
+def getDiscordUsersForMembers(members: Iterable[Member], session: Session) -> dict[int, DiscordUser]:
+    """
+    Returns the users of all given members from the database, fetched with a single query and keyed by their
+    snowflake. Members without an entry yet are created one by one via getDiscordUser.
+    Unlike getDiscordUser the quickly changing attributes are not updated here.
+
+    :param members: Members to retrieve the users for, bots are ignored
+    :param session: Session of the database connection
+    :return: dict[int, DiscordUser] - Members without a (creatable) entry are missing
+    """
+    membersById: dict[int, Member] = {member.id: member for member in members
+                                      if member and not isinstance(member, User) and not member.bot}
+
+    if not membersById:
+        return {}
+
+    # noinspection PyTypeChecker
+    getQuery = select(DiscordUser).where(DiscordUser.user_id.in_([str(memberId) for memberId in membersById]))
+
+    try:
+        dcUsersDb = session.scalars(getQuery).all()
+    except Exception as error:
+        logger.error(f"couldn't fetch DiscordUsers for {len(membersById)} members", exc_info=error)
+
+        return {}
+
+    dcUsersDbById: dict[int, DiscordUser] = {}
+    duplicatedIds: set[int] = set()
+
+    for dcUserDb in dcUsersDb:
+        if (memberId := int(dcUserDb.user_id)) in dcUsersDbById:
+            logger.error(f"found multiple results for {membersById[memberId].display_name} in database")
+            duplicatedIds.add(memberId)
+
+            continue
+
+        dcUsersDbById[memberId] = dcUserDb
+
+    for memberId in duplicatedIds:
+        del dcUsersDbById[memberId]
+
+    DiscordUserIdManager().addDiscordUsers(dcUsersDbById.values())
+
+    # only new members end up here, so they can be created individually
+    for memberId, member in membersById.items():
+        if memberId in dcUsersDbById or memberId in duplicatedIds:
+            continue
+
+        if dcUserDb := getDiscordUser(member, session):
+            dcUsersDbById[memberId] = dcUserDb
+
+    logger.debug(f"fetched {len(dcUsersDbById)} DiscordUsers for {len(membersById)} members")
+
+    return dcUsersDbById
+
+
+def getDiscordUserId(member: Member | User) -> int | ScalarSelect:
+    """
+    Returns the id of the DiscordUser of the given member to bind it directly into statements. Unknown members
+    are resolved via a subquery.
+
+    :param member: Member to get the id of its DiscordUser for
+    :return: int | ScalarSelect - The id or a scalar subquery selecting it
+    """
+    return DiscordUserIdManager().getId(member.id)
+
+
 def getDiscordUserById(id: int, session: Session) -> DiscordUser | None:
     """
     Returns the user from the database by id.
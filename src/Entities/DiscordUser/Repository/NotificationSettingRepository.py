@@ -6,8 +6,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import MultipleResultsFound
 from sqlalchemy.orm.exc import NoResultFound
 
-from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
 from src.Entities.DiscordUser.Entity.NotificationSetting import NotificationSetting
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUserId
 
 logger = logging.getLogger("KVGG_BOT")
 
@@ -22,9 +22,7 @@ def getNotificationSettings(member: Member, session: Session) -> NotificationSet
     """
     # noinspection PyTypeChecker
     getQuery = (select(NotificationSetting)
-                .where(NotificationSetting.discord_id == (select(DiscordUser.id)
-                                                          .where(DiscordUser.user_id == str(member.id))
-                                                          .scalar_subquery())
+                .where(NotificationSetting.discord_id == getDiscordUserId(member)
                        )
                 )
 
@@ -40,9 +38,7 @@ def getNotificationSettings(member: Member, session: Session) -> NotificationSet
 
         # noinspection PyTypeChecker
         insertQuery = (insert(NotificationSetting)
-                       .values(discord_id=(select(DiscordUser.id)
-                                           .where(DiscordUser.user_id == str(member.id))
-                                           .scalar_subquery()),
+                       .values(discord_id=getDiscordUserId(member),
                                ))
 
         try:
@@ -72,3 +68,28 @@ def getNotificationSettings(member: Member, session: Session) -> NotificationSet
         return None
 
     return settings
+
+
+def getNotificationSettingsForUsers(discordIds: list[int], session: Session) -> dict[int, NotificationSetting]:
+    """
+    Fetches the notification settings of the given DiscordUsers with one query. Missing settings are not created
+    here, getNotificationSettings does that when the member is notified.
+
+    :param discordIds: Ids of the DiscordUsers
+    :param session: Database-Session
+    :return: dict[int, NotificationSetting] - keyed by the id of the DiscordUser, empty if an error occurred
+    """
+    if not discordIds:
+        return {}
+
+    # noinspection PyTypeChecker
+    getQuery = select(NotificationSetting).where(NotificationSetting.discord_id.in_(discordIds))
+
+    try:
+        settings = session.scalars(getQuery).all()
+    except Exception as error:
+        logger.error(f"couldn't fetch notification settings for {len(discordIds)} users", exc_info=error)
+
+        return {}
+
+    return {setting.discord_id: setting for setting in settings}
@@ -5,8 +5,8 @@ from sqlalchemy import select, insert
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
 
-from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
 from src.Entities.DiscordUser.Entity.WhatsappSetting import WhatsappSetting
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUserId
 from src.Entities.User.Entity.User import User
 
 logger = logging.getLogger("KVGG_BOT")
@@ -15,9 +15,7 @@ logger = logging.getLogger("KVGG_BOT")
 def getWhatsappSetting(member: Member, session: Session) -> WhatsappSetting | None:
     # noinspection PyTypeChecker
     getQuery = (select(WhatsappSetting)
-                .where(WhatsappSetting.discord_user_id == (select(DiscordUser.id)
-                                                           .where(DiscordUser.user_id == str(member.id))
-                                                           .scalar_subquery())))
+                .where(WhatsappSetting.discord_user_id == getDiscordUserId(member)))
 
     try:
         whatsappSetting = session.scalars(getQuery).one()
@@ -25,9 +23,7 @@ def getWhatsappSetting(member: Member, session: Session) -> WhatsappSetting | No
         # noinspection PyTypeChecker
         getUserQuery = select(User).where(User.api_key_whats_app.is_not(None),
                                           User.phone_number.is_not(None),
-                                          User.discord_user_id == (select(DiscordUser.id)
-                                                                   .where(DiscordUser.user_id == str(member.id))
-                                                                   .scalar_subquery()))
+                                          User.discord_user_id == getDiscordUserId(member))
 
         try:
             session.scalars(getUserQuery).one()
@@ -41,9 +37,7 @@ def getWhatsappSetting(member: Member, session: Session) -> WhatsappSetting | No
             return None
 
         # noinspection PyTypeChecker
-        insertQuery = insert(WhatsappSetting).values(discord_user_id=(select(DiscordUser.id)
-                                                                      .where(DiscordUser.user_id == str(member.id))
-                                                                      .scalar_subquery()), )
+        insertQuery = insert(WhatsappSetting).values(discord_user_id=getDiscordUserId(member), )
 
         try:
             session.execute(insertQuery)
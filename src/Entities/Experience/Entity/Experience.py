@@ -14,6 +14,8 @@ class Experience(Base):
     xp_boosts_inventory = Column(JSON, nullable=True)
     last_spin_for_boost = Column(DateTime, nullable=True)
     active_xp_boosts = Column(JSON, nullable=True)
+    # minutes in which active boosts were running, the remaining time of a boost is calculated with it
+    xp_boost_minutes = Column(BigInteger, default=0, nullable=False)
     last_cookie_boost = Column(DateTime, nullable=True)
     time_to_send_spin_reminder = Column(DateTime, nullable=True)
     # noinspection PyTypeChecker
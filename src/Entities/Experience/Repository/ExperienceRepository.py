@@ -1,6 +1,7 @@
 import json
 import logging
 import math
+from typing import Iterable
 
 from discord import Member
 from sqlalchemy import select, insert, null
@@ -10,7 +11,7 @@ from sqlalchemy.orm.exc import NoResultFound
 from src.DiscordParameters.AchievementParameter import AchievementParameter
 from src.DiscordParameters.ExperienceParameter import ExperienceParameter
 from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
-from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser, getDiscordUserId
 from src.Entities.Experience.Entity.Experience import Experience
 
 logger = logging.getLogger("KVGG_BOT")
@@ -28,9 +29,7 @@ def getExperience(member: Member, session: Session) -> Experience | None:
 
     # noinspection PyTypeChecker
     getQuery = (select(Experience)
-                .where(Experience.discord_user_id == (select(DiscordUser.id)
-                                                      .where(DiscordUser.user_id == str(member.id))
-                                                      .scalar_subquery()))
+                .where(Experience.discord_user_id == getDiscordUserId(member))
                 )
 
     try:
@@ -76,6 +75,44 @@ def getExperience(member: Member, session: Session) -> Experience | None:
     return xp
 
 
+def getExperiencesForMembers(members: Iterable[Member], session: Session) -> dict[int, Experience]:
+    """
+    Returns the Experiences of all given members, fetched with a single query and keyed by their snowflake.
+    Missing Experiences are created one by one via getExperience.
+
+    :param members: Members of the Experiences
+    :param session: Session of the database connection
+    :return: dict[int, Experience] - Members without a (creatable) Experience are missing
+    """
+    membersById: dict[int, Member] = {member.id: member for member in members}
+
+    if not membersById:
+        return {}
+
+    # noinspection PyTypeChecker
+    getQuery = (select(Experience, DiscordUser.user_id)
+                .join(DiscordUser, Experience.discord_user_id == DiscordUser.id)
+                .where(DiscordUser.user_id.in_([str(memberId) for memberId in membersById])))
+
+    try:
+        rows = session.execute(getQuery).all()
+    except Exception as error:
+        logger.error(f"couldn't fetch experiences for {len(membersById)} members", exc_info=error)
+
+        return {}
+
+    experiences: dict[int, Experience] = {int(userId): xp for xp, userId in rows}
+
+    for memberId, member in membersById.items():
+        if memberId in experiences:
+            continue
+
+        if xp := getExperience(member, session):
+            experiences[memberId] = xp
+
+    return experiences
+
+
 def _calculateXpBoostsFromPreviousData(dcUserDb: DiscordUser) -> str | None:
     """
     Calculates the XP-Boosts earned until now
@@ -1,123 +1,141 @@
 import logging
+from functools import partial
 
-import Levenshtein
 import discord
 from discord import Member
 from sqlalchemy import desc
 from sqlalchemy import func
 from sqlalchemy import insert
 from sqlalchemy import select
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import MultipleResultsFound
 from sqlalchemy.orm.exc import NoResultFound
 
-from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUserId
 from src.Entities.Game.Entity.DiscordGame import DiscordGame
 from src.Entities.Game.Entity.GameDiscordMapping import GameDiscordMapping
+from src.Manager.DatabaseManager import afterCommit
+from src.Manager.GameCatalogueManager import GameCatalogueManager
 
 logger = logging.getLogger("KVGG_BOT")
 
 
-def getDiscordGame(activity: discord.Activity, session: Session) -> DiscordGame | None:
-    existingIdField = True
+def _addExternalGameId(gameId: int, activity: discord.Activity, externalId: int | None, session: Session):
+    """
+    Adds the external id of the activity to the game if the game doesn't have one yet. Games with another external
+    id keep theirs, their activities are matched by name without writing anything.
+    """
+    catalogue = GameCatalogueManager()
 
-    try:
-        # noinspection PyTypeChecker
-        getQueryByID = select(DiscordGame).where(DiscordGame.external_game_id == activity.application_id, )
-    # catch AttributeError if activity has no application_id
-    except AttributeError:
-        logger.debug(f"activity {activity.name} has no application_id")
+    if not externalId or catalogue.getExternalId(gameId):
+        return
 
-        existingIdField = False
+    # registered before the commit, so the following members of the minute don't write it again. The game exists
+    # already, if the UPDATE is rolled back the external id is written again after the next load of the catalogue.
+    catalogue.setExternalId(gameId, externalId)
 
+    # dont overwrite existing external_game_id
     # noinspection PyTypeChecker
-    getQueryByName = select(DiscordGame).where(DiscordGame.name == activity.name, )
+    updateQuery = (update(DiscordGame)
+                   .where(DiscordGame.id == gameId, DiscordGame.external_game_id.is_(None))
+                   .values(external_game_id=externalId))
 
     try:
-        if not existingIdField or not activity.application_id:
-            # skip empty / non-existing application_id
-            raise NoResultFound
+        if session.execute(updateQuery).rowcount == 0:
+            return
 
-        # noinspection PyUnboundLocalVariable
-        game = session.scalars(getQueryByID).one()
-    except MultipleResultsFound as error:
-        logger.error(f"found multiple results for {activity.name}",
-                     exc_info=error, )
+        session.commit()
+    except Exception as error:
+        logger.error(f"couldn't add external_game_id {externalId} to game {activity.name}", exc_info=error)
+        session.rollback()
 
+        return
+
+    logger.debug(f"added external_game_id {externalId} to game {activity.name}")
+
+
+def getDiscordGameId(activity: discord.Activity, session: Session) -> int | None:
+    """
+    Resolves the id of the DiscordGame belonging to the activity via the GameCatalogueManager. Only unknown games
+    are inserted into the database.
+
+    :param activity: Activity to resolve the game for
+    :param session: Session of the database connection
+    :return: int | None - Id of the DiscordGame, None if it couldn't be resolved
+    """
+    catalogue = GameCatalogueManager()
+
+    if not catalogue.loaded and not catalogue.load(session):
         return None
-    except NoResultFound:
-        logger.debug(f"did not found game with external_id for {activity.name}")
 
-        try:
-            game = session.scalars(getQueryByName).one()
-        except MultipleResultsFound as error:
-            logger.error(f"found multiple results for game with name {activity.name}", exc_info=error, )
+    try:
+        externalId = activity.application_id
+    # catch AttributeError if activity has no application_id
+    except AttributeError:
+        logger.debug(f"activity {activity.name} has no application_id")
 
-            return None
-        except NoResultFound:
-            logger.debug(f"did not found game with exact name {activity.name}")
+        externalId = None
 
-            try:
-                games = session.scalars(select(DiscordGame)).all()
-            except Exception as error:
-                logger.error("couldn't fetch all games", exc_info=error)
+    if gameId := catalogue.getIdByExternalId(externalId):
+        logger.debug(f"found game with external_id {externalId}")
 
-                return None
-            else:
-                logger.debug("traversing all games for Levenshtein distance")
+        return gameId
 
-                for game in games:
-                    if Levenshtein.distance(activity.name.lower(), game.name.lower(), score_cutoff=2) <= 2:
-                        logger.debug(f"found game without name {activity.name} by Levenshtein distance")
+    if gameId := catalogue.getIdByName(activity.name):
+        logger.debug(f"found game with name {activity.name}")
+        _addExternalGameId(gameId, activity, externalId, session)
 
-                        if existingIdField and activity.application_id and not game.external_game_id:
-                            game.external_game_id = activity.application_id
+        return gameId
 
-                            session.commit()
-                            logger.debug(f"added external_game_id {activity.application_id} to game without exact name "
-                                         f"{activity.name}")
+    if gameId := catalogue.getIdBySimilarName(activity.name):
+        logger.debug(f"found game without exact name {activity.name} by Levenshtein distance")
+        _addExternalGameId(gameId, activity, externalId, session)
 
-                        # found game without an exact name
-                        return game
+        return gameId
 
-                # if we arrive here, we will have to insert a new game into the database
-                try:
-                    game = DiscordGame(name=activity.name,
-                                       external_game_id=activity.application_id if existingIdField else None, )
+    # games inserted by this transaction are added to the catalogue only once it is committed
+    # noinspection PyTypeChecker
+    getQuery = select(DiscordGame.id).where(DiscordGame.name == activity.name).limit(1)
 
-                    session.add(game)
-                    session.commit()
-                except Exception as error:
-                    logger.error(f"couldn't insert new game with name {activity.name}", exc_info=error)
-                    session.rollback()
+    try:
+        if gameId := session.scalars(getQuery).first():
+            logger.debug(f"found uncommitted game with name {activity.name}")
 
-                    return None
-                else:
-                    return game
-        else:
-            logger.debug(f"fetched game with name {activity.name}")
+            return gameId
+    except Exception as error:
+        logger.error(f"couldn't fetch game with name {activity.name}", exc_info=error)
 
-            # dont overwrite existing external_game_id
-            if existingIdField and activity.application_id and not game.external_game_id:
-                game.external_game_id = activity.application_id
+        return None
+
+    # if we arrive here, we will have to insert a new game into the database
+    try:
+        game = DiscordGame(name=activity.name, external_game_id=externalId, )
+
+        session.add(game)
+        session.flush()
 
-                session.commit()
-                logger.debug(f"added external_game_id {activity.application_id} to game without exact name "
-                             f"{activity.name}")
+        # read the id before the commit expires the object
+        gameId = game.id
+
+        # other sessions could use the id of an uncommitted game otherwise
+        afterCommit(session, partial(catalogue.addGame, gameId, activity.name, externalId))
+        session.commit()
+    except Exception as error:
+        logger.error(f"couldn't insert new game with name {activity.name}", exc_info=error)
+        session.rollback()
+
+        return None
 
-            # found game with exact name
-            return game
-    else:
-        logger.debug(f"fetched game with external_id {activity.application_id}")
+    logger.debug(f"inserted new game with name {activity.name}")
 
-        # found game with external_id
-        return game
+    return gameId
 
 
 def getGameDiscordRelation(session: Session,
                            member: Member,
                            activity: discord.Activity, ) -> GameDiscordMapping | None:
-    if not (game := getDiscordGame(activity, session)):
+    if not (gameId := getDiscordGameId(activity, session)):
         logger.error("couldn't get game")
 
         return None
@@ -125,16 +143,12 @@ def getGameDiscordRelation(session: Session,
     # noinspection PyTypeChecker
     insertQuery = insert(GameDiscordMapping).values(time_played_online=0,
                                                     time_played_offline=0,
-                                                    discord_id=(select(DiscordUser.id)
-                                                                .where(DiscordUser.user_id == str(member.id))
-                                                                .scalar_subquery()),
-                                                    discord_game_id=game.id, )
+                                                    discord_id=getDiscordUserId(member),
+                                                    discord_game_id=gameId, )
     # noinspection PyTypeChecker
     getQuery = (select(GameDiscordMapping)
-                .where(GameDiscordMapping.discord_game_id == game.id,
-                       GameDiscordMapping.discord_id == (select(DiscordUser.id)
-                                                         .where(DiscordUser.user_id == str(member.id))
-                                                         .scalar_subquery()), ))
+                .where(GameDiscordMapping.discord_game_id == gameId,
+                       GameDiscordMapping.discord_id == getDiscordUserId(member), ))
 
     try:
         relation = session.scalars(getQuery).one()
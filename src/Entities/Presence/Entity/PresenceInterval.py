@@ -0,0 +1,20 @@
+from sqlalchemy import Column, BigInteger, String, DateTime, ForeignKey
+
+from src.Entities.BaseClass import Base
+
+
+class PresenceInterval(Base):
+    __tablename__ = 'presence_interval'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    discord_id = Column(BigInteger, ForeignKey('discord.id'), nullable=False)
+    type = Column(String(20), nullable=False)
+    # channel id or name of the activity
+    reference = Column(String(255))
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime)
+    # everything before this point was credited by the minutely job
+    credited_until = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"PresenceInterval(id={self.id}, discord_id={self.discord_id}, type={self.type})"
@@ -2,10 +2,10 @@ import logging
 
 from discord import Member
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
 from src.DiscordParameters.QuestParameter import QuestDates
-from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUserId
 from src.Entities.Quest.Entity.QuestDiscordMapping import QuestDiscordMapping
 
 logger = logging.getLogger("KVGG_BOT")
@@ -14,9 +14,9 @@ logger = logging.getLogger("KVGG_BOT")
 def getQuestDiscordMapping(member: Member, session: Session) -> list[QuestDiscordMapping] | None:
     # noinspection PyTypeChecker
     getQuery = (select(QuestDiscordMapping)
-                .where(QuestDiscordMapping.discord_id == (select(DiscordUser.id)
-                                                          .where(DiscordUser.user_id == str(member.id))
-                                                          .scalar_subquery())))
+                .where(QuestDiscordMapping.discord_id == getDiscordUserId(member))
+                # quests are read after the session was closed by the quest store
+                .options(selectinload(QuestDiscordMapping.quest)))
 
     try:
         currentQuests = session.scalars(getQuery).all()
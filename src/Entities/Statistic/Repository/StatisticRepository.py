@@ -1,12 +1,12 @@
 import logging
+from collections import Counter, defaultdict
 
 from discord import Member
-from sqlalchemy import select, insert
+from sqlalchemy import select, insert, update
 from sqlalchemy.orm import Session
 
 from src.DiscordParameters.StatisticsParameter import StatisticsParameter
-from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
-from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser, getDiscordUserId
 from src.Entities.Statistic.Entity.CurrentDiscordStatistic import CurrentDiscordStatistic
 
 logger = logging.getLogger("KVGG_BOT")
@@ -18,9 +18,7 @@ def getCurrentStatisticsForUser(type: StatisticsParameter,
     # noinspection PyTypeChecker
     getQuery = (select(CurrentDiscordStatistic)
                 .where(CurrentDiscordStatistic.statistic_type == type.value,
-                       CurrentDiscordStatistic.discord_id == (select(DiscordUser.id)
-                                                              .where(DiscordUser.user_id == str(member.id))
-                                                              .scalar_subquery())))
+                       CurrentDiscordStatistic.discord_id == getDiscordUserId(member)))
 
     try:
         statistics = session.scalars(getQuery).all()
@@ -71,3 +69,84 @@ def getCurrentStatisticsForUser(type: StatisticsParameter,
             return None
 
     return list(statistics)
+
+
+def increaseStatisticsForUsers(increments: dict[StatisticsParameter, list[int]], session: Session) -> bool:
+    """
+    Increases the daily, weekly, monthly and yearly statistics of the given DiscordUsers with one UPDATE per type
+    (and amount). Missing statistics are created with a single multi-row INSERT. Nothing is committed here.
+
+    :param increments: Ids of the DiscordUsers per type of statistic, an id occurring n times is increased by n
+    :param session: Session of the database connection
+    :return: bool - Whether all increments could be written
+    """
+    expectedRows = len(StatisticsParameter.getTimeValues())
+    # type -> id -> amount to increase
+    amounts: dict[str, Counter[int]] = {type.value: Counter(ids) for type, ids in increments.items() if ids}
+    incomplete: set[int] = set()
+
+    for type, amountsById in amounts.items():
+        # group the ids by their amount, usually everyone gets increased by one
+        idsByAmount: dict[int, list[int]] = defaultdict(list)
+
+        for discordId, amount in amountsById.items():
+            idsByAmount[amount].append(discordId)
+
+        for amount, ids in idsByAmount.items():
+            # noinspection PyTypeChecker
+            updateQuery = (update(CurrentDiscordStatistic)
+                           .where(CurrentDiscordStatistic.statistic_type == type,
+                                  CurrentDiscordStatistic.discord_id.in_(ids), )
+                           .values(value=CurrentDiscordStatistic.value + amount))
+
+            try:
+                result = session.execute(updateQuery)
+            except Exception as error:
+                logger.error(f"couldn't increase {type}-statistics for {len(ids)} DiscordUsers", exc_info=error)
+
+                return False
+
+            if result.rowcount < len(ids) * expectedRows:
+                incomplete.update(ids)
+
+    if not incomplete:
+        return True
+
+    logger.debug(f"{len(incomplete)} DiscordUsers are missing statistics, creating them")
+
+    # noinspection PyTypeChecker
+    getQuery = (select(CurrentDiscordStatistic.discord_id,
+                       CurrentDiscordStatistic.statistic_type,
+                       CurrentDiscordStatistic.statistic_time, )
+                .where(CurrentDiscordStatistic.discord_id.in_(incomplete)))
+
+    try:
+        existing = set(session.execute(getQuery).all())
+    except Exception as error:
+        logger.error(f"couldn't fetch existing statistics for {len(incomplete)} DiscordUsers", exc_info=error)
+
+        return False
+
+    # the missing rows haven't been increased by the updates, so they start with the amount right away
+    values = [{"discord_id": discordId,
+               "statistic_type": type,
+               "statistic_time": time,
+               "value": amounts.get(type, {}).get(discordId, 0), }
+              for discordId in incomplete
+              for type in StatisticsParameter.getTypeValues()
+              for time in StatisticsParameter.getTimeValues()
+              if (discordId, type, time) not in existing]
+
+    if not values:
+        return True
+
+    try:
+        session.execute(insert(CurrentDiscordStatistic), values)
+    except Exception as error:
+        logger.error(f"couldn't insert {len(values)} missing statistics", exc_info=error)
+
+        return False
+
+    logger.debug(f"inserted {len(values)} missing statistics")
+
+    return True
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, DateTime, ForeignKey, String
+from sqlalchemy import Column, BigInteger, DateTime, ForeignKey, String, Index
 from sqlalchemy.orm import relationship
 
 from src.Entities.BaseClass import Base
@@ -6,6 +6,9 @@ from src.Entities.BaseClass import Base
 
 class DiscordUserRelation(Base):
     __tablename__ = 'discord_user_relation'
+    # increaseRelations upserts on it
+    __table_args__ = (Index('discord_user_relation_couple_type', 'discord_user_id_1', 'discord_user_id_2', 'type',
+                            unique=True),)
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     discord_user_id_1 = Column(BigInteger, ForeignKey('discord.id'), nullable=False)
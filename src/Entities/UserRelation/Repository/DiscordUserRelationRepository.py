@@ -1,8 +1,11 @@
 import logging
+from collections import Counter
 from datetime import datetime
 
 from discord import Member
-from sqlalchemy import select, or_, and_, insert
+from sqlalchemy import select, or_, and_, insert, tuple_
+from sqlalchemy.dialects.mysql import insert as mysqlInsert
+from sqlalchemy.dialects.sqlite import insert as sqliteInsert
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
 
@@ -53,8 +56,9 @@ def getRelationBetweenUsers(member_1: Member,
     try:
         relation = session.scalars(getQuery).one()
     except NoResultFound:
-        insertQuery = insert(DiscordUserRelation).values(discord_user_id_1=dcUserDb_1.id,
-                                                         discord_user_id_2=dcUserDb_2.id,
+        # relations are saved with the smaller id first, see increaseRelations
+        insertQuery = insert(DiscordUserRelation).values(discord_user_id_1=min(dcUserDb_1.id, dcUserDb_2.id),
+                                                         discord_user_id_2=max(dcUserDb_1.id, dcUserDb_2.id),
                                                          type=type.value,
                                                          created_at=datetime.now(), )
 
@@ -85,3 +89,80 @@ def getRelationBetweenUsers(member_1: Member,
         return None
 
     return relation
+
+
+def increaseRelations(relations: list[tuple[int, int, str]], session: Session) -> bool:
+    """
+    Increases the given relations with a single upsert, missing relations are created. MySQL uses INSERT ... ON
+    DUPLICATE KEY UPDATE, other databases (SQLite in the benchmark) INSERT ... ON CONFLICT DO UPDATE. This relies on
+    the unique index over (discord_user_id_1, discord_user_id_2, type). Nothing is committed here.
+
+    :param relations: (id of DiscordUser 1, id of DiscordUser 2, type) - a relation occurring n times is increased by n
+    :param session: The session for the database
+    :return: bool - Whether the relations were increased
+    """
+    if not relations:
+        return True
+
+    now = datetime.now()
+    # normalize the order of the users, so each couple only has one row per type
+    amounts = Counter((min(id_1, id_2), max(id_1, id_2), type) for id_1, id_2, type in relations)
+    rows = [{"discord_user_id_1": id_1,
+             "discord_user_id_2": id_2,
+             "type": type,
+             "value": amount,
+             "created_at": now, } for (id_1, id_2, type), amount in amounts.items()]
+
+    if session.get_bind().dialect.name == "mysql":
+        insertQuery = mysqlInsert(DiscordUserRelation).values(rows)
+        insertQuery = insertQuery.on_duplicate_key_update(value=DiscordUserRelation.value + insertQuery.inserted.value)
+    else:
+        insertQuery = sqliteInsert(DiscordUserRelation).values(rows)
+        insertQuery = insertQuery.on_conflict_do_update(index_elements=[DiscordUserRelation.discord_user_id_1,
+                                                                        DiscordUserRelation.discord_user_id_2,
+                                                                        DiscordUserRelation.type, ],
+                                                        set_={"value": DiscordUserRelation.value
+                                                                       + insertQuery.excluded.value})
+
+    try:
+        session.execute(insertQuery)
+    except Exception as error:
+        logger.error(f"couldn't increase {len(amounts)} relations", exc_info=error)
+
+        return False
+
+    logger.debug(f"increased {len(amounts)} relations")
+
+    return True
+
+
+def getRelationsReachingThreshold(relations: list[tuple[int, int, str]],
+                                  thresholds: dict[str, int],
+                                  session: Session) -> list[DiscordUserRelation]:
+    """
+    Returns the given relations whose value is a multiple of the threshold of their type.
+
+    :param relations: (id of DiscordUser 1, id of DiscordUser 2, type)
+    :param thresholds: Threshold per type, types without threshold are never returned
+    :param session: The session for the database
+    :return: list[DiscordUserRelation] - empty if an error occurred
+    """
+    keys = {(min(id_1, id_2), max(id_1, id_2), type) for id_1, id_2, type in relations if type in thresholds}
+
+    if not keys:
+        return []
+
+    # noinspection PyTypeChecker
+    getQuery = (select(DiscordUserRelation)
+                .where(tuple_(DiscordUserRelation.discord_user_id_1,
+                              DiscordUserRelation.discord_user_id_2,
+                              DiscordUserRelation.type, ).in_(keys),
+                       or_(*[and_(DiscordUserRelation.type == type, DiscordUserRelation.value % threshold == 0)
+                             for type, threshold in thresholds.items()])))
+
+    try:
+        return list(session.scalars(getQuery).all())
+    except Exception as error:
+        logger.error("couldn't fetch relations reaching their threshold", exc_info=error)
+
+        return []
@@ -33,6 +33,9 @@ class Parameters(Enum):
     API_PORT = 11
     WHATSAPP_API_URL = 12
     WHATSAPP_API_KEY = 13
+    DATABASE_URL = 14
+    ASYNC_DATABASE_URL = 15
+    SKIP_ZERO_STATISTICS = 16
 
 
 @functools.lru_cache(maxsize=128)
@@ -66,6 +69,12 @@ def getParameter(param: Parameters) -> Any:
             return os.getenv("WHATSAPP_API_URL")
         case Parameters.WHATSAPP_API_KEY:
             return os.getenv("WHATSAPP_API_KEY")
+        case Parameters.DATABASE_URL:
+            return os.getenv("DATABASE_URL")
+        case Parameters.ASYNC_DATABASE_URL:
+            return os.getenv("ASYNC_DATABASE_URL")
+        case Parameters.SKIP_ZERO_STATISTICS:
+            return bool(int(os.getenv("SKIP_ZERO_STATISTICS", "0")))
         case _:
             logger.error(f"parameter {param} not found")
 
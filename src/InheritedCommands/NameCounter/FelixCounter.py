@@ -5,6 +5,7 @@ from datetime import datetime
 
 from discord import Member, Client
 from sqlalchemy import null
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from src.Entities.Counter.Repository.CounterRepository import getCounterDiscordMapping
@@ -114,12 +115,16 @@ class FelixCounter(Counter):
             logger.debug(f"informed {member.display_name} about Felix-Counter ending")
 
     # noinspection PyMethodMayBeStatic
-    async def checkFelixCounterAndSendStopMessage(self, member: Member, dcUserDb: DiscordUser, session: Session):
+    async def checkFelixCounterAndSendStopMessage(self,
+                                                  member: Member,
+                                                  dcUserDb: DiscordUser,
+                                                  session: AsyncSession, ):
         """
         Check if the given DiscordUser had a Felix-Counter, if so it stops the timer
 
         :param member: Member of the counter to send the message
         :param dcUserDb: Database user of the member
+        :param session: Async session of the database connection
         :return:
         """
         logger.debug(f"checking Felix-Timer from {dcUserDb}")
@@ -137,7 +142,7 @@ class FelixCounter(Counter):
         if not invokerID:
             return
 
-        if not (invoker := getDiscordUserById(invokerID, session)):
+        if not (invoker := await session.run_sync(lambda syncSession: getDiscordUserById(invokerID, syncSession))):
             logger.error(f"couldn't fetch invoker with id {invokerID}")
             return
 
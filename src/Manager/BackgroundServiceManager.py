@@ -9,6 +9,7 @@ from discord.ext import tasks, commands
 from src.Logger.CustomFormatterFile import CustomFormatterFile
 from src.Manager.AchievementManager import AchievementService
 from src.Manager.DmManager import DmManager
+from src.Manager.MetricManager import MetricManager
 from src.Manager.MinutelyJobRunner import MinutelyJobRunner
 from src.Manager.StatisticManager import StatisticManager
 from src.Services.GameDiscordService import GameDiscordService
@@ -56,6 +57,7 @@ class BackgroundServices(commands.Cog):
         self.statisticManager = StatisticManager(self.client)
         self.gameDiscordService = GameDiscordService(self.client)
         self.dmManager = DmManager()
+        self.metricManager = MetricManager()
 
         self.minutely.start()
         logger.info("minutely-job started")
@@ -66,6 +68,9 @@ class BackgroundServices(commands.Cog):
         self.runDmManager.start()
         logger.info("dm-manager started")
 
+        self.flushQuestProgress.start()
+        logger.info("quest-flush started")
+
     def __new__(cls, *args, **kwargs):
         """
         Singleton-Pattern
@@ -95,25 +100,39 @@ class BackgroundServices(commands.Cog):
             if dmManagerErrorCount == 5:
                 logger.error("⚠️ CANCELLING DM-MANAGER FROM NOW ON ⚠️")
 
+    @tasks.loop(seconds=5)
+    async def flushQuestProgress(self):
+        """
+        Writes the quest progress collected in memory to the database every 5 seconds
+        """
+        try:
+            self.questService.flushQuestProgress()
+        except Exception as error:
+            logger.error("error while writing quest progress", exc_info=error)
+
     @tasks.loop(time=midnightTime)
     async def midnight(self):
         try:
-            await self.memeService.midnightJob()
+            with self.metricManager.measure("midnight_memes"):
+                await self.memeService.midnightJob()
         except Exception as error:
             logger.error("error while running midnight job of MemeService", exc_info=error)
 
         try:
-            await self.questService.midnightJob()
+            with self.metricManager.measure("midnight_quests"):
+                await self.questService.midnightJob()
         except Exception as error:
             logger.error("error while running midnight job of QuestService", exc_info=error)
 
         try:
-            await self.statisticManager.midnightJob()
+            with self.metricManager.measure("midnight_statistics"):
+                await self.statisticManager.midnightJob()
         except Exception as error:
             logger.error("error while running midnight job of StatisticManager", exc_info=error)
 
         try:
-            self.gameDiscordService.midnightJob()
+            with self.metricManager.measure("midnight_games"):
+                self.gameDiscordService.midnightJob()
         except Exception as error:
             logger.error("error while running midnight job of GameDiscordService", exc_info=error)
 
@@ -8,6 +8,7 @@ from discord import Client
 
 from src.Helper.SplitStringAtMaxLength import splitStringAtMaxLength
 from src.Manager.ChannelManager import ChannelService
+from src.Manager.DatabaseManager import trackStatements
 from src.Manager.QuotesManager import QuotesManager
 from src.Services.ApiServices import ApiServices
 from src.Services.CounterService import CounterService
@@ -157,6 +158,22 @@ class CommandService:
                          contextMenu: bool = False,
                          **kwargs):
         """
+        Runs the command and attributes its database statements to it
+
+        :param command: Command-type to execute
+        :param interaction: Interaction from the user to answer to
+        :param contextMenu: True if the command was called from a context menu
+        :param kwargs: Parameters of the called function
+        """
+        with trackStatements(f"command_{command.name.lower()}"):
+            await self._runCommand(command, interaction, contextMenu, **kwargs)
+
+    async def _runCommand(self,
+                          command: Commands,
+                          interaction: discord.interactions.Interaction,
+                          contextMenu: bool = False,
+                          **kwargs):
+        """
         Wrapper to use commands easily
 
         :param command: Command-type to execute
@@ -1,22 +1,191 @@
+import inspect
 import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Callable, Awaitable
 
-from sqlalchemy import create_engine, MetaData, Engine
+from sqlalchemy import create_engine, Engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import Session
 
 from src.Helper.ReadParameters import getParameter, Parameters
 
 logger = logging.getLogger("KVGG_BOT")
+# DATABASE_URL and ASYNC_DATABASE_URL replace the MySQL connection, e.g. with SQLite in the benchmark
 _engine = create_engine(
-    f'mysql+mysqlconnector://{getParameter(Parameters.DATABASE_USERNAME)}'
-    f':{getParameter(Parameters.DATABASE_PASSWORD)}'
-    f'@{getParameter(Parameters.DATABASE_HOST)}'
-    f'/{getParameter(Parameters.DATABASE_SCHEMA)}',
+    getParameter(Parameters.DATABASE_URL)
+    or f'mysql+mysqlconnector://{getParameter(Parameters.DATABASE_USERNAME)}'
+       f':{getParameter(Parameters.DATABASE_PASSWORD)}'
+       f'@{getParameter(Parameters.DATABASE_HOST)}'
+       f'/{getParameter(Parameters.DATABASE_SCHEMA)}',
     echo=False, pool_recycle=60)
-metadata = MetaData()
-metadata.reflect(bind=_engine)
+# created on first use, the async driver is only needed by the async code paths
+_asyncEngine: AsyncEngine | None = None
 
+# executions of the same statement within one operation until it is reported as a possible N+1 query
+REPEATED_STATEMENT_LIMIT = 10
+
+
+class StatementTracker:
+    """
+    Statements executed within a logical operation (command, stage of a job, event handler). Statements of nested
+    operations count for all enclosing ones as well.
+    """
+
+    def __init__(self, name: str, parent: "StatementTracker | None"):
+        self.name = name
+        self.parent = parent
+        self.statements = 0
+        self.duration = 0.0
+        self.repetitions: Counter[str] = Counter()
+
+    def add(self, statement: str, duration: float):
+        tracker = self
+        # report repetitions only once, for the innermost operation
+        reported = False
+
+        while tracker:
+            tracker.statements += 1
+            tracker.duration += duration
+            tracker.repetitions[statement] += 1
+
+            if tracker.repetitions[statement] == REPEATED_STATEMENT_LIMIT and not reported:
+                reported = True
+                logger.warning(f"statement was executed {REPEATED_STATEMENT_LIMIT} times within {tracker.name}, "
+                               f"possible N+1 query: {' '.join(statement.split())[:300]}")
+
+            tracker = tracker.parent
+
+
+_currentTracker: ContextVar[StatementTracker | None] = ContextVar("statementTracker", default=None)
+
+
+@contextmanager
+def trackStatements(name: str) -> Iterator[StatementTracker]:
+    """
+    Attributes all statements executed within the block to the given operation.
+
+    :param name: Name of the operation, e.g. "command_xp" or "on_message"
+    """
+    tracker = StatementTracker(name, _currentTracker.get())
+    token = _currentTracker.set(tracker)
+
+    try:
+        yield tracker
+    finally:
+        _currentTracker.reset(token)
+
+        if tracker.statements:
+            logger.debug(f"{name} executed {tracker.statements} statements in {tracker.duration * 1000:.1f} ms")
+
+
+@contextmanager
+def assertStatementBudget(maxStatements: int, name: str = "budget") -> Iterator[StatementTracker]:
+    """
+    Test helper: fails if the block executes more than the given amount of statements.
+
+    :param maxStatements: Maximum amount of statements the block may execute
+    :param name: Name of the operation
+    :raise AssertionError: If the budget was exceeded
+    """
+    with trackStatements(name) as tracker:
+        yield tracker
+
+    if tracker.statements > maxStatements:
+        raise AssertionError(f"{name} executed {tracker.statements} statements, but only {maxStatements} are allowed "
+                             f"(repeated: {[statement for statement, count in tracker.repetitions.items() if count > 1]})")
+
+
+# noinspection PyUnusedLocal
+def _beforeCursorExecute(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault("statementStarts", {})[id(cursor)] = time.perf_counter()
+
+
+# noinspection PyUnusedLocal
+def _afterCursorExecute(connection, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - connection.info["statementStarts"].pop(id(cursor))
+
+    if tracker := _currentTracker.get():
+        tracker.add(statement, duration)
+
+
+def _handleError(exceptionContext):
+    # after_cursor_execute isn't called for failing statements, their start would stay on the connection
+    if exceptionContext.connection is not None and exceptionContext.execution_context is not None:
+        exceptionContext.connection.info.get("statementStarts", {}).pop(id(exceptionContext.execution_context.cursor),
+                                                                        None)
+
+
+def _instrument(engine: Engine):
+    if event.contains(engine, "before_cursor_execute", _beforeCursorExecute):
+        return
+
+    event.listen(engine, "before_cursor_execute", _beforeCursorExecute)
+    event.listen(engine, "after_cursor_execute", _afterCursorExecute)
+    event.listen(engine, "handle_error", _handleError)
+
+
+_instrument(_engine)
+
+
+class _UnitOfWork:
+
+    def __init__(self, session: Session):
+        self.session = session
+        # tasks created inside the unit inherit it, so they have to notice when it is over
+        self.active = True
+
+
+_unitOfWork: ContextVar[_UnitOfWork | None] = ContextVar("unitOfWork", default=None)
+
+
+class _NestedSession:
+    """
+    Session handed out by getSession inside a unit of work. It delegates to the session of the unit, but works in
+    its own savepoint: a commit releases the savepoint and a rollback rolls back only the savepoint, so the unit
+    commits once at its boundary and a failing service doesn't undo the work of the others.
+    """
+
+    def __init__(self, session: Session):
+        self._session = session
+        self._savepoint = session.begin_nested()
+
+    def __getattr__(self, name: str):
+        return getattr(self._session, name)
+
+    def commit(self):
+        if self._savepoint.is_active:
+            self._savepoint.commit()
+
+        # services keep using their session after committing
+        self._savepoint = self._session.begin_nested()
+
+    def rollback(self):
+        logger.warning("rolling back the savepoint of a nested session, the unit of work goes on")
+
+        # the savepoint is gone if an enclosing one was rolled back in the meantime
+        if _isWithin(self._session.get_nested_transaction(), self._savepoint):
+            self._savepoint.rollback()
+
+        self._savepoint = self._session.begin_nested()
+
+    def close(self):
+        if self._savepoint.is_active:
+            self._savepoint.commit()
+
+
+def getSession(isolated: bool = False) -> Session | None:
+    """
+    Returns a session of the current unit of work or a new one if there is none.
+
+    :param isolated: Always return a new session, e.g. for objects that outlive the unit of work
+    """
+    if not isolated and (unit := _unitOfWork.get()) and unit.active:
+        # noinspection PyTypeChecker
+        return _NestedSession(unit.session)
 
-def getSession() -> Session | None:
     try:
         return Session(_engine)
     except Exception as error:
@@ -25,5 +194,213 @@ def getSession() -> Session | None:
         return None
 
 
+@contextmanager
+def unitOfWork() -> Iterator[Session | None]:
+    """
+    Opens a unit of work: every getSession within the block (including nested service calls) reuses its session
+    and transaction, which is committed at the end of the block and rolled back if the block raises. The block may
+    commit the yielded session itself, e.g. to not hold row locks across awaits. Inside an existing unit of work the
+    existing one is joined.
+    """
+    if (unit := _unitOfWork.get()) and unit.active:
+        # noinspection PyTypeChecker
+        yield _NestedSession(unit.session)
+
+        return
+
+    try:
+        # objects loaded once for the whole block stay usable after intermediate commits without reloading them
+        session = Session(_engine, expire_on_commit=False)
+    except Exception as error:
+        logger.error("could not create new Session", exc_info=error)
+
+        yield None
+
+        return
+
+    unit = _UnitOfWork(session)
+    token = _unitOfWork.set(unit)
+
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+
+        raise
+    else:
+        try:
+            session.commit()
+        except Exception as error:
+            logger.error("couldn't commit unit of work", exc_info=error)
+            session.rollback()
+    finally:
+        unit.active = False
+        _unitOfWork.reset(token)
+        session.close()
+
+
+def afterCommit(session: Session, callback: Callable[[], None]):
+    """
+    Runs the callback once the changes made so far are committed to the database, e.g. to add new rows to an
+    in-memory cache. Inside a unit of work that is the commit of the unit, not of the nested session. The callback is
+    dropped if the transaction or savepoint it was registered in is rolled back.
+
+    :param session: Session the changes were made with
+    :param callback: Called without arguments after the commit
+    """
+    if not session.in_transaction():
+        callback()
+
+        return
+
+    transaction = session.get_nested_transaction() or session.get_transaction()
+    session.info.setdefault("afterCommit", []).append((transaction, callback,))
+
+
+def _isWithin(transaction, boundary) -> bool:
+    while transaction:
+        if transaction is boundary:
+            return True
+
+        transaction = transaction.parent
+
+    return False
+
+
+def _runAfterCommit(session: Session):
+    # releasing a savepoint commits nothing yet
+    if session.in_nested_transaction():
+        return
+
+    for _, callback in session.info.pop("afterCommit", []):
+        try:
+            callback()
+        except Exception as error:
+            logger.error("error occurred while running an after commit callback", exc_info=error)
+
+
+def _dropAfterCommit(session: Session, previousTransaction):
+    if callbacks := session.info.get("afterCommit"):
+        callbacks[:] = [(transaction, callback) for transaction, callback in callbacks
+                        if not _isWithin(transaction, previousTransaction)]
+
+
+def _dropAllAfterCommit(session: Session, transaction):
+    # the transaction ended without a commit, e.g. the session was closed
+    if transaction.parent is None:
+        session.info.pop("afterCommit", None)
+
+
+event.listen(Session, "after_commit", _runAfterCommit)
+event.listen(Session, "after_soft_rollback", _dropAfterCommit)
+event.listen(Session, "after_transaction_end", _dropAllAfterCommit)
+
+
+class _StagedChanges:
+
+    def __init__(self):
+        self.changes: list[Callable[[], Awaitable[None] | None]] = []
+        # tasks created inside the block inherit it, their changes are applied right away once it is over
+        self.active = True
+
+
+_stagedChanges: ContextVar[_StagedChanges | None] = ContextVar("stagedChanges", default=None)
+
+
+@contextmanager
+def stagedChanges() -> Iterator[list[Callable[[], Awaitable[None] | None]]]:
+    """
+    Collects the changes of in-memory state (queues, leaderboards, quest progress) passed to stageChange within the
+    block instead of applying them, e.g. while a member of the minutely job works in its own savepoint. The caller
+    applies them with applyStagedChanges once the database changes of the block are kept, or discards them.
+    """
+    staged = _StagedChanges()
+    token = _stagedChanges.set(staged)
+
+    try:
+        yield staged.changes
+    finally:
+        staged.active = False
+        _stagedChanges.reset(token)
+
+
+def stageChange(change: Callable[[], Awaitable[None] | None]) -> bool:
+    """
+    Stages the given change of in-memory state if it is made within stagedChanges.
+
+    :param change: Called without arguments, may return an awaitable
+    :return: Whether the change was staged, otherwise the caller applies it right away
+    """
+    if not (staged := _stagedChanges.get()) or not staged.active:
+        return False
+
+    staged.changes.append(change)
+
+    return True
+
+
+async def applyStagedChanges(changes: list[Callable[[], Awaitable[None] | None]]):
+    """
+    Applies the changes collected by stagedChanges in the order they were made.
+    """
+    for change in changes:
+        try:
+            if inspect.isawaitable(result := change()):
+                await result
+        except Exception as error:
+            logger.error("error occurred while applying a staged change", exc_info=error)
+
+    changes.clear()
+
+
 def getEngine() -> Engine:
     return _engine
+
+
+def getAsyncEngine() -> AsyncEngine | None:
+    global _asyncEngine
+
+    if not _asyncEngine:
+        try:
+            _asyncEngine = create_async_engine(
+                getParameter(Parameters.ASYNC_DATABASE_URL)
+                or f'mysql+aiomysql://{getParameter(Parameters.DATABASE_USERNAME)}'
+                   f':{getParameter(Parameters.DATABASE_PASSWORD)}'
+                   f'@{getParameter(Parameters.DATABASE_HOST)}'
+                   f'/{getParameter(Parameters.DATABASE_SCHEMA)}',
+                echo=False, pool_recycle=60)
+        except Exception as error:
+            logger.error("could not create async engine", exc_info=error)
+
+            return None
+
+        _instrument(_asyncEngine.sync_engine)
+
+    return _asyncEngine
+
+
+def setAsyncEngine(engine: AsyncEngine):
+    """
+    Replaces the async engine, e.g. with an async SQLite engine (sqlite+aiosqlite://) in tests.
+    """
+    global _asyncEngine
+
+    _asyncEngine = engine
+    _instrument(engine.sync_engine)
+
+
+def getAsyncSession() -> AsyncSession | None:
+    """
+    Returns a new session whose queries are awaited instead of blocking the event loop. Synchronous repository
+    functions can be awaited with it via AsyncSession.run_sync.
+    """
+    if not (engine := getAsyncEngine()):
+        return None
+
+    try:
+        # objects are used after the commit, reloading them would need another await
+        return AsyncSession(engine, expire_on_commit=False)
+    except Exception as error:
+        logger.error("could not create new AsyncSession", exc_info=error)
+
+        return None
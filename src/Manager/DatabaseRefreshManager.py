@@ -1,14 +1,20 @@
 from __future__ import annotations
 
 import logging
+import time
 from datetime import datetime
 
-from discord import Client, ChannelType
-from sqlalchemy import select, null
+from discord import Client, ChannelType, VoiceChannel, VoiceState, Guild
+from sqlalchemy import select, update
 
 from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
 from src.Id.GuildId import GuildId
 from src.Manager.DatabaseManager import getSession
+from src.Manager.DiscordUserIdManager import DiscordUserIdManager
+from src.Manager.GameCatalogueManager import GameCatalogueManager
+from src.Manager.LeaderboardManager import LeaderboardManager
+from src.Manager.PresenceLedgerManager import PresenceLedgerManager
+from src.Services.GameDiscordService import GameDiscordService
 
 logger = logging.getLogger("KVGG_BOT")
 
@@ -29,6 +35,7 @@ class DatabaseRefreshService:
         :return:
         """
         logger.debug("beginning fetching data")
+        start = time.perf_counter()
 
         if not (session := getSession()):
             return
@@ -48,77 +55,89 @@ class DatabaseRefreshService:
 
             return
 
+        # fill the identity map before the commit below expires the users
+        DiscordUserIdManager().addDiscordUsers(dcUsersDb)
+
         logger.debug("comparing database against discord")
 
-        # for every user from the database
+        # one pass over the voice channels instead of searching them for every user
+        voiceStates: dict[int, tuple[VoiceChannel, VoiceState]] = {}
+
+        for channel in self.client.get_all_channels():
+            if channel.type != ChannelType.voice:
+                continue
+
+            for memberId, voiceState in channel.voice_states.items():
+                voiceStates[memberId] = (channel, voiceState)
+
+        guild = self.client.get_guild(GuildId.GUILD_KVGG.value)
+        now = datetime.now()
+        updates: list[dict] = []
+
         for user in dcUsersDb:
-            foundInChannel = False
-
-            # look in every channel
-            for channel in self.client.get_all_channels():
-                if foundInChannel:
-                    break
-
-                # filter out none voice channels
-                if channel.type != ChannelType.voice:
-                    continue
-
-                members = channel.members
-
-                # for every member in this voice channel
-                for member in members:
-                    # if the user was found, save the (new) channel id and break
-                    if member.id == int(user.user_id):
-                        user.channel_id = channel.id
-                        user.joined_at = datetime.now()
-                        voiceState = channel.voice_states[member.id]
-
-                        if voiceState.self_mute:
-                            user.muted_at = datetime.now()
-                        else:
-                            user.muted_at = null()
-
-                        if voiceState.self_deaf:
-                            user.full_muted_at = datetime.now()
-                        else:
-                            user.full_muted_at = null()
-
-                        if voiceState.self_stream:
-                            user.started_stream_at = datetime.now()
-                        else:
-                            user.started_stream_at = null()
-
-                        if voiceState.self_video:
-                            user.started_webcam_at = datetime.now()
-                        else:
-                            user.started_webcam_at = null()
-
-                        foundInChannel = True
-                        break
-
-            if not foundInChannel:
-                # overwrite last online only if user was previously in a channel
-                if user.channel_id:
-                    user.last_online = datetime.now()
-
-                user.channel_id = null()
-                user.joined_at = null()
-                user.started_stream_at = null()
-                user.started_webcam_at = null()
-                user.muted_at = null()
-                user.full_muted_at = null()
-
-            # update nick
-            if member := self.client.get_guild(GuildId.GUILD_KVGG.value).get_member(int(user.user_id)):
-                user.username = member.display_name
-                user.discord_name = member.name
+            values = self._getDesiredState(user, voiceStates.get(int(user.user_id)), guild, now)
 
+            # skip users already matching the server, e.g. everyone being offline before and after the restart
+            if any(getattr(user, column) != value for column, value in values.items()):
+                updates.append({"id": user.id, **values})
+
+        if updates:
             try:
+                # executemany per set of columns, instead of one commit per user
+                session.execute(update(DiscordUser), updates)
                 session.commit()
             except Exception as error:
-                logger.error(f"couldn't commit {user}", exc_info=error)
+                logger.error("couldn't update DiscordUsers to the current state of the server", exc_info=error)
                 session.rollback()
             else:
-                logger.debug(f"updated {user}")
+                logger.debug(f"updated {len(updates)} of {len(dcUsersDb)} DiscordUsers")
+
+        # load all games once instead of querying them for every activity
+        GameCatalogueManager().load(session)
+        # the leaderboards are kept up to date in memory from now on
+        LeaderboardManager().seed(session)
+        # close the presence intervals that ended while the bot was down
+        PresenceLedgerManager().reconcile(self.client, session)
+        # the games of members who went offline while the bot was down would stay marked as played
+        GameDiscordService.resetCurrentlyPlaying(session)
 
         session.close()
+        logger.info(f"brought {len(dcUsersDb)} DiscordUsers up to date in {time.perf_counter() - start:.2f} s")
+
+    # noinspection PyMethodMayBeStatic
+    def _getDesiredState(self,
+                         user: DiscordUser,
+                         voice: tuple[VoiceChannel, VoiceState] | None,
+                         guild: Guild | None,
+                         now: datetime, ) -> dict:
+        """
+        Returns the columns of the given user as they should be according to the server.
+
+        :param user: DiscordUser from the database
+        :param voice: Voice channel and voice state of the user, if the user is in a voice channel
+        :param guild: The guild to read the names from
+        :param now: Timestamp for everything starting now
+        """
+        # started_stream_at and started_webcam_at are not mapped, they only live on the loaded objects
+        if voice:
+            channel, voiceState = voice
+            values = {"channel_id": str(channel.id),
+                      "joined_at": now,
+                      "muted_at": now if voiceState.self_mute else None,
+                      "full_muted_at": now if voiceState.self_deaf else None, }
+        else:
+            values = {"channel_id": None,
+                      "joined_at": None,
+                      "muted_at": None,
+                      "full_muted_at": None, }
+
+            # overwrite last online only if user was previously in a channel
+            if user.channel_id:
+                values["last_online"] = now
+
+        # update nick
+        if guild and (member := guild.get_member(int(user.user_id))):
+            values["username"] = member.display_name
+            values["discord_name"] = member.name
+
+        return values
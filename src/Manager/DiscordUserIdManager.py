@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import logging
+from typing import Iterable
+
+from sqlalchemy import select, ScalarSelect
+
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+
+logger = logging.getLogger("KVGG_BOT")
+
+
+class DiscordUserIdManager:
+    """
+    Process-wide identity map from Discord snowflakes to the primary keys of their DiscordUsers, so statements can
+    bind the integer id instead of resolving it with a subquery over the string user_id.
+    """
+    _self = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton-Pattern
+        """
+        if not cls._self:
+            cls._self = super().__new__(cls)
+            cls._self.ids: dict[int, int] = {}
+            cls._self.hits = 0
+            cls._self.misses = 0
+
+        return cls._self
+
+    def addDiscordUsers(self, dcUsersDb: Iterable[DiscordUser]):
+        """
+        Remembers the ids of the given DiscordUsers.
+        """
+        for dcUserDb in dcUsersDb:
+            self.addDiscordUser(dcUserDb)
+
+        logger.debug(f"{len(self.ids)} DiscordUser ids are known")
+
+    def addDiscordUser(self, dcUserDb: DiscordUser):
+        self.addId(int(dcUserDb.user_id), dcUserDb.id)
+
+    def addId(self, memberId: int, id: int):
+        self.ids[memberId] = id
+
+    def removeMember(self, memberId: int):
+        """
+        Forgets the id of the given member, e.g. after leaving the guild.
+        """
+        self.ids.pop(memberId, None)
+
+    def getId(self, memberId: int) -> int | ScalarSelect:
+        """
+        Returns the id of the DiscordUser belonging to the given snowflake. Unknown members are resolved by the
+        database via a subquery, which works in WHERE clauses and in values() of a single statement. It must not be
+        bound as a parameter of an executemany, fetch the DiscordUser if the id isn't an int there.
+
+        :param memberId: Snowflake of the member
+        :return: int | ScalarSelect - The id or a scalar subquery selecting it
+        """
+        if (id := self.ids.get(memberId)) is not None:
+            self.hits += 1
+
+            return id
+
+        self.misses += 1
+        logger.debug(f"DiscordUser id of {memberId} is not known, using a subquery")
+
+        # noinspection PyTypeChecker
+        return select(DiscordUser.id).where(DiscordUser.user_id == str(memberId)).scalar_subquery()
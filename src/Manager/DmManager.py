@@ -1,5 +1,5 @@
 import logging
-from asyncio import Lock, Queue
+from asyncio import Lock, Queue, Semaphore, gather
 from datetime import datetime
 from typing import Tuple
 
@@ -19,6 +19,7 @@ class DmManager:
     _self = None
     messageList: dict[Member, Tuple[Queue[str], datetime,]] = {}
     waitingTime = 2  # seconds
+    maxConcurrentMessages = 10
 
     def __init__(self):
         self.lock = Lock()
@@ -43,12 +44,13 @@ class DmManager:
 
     async def sendMessages(self):
         """
-        Traverses the messageList and sends the messages to the members if the waiting time is reached
+        Traverses the messageList and sends the messages to the members if the waiting time is reached. Up to
+        maxConcurrentMessages DMs are sent at the same time, outside the lock, so new messages can be added meanwhile.
         """
-        membersToRemove = []
+        dueMessages: list[Tuple[Member, str]] = []
 
         async with self.lock:
-            for member, (queue, timeOfLastMessage,) in self.messageList.items():
+            for member, (queue, timeOfLastMessage,) in list(self.messageList.items()):
                 # declare types for IDE
                 member: Member
                 queue: Queue
@@ -64,6 +66,20 @@ class DmManager:
                 while not queue.empty():
                     message += await queue.get()
 
+                dueMessages.append((member, message,))
+
+                del self.messageList[member]
+                logger.debug(f"removed {member} from messageList")
+
+        if not dueMessages:
+            logger.debug("no messages to send")
+
+            return
+
+        semaphore = Semaphore(self.maxConcurrentMessages)
+
+        async def send(member: Member, message: str):
+            async with semaphore:
                 try:
                     await sendDM(member, message)
                 except discord.Forbidden:
@@ -71,11 +87,4 @@ class DmManager:
                 except Exception as error:
                     logger.error(f"couldn't send DM to {member.name}", exc_info=error)
 
-                membersToRemove.append(member)
-            else:
-                logger.debug("no messages to send")
-
-            for member in membersToRemove:
-                del self.messageList[member]
-
-                logger.debug(f"removed {member} from messageList")
+        await gather(*[send(member, message) for member, message in dueMessages])
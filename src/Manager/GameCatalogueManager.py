@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+
+import Levenshtein
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.Entities.Game.Entity.DiscordGame import DiscordGame
+
+logger = logging.getLogger("KVGG_BOT")
+
+# maximum Levenshtein distance between an activity and a game to be the same game
+MAX_DISTANCE = 2
+# amount of activity names whose fuzzy lookup result is remembered
+MAX_REMEMBERED_NAMES = 2048
+
+
+def normalizeName(name: str) -> str:
+    """
+    Normalizes the name of a game or activity for comparisons.
+    """
+    return name.strip().lower()
+
+
+class _BkTree:
+    """
+    BK-tree over normalized game names to find names within a small Levenshtein distance without comparing
+    against every game.
+    """
+
+    def __init__(self):
+        # node: [name, {distance: child node}]
+        self.root: list | None = None
+
+    def add(self, name: str):
+        if not self.root:
+            self.root = [name, {}]
+
+            return
+
+        node = self.root
+
+        while True:
+            distance = Levenshtein.distance(name, node[0])
+
+            if distance == 0:
+                return
+
+            if not (child := node[1].get(distance)):
+                node[1][distance] = [name, {}]
+
+                return
+
+            node = child
+
+    def search(self, name: str, maxDistance: int) -> list[tuple[int, str]]:
+        """
+        Returns all names within the given distance as (distance, name).
+        """
+        if not self.root:
+            return []
+
+        results = []
+        nodes = [self.root]
+
+        while nodes:
+            nodeName, children = nodes.pop()
+            distance = Levenshtein.distance(name, nodeName)
+
+            if distance <= maxDistance:
+                results.append((distance, nodeName))
+
+            # triangle inequality: only children within [distance - max, distance + max] can match
+            for childDistance, child in children.items():
+                if distance - maxDistance <= childDistance <= distance + maxDistance:
+                    nodes.append(child)
+
+        return results
+
+
+class GameCatalogueManager:
+    """
+    Process-wide catalogue of all DiscordGames to resolve activities without querying the database. It is loaded
+    once and kept up to date by the writes of the DiscordGameRepository.
+    """
+    _self = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton-Pattern
+        """
+        if not cls._self:
+            cls._self = super().__new__(cls)
+            cls._self._reset()
+
+        return cls._self
+
+    def _reset(self):
+        self.loaded = False
+        self.idsByExternalId: dict[int, int] = {}
+        # id -> external id stored with the game
+        self.externalIdsById: dict[int, int] = {}
+        self.idsByName: dict[str, int] = {}
+        # normalized activity name -> id of the fuzzy matched game, None if nothing matched
+        self.fuzzyResults: OrderedDict[str, int | None] = OrderedDict()
+        self.names = _BkTree()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, session: Session) -> bool:
+        """
+        (Re-)Loads all games from the database.
+
+        :param session: Session of the database connection
+        :return: bool - Whether the catalogue was loaded
+        """
+        # noinspection PyTypeChecker
+        getQuery = select(DiscordGame.id, DiscordGame.name, DiscordGame.external_game_id).order_by(DiscordGame.id)
+
+        try:
+            games = session.execute(getQuery).all()
+        except Exception as error:
+            logger.error("couldn't load games for the game catalogue", exc_info=error)
+
+            return False
+
+        self._reset()
+
+        for id, name, externalId in games:
+            self._add(id, name, externalId)
+
+        self.loaded = True
+        logger.debug(f"loaded {len(games)} games into the game catalogue")
+
+        return True
+
+    def _add(self, id: int, name: str, externalId: int | None):
+        # keep the oldest game if names or external ids are duplicated
+        if externalId:
+            self.idsByExternalId.setdefault(externalId, id)
+            self.externalIdsById.setdefault(id, externalId)
+
+        normalizedName = normalizeName(name)
+
+        if normalizedName not in self.idsByName:
+            self.idsByName[normalizedName] = id
+            self.names.add(normalizedName)
+
+    def getIdByExternalId(self, externalId: int | None) -> int | None:
+        if not externalId:
+            return None
+
+        return self.idsByExternalId.get(externalId)
+
+    def getExternalId(self, id: int) -> int | None:
+        return self.externalIdsById.get(id)
+
+    def getIdByName(self, name: str) -> int | None:
+        return self.idsByName.get(normalizeName(name))
+
+    def getIdBySimilarName(self, name: str) -> int | None:
+        """
+        Returns the id of the game with the most similar name within MAX_DISTANCE. Results, including misses, are
+        remembered until the catalogue changes.
+
+        :param name: Name of the activity
+        """
+        normalizedName = normalizeName(name)
+
+        if normalizedName in self.fuzzyResults:
+            self.fuzzyResults.move_to_end(normalizedName)
+            self.hits += 1
+
+            return self.fuzzyResults[normalizedName]
+
+        self.misses += 1
+
+        if matches := self.names.search(normalizedName, MAX_DISTANCE):
+            # the closest match wins, the oldest game on ties
+            id = min((distance, self.idsByName[matchedName]) for distance, matchedName in matches)[1]
+        else:
+            id = None
+
+        self.fuzzyResults[normalizedName] = id
+
+        if len(self.fuzzyResults) > MAX_REMEMBERED_NAMES:
+            self.fuzzyResults.popitem(last=False)
+
+        return id
+
+    def addGame(self, id: int, name: str, externalId: int | None):
+        """
+        Adds a newly inserted game to the catalogue.
+        """
+        self._add(id, name, externalId)
+
+        # a remembered miss could match the new game now
+        for remembered in [remembered for remembered, matchedId in self.fuzzyResults.items() if matchedId is None]:
+            del self.fuzzyResults[remembered]
+
+    def setExternalId(self, id: int, externalId: int):
+        """
+        Registers the external id that was added to an existing game.
+        """
+        self.idsByExternalId.setdefault(externalId, id)
+        self.externalIdsById.setdefault(id, externalId)
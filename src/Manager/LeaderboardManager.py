@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import logging
+from enum import Enum
+from functools import partial
+from typing import Hashable
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session, aliased
+
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.Game.Entity.DiscordGame import DiscordGame
+from src.Entities.Game.Entity.GameDiscordMapping import GameDiscordMapping
+from src.Entities.UserRelation.Entity.DiscordUserRelation import DiscordUserRelation
+from src.Manager.DatabaseManager import getSession, stageChange
+
+logger = logging.getLogger("KVGG_BOT")
+
+# amount of places shown on the leaderboards
+LEADERBOARD_SIZE = 5
+
+
+class LeaderboardMetric(Enum):
+    ONLINE = "online"
+    STREAM = "stream"
+    MESSAGE = "message"
+    COMMAND = "command"
+    RELATION_ONLINE = "relation_online"
+    RELATION_STREAM = "relation_stream"
+    ACTIVITIES = "activities"
+
+
+# metric -> column of DiscordUser
+USER_COLUMNS = {LeaderboardMetric.ONLINE: DiscordUser.time_online,
+                LeaderboardMetric.STREAM: DiscordUser.time_streamed,
+                LeaderboardMetric.MESSAGE: DiscordUser.message_count_all_time,
+                LeaderboardMetric.COMMAND: DiscordUser.command_count_all_time, }
+# values of the RelationTypeEnum, it can't be imported here because the RelationService imports this manager
+RELATION_TYPES = {"online": LeaderboardMetric.RELATION_ONLINE,
+                  "stream": LeaderboardMetric.RELATION_STREAM, }
+
+
+class _TopK:
+    """
+    The highest values of one metric. Values outside the top are not kept, instead the board remembers an upper
+    bound for them: the highest value below the top plus everything added since. As long as that bound stays below
+    the top, the top is exact. Otherwise, the board is dirty and has to be seeded from the database again.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        # key -> (value, label)
+        self.entries: dict[Hashable, tuple[int, str]] = {}
+        # no value outside the entries was higher than this, before adding the pending increments
+        self.floor = 0
+        # key outside the entries -> amount added since seeding
+        self.pending: dict[Hashable, int] = {}
+        self.maxPending = 0
+        self.dirty = True
+
+    def seed(self, rows: list[tuple[Hashable, int, str]]):
+        """
+        :param rows: (key, value, label) ordered descending by value, at most size + 1 rows
+        """
+        self.entries = {key: (value, label) for key, value, label in rows[:self.size]}
+        self.floor = rows[self.size][1] if len(rows) > self.size else 0
+        self.pending = {}
+        self.maxPending = 0
+        self.dirty = False
+
+    def _minimum(self) -> int:
+        # a board with free places must contain every value
+        if len(self.entries) < self.size:
+            return 0
+
+        return min(value for value, _ in self.entries.values())
+
+    def _checkBounds(self):
+        if self.maxPending and self.floor + self.maxPending > self._minimum():
+            self.dirty = True
+
+    def set(self, key: Hashable, value: int, label: str):
+        """
+        Sets the exact value of the given key.
+        """
+        if self.dirty:
+            return
+
+        if key in self.entries:
+            # something below might have overtaken it
+            if value < self.entries[key][0]:
+                self.dirty = True
+
+                return
+
+            self.entries[key] = (value, label)
+
+            return
+
+        self.pending.pop(key, None)
+
+        if len(self.entries) < self.size:
+            self.entries[key] = (value, label)
+        elif value > (minimum := self._minimum()):
+            evicted = min(self.entries, key=lambda entry: self.entries[entry][0])
+
+            del self.entries[evicted]
+            self.entries[key] = (value, label)
+            self.floor = max(self.floor, minimum)
+        else:
+            self.floor = max(self.floor, value)
+
+        self._checkBounds()
+
+    def increase(self, key: Hashable, amount: int):
+        """
+        Adds the given amount to the value of the given key, whose current value does not have to be known.
+        """
+        if self.dirty:
+            return
+
+        if key in self.entries:
+            value, label = self.entries[key]
+            self.entries[key] = (value + amount, label)
+
+            return
+
+        self.pending[key] = self.pending.get(key, 0) + amount
+        self.maxPending = max(self.maxPending, self.pending[key])
+
+        self._checkBounds()
+
+    def get(self) -> list[tuple[str, int]]:
+        """
+        :return: (label, value) ordered descending by value
+        """
+        return [(label, value) for value, label in sorted(self.entries.values(), key=lambda entry: -entry[0])]
+
+
+class LeaderboardManager:
+    """
+    Keeps the top places of every leaderboard in memory. The boards are seeded at the start and updated with the
+    same increments the minutely job, the message counter and the relations write, so a leaderboard is read
+    without querying the database.
+    """
+    _self = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton-Pattern
+        """
+        if not cls._self:
+            cls._self = super().__new__(cls)
+            cls._self._reset()
+
+        return cls._self
+
+    def _reset(self):
+        self.boards: dict[LeaderboardMetric, _TopK] = {metric: _TopK(LEADERBOARD_SIZE)
+                                                       for metric in LeaderboardMetric}
+
+    def seed(self, session: Session, metrics: list[LeaderboardMetric] | None = None) -> bool:
+        """
+        (Re-)Loads the given boards from the database, all boards by default.
+
+        :param session: The session for the database
+        :param metrics: Boards to load
+        :return: bool - Whether all boards were loaded
+        """
+        success = True
+
+        for metric in metrics or list(LeaderboardMetric):
+            try:
+                rows = session.execute(self._getSeedQuery(metric)).all()
+            except Exception as error:
+                logger.error(f"couldn't load the {metric.value} leaderboard", exc_info=error)
+                success = False
+
+                continue
+
+            if metric in USER_COLUMNS:
+                self.boards[metric].seed([(id, value or 0, username) for id, value, username in rows])
+            elif metric == LeaderboardMetric.ACTIVITIES:
+                self.boards[metric].seed([(id, int(value or 0), name) for id, value, name in rows])
+            else:
+                self.boards[metric].seed([((min(id_1, id_2), max(id_1, id_2)),
+                                           value,
+                                           " & ".join(sorted((username_1, username_2), reverse=True)),)
+                                          for id_1, id_2, value, username_1, username_2 in rows])
+
+            logger.debug(f"loaded the {metric.value} leaderboard")
+
+        return success
+
+    # noinspection PyMethodMayBeStatic
+    def _getSeedQuery(self, metric: LeaderboardMetric):
+        # one row more than shown, it bounds every value outside the top
+        limit = LEADERBOARD_SIZE + 1
+
+        if column := USER_COLUMNS.get(metric):
+            # noinspection PyTypeChecker
+            return (select(DiscordUser.id, column, DiscordUser.username)
+                    .order_by(column.desc())
+                    .limit(limit))
+
+        if metric == LeaderboardMetric.ACTIVITIES:
+            timePlayed = (func.sum(GameDiscordMapping.time_played_online)
+                          + func.sum(GameDiscordMapping.time_played_offline))
+
+            # noinspection PyTypeChecker
+            return (select(DiscordGame.id, timePlayed, DiscordGame.name)
+                    .join(GameDiscordMapping)
+                    .group_by(DiscordGame.id, DiscordGame.name)
+                    .order_by(timePlayed.desc())
+                    .limit(limit))
+
+        relationType = next(type for type, relationMetric in RELATION_TYPES.items() if relationMetric == metric)
+        user_1 = aliased(DiscordUser)
+        user_2 = aliased(DiscordUser)
+
+        # join both users instead of lazy loading them for every relation
+        # noinspection PyTypeChecker
+        return (select(DiscordUserRelation.discord_user_id_1,
+                       DiscordUserRelation.discord_user_id_2,
+                       DiscordUserRelation.value,
+                       user_1.username,
+                       user_2.username, )
+                .join(user_1, user_1.id == DiscordUserRelation.discord_user_id_1)
+                .join(user_2, user_2.id == DiscordUserRelation.discord_user_id_2)
+                .where(DiscordUserRelation.type == relationType)
+                .order_by(DiscordUserRelation.value.desc())
+                .limit(limit))
+
+    def getTop(self, metric: LeaderboardMetric) -> list[tuple[str, int]] | None:
+        """
+        Returns the top places of the given leaderboard. Only a dirty board is loaded from the database.
+
+        :param metric: The leaderboard
+        :return: (name, value) ordered descending by value, None if the board couldn't be loaded
+        """
+        board = self.boards[metric]
+
+        if board.dirty:
+            logger.debug(f"{metric.value} leaderboard is outdated, loading it")
+
+            if not (session := getSession()):
+                return None
+
+            loaded = self.seed(session, [metric])
+            session.close()
+
+            if not loaded:
+                return None
+
+        return board.get()
+
+    def setValue(self, metric: LeaderboardMetric, dcUserDb: DiscordUser, value: int):
+        """
+        Updates the board with the current value of the given DiscordUser.
+
+        :param metric: One of the leaderboards of the DiscordUsers
+        :param dcUserDb: DiscordUser whose value changed
+        :param value: The current value of the DiscordUser
+        """
+        change = partial(self.boards[metric].set, dcUserDb.id, value, dcUserDb.username)
+
+        if not stageChange(change):
+            change()
+
+    def increaseValues(self, metric: LeaderboardMetric, amounts: dict[int, int]):
+        """
+        Adds the given amounts to the board.
+
+        :param metric: The leaderboard
+        :param amounts: Id of the DiscordUser or DiscordGame -> amount that was added
+        """
+        board = self.boards[metric]
+
+        def change():
+            for key, amount in amounts.items():
+                board.increase(key, amount)
+
+        if not stageChange(change):
+            change()
+
+    def increaseRelations(self, relations: list[tuple[int, int, str]]):
+        """
+        Adds the written relations to the boards of the online and stream relations.
+
+        :param relations: (id of DiscordUser 1, id of DiscordUser 2, type) - each increased by one
+        """
+        for id_1, id_2, type in relations:
+            if metric := RELATION_TYPES.get(type):
+                self.boards[metric].increase((min(id_1, id_2), max(id_1, id_2)), 1)
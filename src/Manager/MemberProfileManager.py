@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime
+
+from discord import Member
+from sqlalchemy import select, or_
+from sqlalchemy.orm import Session, selectinload, joinedload
+
+from src.Entities.Counter.Entity.CounterDiscordMapping import CounterDiscordMapping
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser
+from src.Entities.Game.Entity.GameDiscordMapping import GameDiscordMapping
+from src.Entities.UserRelation.Entity.DiscordUserRelation import DiscordUserRelation
+
+logger = logging.getLogger("KVGG_BOT")
+
+# seconds a profile is used before it is loaded again. The times, xp, games and relations written by the minutely
+# job don't invalidate it (they change every minute for every active member), so a profile may be this old.
+PROFILE_TTL_SECONDS = 60
+
+
+class MemberProfile:
+    """
+    Snapshot of everything shown about a member, detached from the database
+    """
+
+    def __init__(self, dcUserDb: DiscordUser, relations: list[DiscordUserRelation]):
+        self.discordUserId: int = dcUserDb.id
+        self.username: str = dcUserDb.username
+        self.lastOnline: datetime | None = dcUserDb.last_online
+        self.timeOnline: int = dcUserDb.time_online
+        self.timeStreamed: int = dcUserDb.time_streamed
+        self.universityTimeOnline: int = dcUserDb.university_time_online or 0
+        self.messageCount: int = dcUserDb.message_count_all_time
+        self.commandCount: int = dcUserDb.command_count_all_time
+        self.xpAmount: int | None = dcUserDb.experience[0].xp_amount if dcUserDb.experience else None
+        # (name, time played online, time played offline)
+        self.games: list[tuple[str, int, int]] = [(mapping.discord_game.name,
+                                                   mapping.time_played_online,
+                                                   mapping.time_played_offline,)
+                                                  for mapping in dcUserDb.game_mappings]
+        # (name of the other member, type, value) ordered by type
+        self.relations: list[tuple[str, str, int]] = [((relation.discord_user_2
+                                                        if relation.discord_user_id_1 == dcUserDb.id
+                                                        else relation.discord_user_1).username,
+                                                       relation.type,
+                                                       relation.value,)
+                                                      for relation in relations]
+        # (name, value)
+        self.counters: list[tuple[str, int]] = [(mapping.counter.name, mapping.value)
+                                                for mapping in dcUserDb.counter_mappings]
+        # (time, type, value)
+        self.statistics: list[tuple[str, str, int]] = [(statistic.statistic_time,
+                                                        statistic.statistic_type,
+                                                        statistic.value,)
+                                                       for statistic in dcUserDb.current_discord_statistics]
+        self.loadedAt = time.monotonic()
+
+    @property
+    def timePlayed(self) -> int:
+        return sum(online + offline for _, online, offline in self.games)
+
+
+class MemberProfileManager:
+    """
+    Loads the profile of a member in a fixed number of queries and keeps it for a short time, so the data dump and
+    the welcome back message don't walk the lazy relationships. PROFILE_TTL_SECONDS is the only freshness guarantee,
+    just writes a member makes with a command or by joining and leaving invalidate the profile right away.
+    """
+    _self = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton-Pattern
+        """
+        if not cls._self:
+            cls._self = super().__new__(cls)
+            # snowflake of the member -> profile
+            cls._self.profiles: dict[int, MemberProfile] = {}
+
+        return cls._self
+
+    def getProfile(self, member: Member, session: Session) -> MemberProfile | None:
+        """
+        Returns the profile of the given member, it is loaded if it is missing or older than PROFILE_TTL_SECONDS.
+
+        :param member: Member of the profile
+        :param session: The session for the database
+        :return: MemberProfile or None
+        """
+        profile = self.profiles.get(member.id)
+
+        if profile and time.monotonic() - profile.loadedAt < PROFILE_TTL_SECONDS:
+            logger.debug(f"using cached profile of {member.display_name}")
+
+            return profile
+
+        # one query per collection instead of one per row
+        # noinspection PyTypeChecker
+        getQuery = (select(DiscordUser)
+                    .where(DiscordUser.user_id == str(member.id))
+                    .options(selectinload(DiscordUser.experience),
+                             selectinload(DiscordUser.game_mappings).joinedload(GameDiscordMapping.discord_game),
+                             selectinload(DiscordUser.counter_mappings).joinedload(CounterDiscordMapping.counter),
+                             selectinload(DiscordUser.current_discord_statistics), ))
+
+        try:
+            dcUserDb = session.scalars(getQuery).one_or_none()
+        except Exception as error:
+            logger.error(f"couldn't fetch profile of {member.display_name}", exc_info=error)
+
+            return None
+
+        if not dcUserDb:
+            logger.debug(f"no DiscordUser for the profile of {member.display_name}, creating it")
+
+            # creates the DiscordUser like every other lookup of a member
+            if not getDiscordUser(member, session):
+                return None
+
+            try:
+                dcUserDb = session.scalars(getQuery).one()
+            except Exception as error:
+                logger.error(f"couldn't fetch profile of {member.display_name}", exc_info=error)
+
+                return None
+
+        # noinspection PyTypeChecker
+        getQuery = (select(DiscordUserRelation)
+                    .where(or_(DiscordUserRelation.discord_user_id_1 == dcUserDb.id,
+                               DiscordUserRelation.discord_user_id_2 == dcUserDb.id, ))
+                    .options(joinedload(DiscordUserRelation.discord_user_1),
+                             joinedload(DiscordUserRelation.discord_user_2), )
+                    .order_by(DiscordUserRelation.type))
+
+        try:
+            relations = session.scalars(getQuery).all()
+        except Exception as error:
+            logger.error(f"couldn't fetch relations for the profile of {member.display_name}", exc_info=error)
+
+            return None
+
+        profile = MemberProfile(dcUserDb, list(relations))
+        self._evictExpired()
+        self.profiles[member.id] = profile
+
+        return profile
+
+    def _evictExpired(self):
+        """
+        Drops the profiles older than PROFILE_TTL_SECONDS, members not requesting theirs again would stay forever.
+        """
+        now = time.monotonic()
+
+        for memberId in [memberId for memberId, profile in self.profiles.items()
+                         if now - profile.loadedAt >= PROFILE_TTL_SECONDS]:
+            del self.profiles[memberId]
+
+    def invalidate(self, memberId: int):
+        """
+        Drops the cached profile after the member changed something shown in it, e.g. with a command or by joining
+        or leaving a voice channel.
+
+        :param memberId: Snowflake of the member
+        """
+        self.profiles.pop(memberId, None)
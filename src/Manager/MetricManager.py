@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Iterator
+
+from src.Manager.DatabaseManager import trackStatements
+
+logger = logging.getLogger("KVGG_BOT")
+
+# amount of latest durations per stage the quantiles are calculated from
+MAX_SAMPLES = 1024
+QUANTILES = (0.5, 0.95)
+
+
+class _StageMetric:
+
+    def __init__(self):
+        self.samples: deque[float] = deque(maxlen=MAX_SAMPLES)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.queries = 0
+
+    def observe(self, duration: float):
+        self.samples.append(duration)
+        self.count += 1
+        self.sum += duration
+        self.max = max(self.max, duration)
+
+    def quantile(self, quantile: float) -> float:
+        if not self.samples:
+            return 0.0
+
+        samples = sorted(self.samples)
+
+        return samples[min(len(samples) - 1, int(quantile * len(samples)))]
+
+
+class MetricManager:
+    """
+    Collects the durations and query counts of the stages of the background jobs and renders them in the
+    Prometheus text format. Written by the event loop and read by the API thread.
+    """
+    _self = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton-Pattern
+        """
+        if not cls._self:
+            cls._self = super().__new__(cls)
+            cls._self.lock = threading.Lock()
+            cls._self.stages: defaultdict[str, _StageMetric] = defaultdict(_StageMetric)
+            cls._self.gauges: dict[str, float] = {}
+
+        return cls._self
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """
+        Measures the duration and the queries of the enclosed block. Stages can be nested, the queries of a nested
+        stage count for the enclosing ones as well.
+
+        :param stage: Name of the stage, e.g. "minutely_game_relations"
+        """
+        start = time.perf_counter()
+
+        with trackStatements(stage) as tracker:
+            try:
+                yield
+            finally:
+                duration = time.perf_counter() - start
+
+                with self.lock:
+                    self.stages[stage].observe(duration)
+                    self.stages[stage].queries += tracker.statements
+
+    def setGauge(self, name: str, value: float):
+        with self.lock:
+            self.gauges[name] = value
+
+    def render(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        lines = ["# HELP kvgg_stage_duration_seconds Duration of the stages of the background jobs",
+                 "# TYPE kvgg_stage_duration_seconds summary", ]
+
+        with self.lock:
+            stages = sorted(self.stages.items())
+
+            for stage, metric in stages:
+                for quantile in QUANTILES:
+                    lines.append(f'kvgg_stage_duration_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                                 f'{metric.quantile(quantile)}')
+
+                lines.append(f'kvgg_stage_duration_seconds_sum{{stage="{stage}"}} {metric.sum}')
+                lines.append(f'kvgg_stage_duration_seconds_count{{stage="{stage}"}} {metric.count}')
+
+            lines += ["# HELP kvgg_stage_duration_max_seconds Longest duration of the stages",
+                      "# TYPE kvgg_stage_duration_max_seconds gauge", ]
+            lines += [f'kvgg_stage_duration_max_seconds{{stage="{stage}"}} {metric.max}' for stage, metric in stages]
+
+            lines += ["# HELP kvgg_stage_queries_total Database queries executed within the stages",
+                      "# TYPE kvgg_stage_queries_total counter", ]
+            lines += [f'kvgg_stage_queries_total{{stage="{stage}"}} {metric.queries}' for stage, metric in stages]
+
+            for name, value in sorted(self.gauges.items()):
+                lines += [f"# TYPE kvgg_{name} gauge", f"kvgg_{name} {value}"]
+
+        return "\n".join(lines) + "\n"
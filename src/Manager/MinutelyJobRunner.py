@@ -2,14 +2,21 @@ import logging
 from datetime import datetime
 
 from dateutil.relativedelta import relativedelta
-from discord import Client, Member
+from discord import Client, Member, Status
 from sqlalchemy import null
+from sqlalchemy.orm import Session
 
 from src.DiscordParameters.AchievementParameter import AchievementParameter
-from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUsersForMembers
 from src.InheritedCommands.NameCounter.FelixCounter import FelixCounter
 from src.Manager.AchievementManager import AchievementService
-from src.Manager.DatabaseManager import getSession
+from src.Manager.DatabaseManager import getAsyncSession, unitOfWork, getSession, stagedChanges, \
+    applyStagedChanges
+from src.Manager.DiscordUserIdManager import DiscordUserIdManager
+from src.Manager.MetricManager import MetricManager
+from src.Manager.PresenceLedgerManager import PresenceLedgerManager
+from src.Manager.StatisticManager import StatisticManager
 from src.Manager.UpdateTimeManager import UpdateTimeService
 from src.Services.ExperienceService import ExperienceService
 from src.Services.GameDiscordService import GameDiscordService
@@ -24,6 +31,8 @@ class MinutelyJobRunner:
 
     def __init__(self, client: Client):
         self.client = client
+        # snowflakes of the members who ran through the last minutely job
+        self.activeMembers: set[int] = set()
 
         self.updateTimeManager = UpdateTimeService(self.client)
         self.gameDiscordService = GameDiscordService(self.client)
@@ -32,60 +41,176 @@ class MinutelyJobRunner:
         self.relationService = RelationService(self.client)
         self.achievementService = AchievementService(self.client)
         self.experienceService = ExperienceService(self.client)
+        self.statisticManager = StatisticManager(self.client)
+        self.metricManager = MetricManager()
+        self.presenceLedgerManager = PresenceLedgerManager()
 
     async def run(self):
-        if not (session := getSession()):
-            logger.error("couldn't fetch session for minutelyJob")
+        with self.metricManager.measure("minutely"):
+            await self._run()
+
+    async def _run(self):
+        # all services called for the members share this session, it is committed once at the end of the block
+        with unitOfWork() as session:
+            if not session:
+                logger.error("couldn't fetch session for minutelyJob")
+
+                return
+
+            now = datetime.now()
+
+            # write the presence changes since the last minute and credit the minutes earlier ticks missed, the
+            # minute of this tick is credited by the members below
+            with self.metricManager.measure("minutely_presence_ledger"):
+                # a savepoint like the members below, a commit of the ledger doesn't end the unit of work
+                ledgerSession = getSession()
+                self.presenceLedgerManager.flush(ledgerSession)
+                self.presenceLedgerManager.replayMissedMinutes(ledgerSession, now)
+                self.presenceLedgerManager.markCredited(ledgerSession, now)
+                ledgerSession.close()
+
+            await self._runForMembers(session)
+
+        # write the statistics of this minute (and the messages since the last one) without blocking the event loop
+        with self.metricManager.measure("minutely_statistics"):
+            if asyncSession := getAsyncSession():
+                await asyncSession.run_sync(self.statisticManager.flushQueuedStatistics)
+                await asyncSession.close()
+
+        # add the xp of this minute and reduce the boosts afterward
+        with self.metricManager.measure("minutely_experience"):
+            await self.experienceService.flushQueuedExperience()
+            logger.debug("added experience")
 
-            return
+        # increase all relations
+        with self.metricManager.measure("minutely_relations"):
+            await self.relationService.increaseAllRelations()
+            logger.debug("increased relations")
 
-        for member in self.client.get_all_members():
-            if not (dcUserDb := getDiscordUser(member, session)):
-                logger.warning(f"couldn't fetch DiscordUser for {member.display_name} from the database")
+        # check reminder
+        with self.metricManager.measure("minutely_reminders"):
+            await self.reminderService.manageReminders()
+            logger.debug("ran reminder update")
 
-                continue
+        # check xp-spin reminder
+        with self.metricManager.measure("minutely_xp_spin_reminder"):
+            await self.experienceService.runExperienceReminder()
+            logger.debug("ran xp-spin reminder")
 
-            try:
-                # updating time and experience
-                await self.updateTimeManager.updateTimesAndExperience(member, dcUserDb, session)
+    async def _runForMembers(self, session: Session):
+        """
+        Runs the minutely job for every member.
 
-                # updating game statistics
-                await self.gameDiscordService.increaseGameRelationsForMember(member, session)
+        :param session: Session of the unit of work of this minute
+        """
+        members = [member for member in self.client.get_all_members() if not member.bot]
 
-                # updating Felix.Counter
-                await self.felixCounter.updateFelixCounter(member, dcUserDb, session)
+        with self.metricManager.measure("minutely_fetch_users"):
+            dcUsersDb = getDiscordUsersForMembers(members, session)
 
-                # update things
-                dcUserDb.username = member.display_name
-                dcUserDb.profile_picture_discord = member.display_avatar.url
-                dcUserDb.channel_id = member.voice.channel.id if member.voice else null()
+        isMidnight = (now := datetime.now()).hour == 0 and now.minute == 0
+        activeMembers: set[int] = set()
 
-                if (now := datetime.now()).hour == 0 and now.minute == 0:
-                    logger.debug("running anniversary check")
+        for member in members:
+            if isMidnight:
+                logger.debug("running anniversary check")
 
+                try:
                     await self._runAnniversaryCheck(member)
-            except Exception as error:
-                logger.error(f"error occurred while running the minutely job for {member.display_name}", exc_info=error)
-            finally:
+                except Exception as error:
+                    logger.error(f"error occurred while running the anniversary check for {member.display_name}",
+                                 exc_info=error, )
+
+            if not (dcUserDb := dcUsersDb.get(member.id)):
+                logger.warning(f"couldn't fetch DiscordUser for {member.display_name} from the database")
+
+                continue
+
+            if self._isActive(member, dcUserDb):
+                activeMembers.add(member.id)
+            # members who went offline during the last minute need one more run to clean up their state
+            elif member.id not in self.activeMembers:
+                self._updateDiscordUser(member, dcUserDb)
+
+                continue
+
+            # the member works in its own savepoint: services committing it only release the savepoint, and an
+            # error rolls back just this member while the session stays usable for the others. Its changes of the
+            # in-memory state (queues, leaderboards, quests) are staged and dropped together with the savepoint.
+            memberSession = getSession()
+
+            with stagedChanges() as changes:
                 try:
-                    session.commit()
+                    # updating time and experience
+                    with self.metricManager.measure("minutely_member_times"):
+                        await self.updateTimeManager.updateTimesAndExperience(member, dcUserDb, memberSession)
+
+                    # updating game statistics
+                    with self.metricManager.measure("minutely_member_game_relations"):
+                        await self.gameDiscordService.increaseGameRelationsForMember(member, dcUserDb, memberSession)
+
+                    # updating Felix.Counter
+                    with self.metricManager.measure("minutely_member_felix_counter"):
+                        await self.felixCounter.updateFelixCounter(member, dcUserDb, memberSession)
+
+                    # update things
+                    self._updateDiscordUser(member, dcUserDb)
                 except Exception as error:
-                    logger.error(f"couldn't save DiscordUser for {member.display_name}", exc_info=error)
-                    session.rollback()
+                    logger.error(f"error occurred while running the minutely job for {member.display_name}",
+                                 exc_info=error, )
+                    memberSession.rollback()
+                    changes.clear()
 
-        session.close()
+            memberSession.close()
+            await applyStagedChanges(changes)
 
-        # increase all relations
-        await self.relationService.increaseAllRelations()
-        logger.debug("increased relations")
+        # the played minutes of all members in one batch, in a savepoint as well
+        with self.metricManager.measure("minutely_game_relations"):
+            gameSession = getSession()
+            self.gameDiscordService.flushGameRelations(gameSession)
+            gameSession.close()
 
-        # check reminder
-        await self.reminderService.manageReminders()
-        logger.debug("ran reminder update")
+        logger.debug(f"ran minutely job for {len(activeMembers)} active out of {len(members)} members")
+        self.activeMembers = activeMembers
 
-        # check xp-spin reminder
-        await self.experienceService.runExperienceReminder()
-        logger.debug("ran xp-spin reminder")
+        self.metricManager.setGauge("minutely_members", len(members))
+        self.metricManager.setGauge("minutely_members_processed", len(activeMembers))
+
+        idManager = DiscordUserIdManager()
+        self.metricManager.setGauge("discord_user_ids_known", len(idManager.ids))
+        self.metricManager.setGauge("discord_user_id_hits", idManager.hits)
+        self.metricManager.setGauge("discord_user_id_misses", idManager.misses)
+
+    # noinspection PyMethodMayBeStatic
+    def _isActive(self, member: Member, dcUserDb: DiscordUser) -> bool:
+        """
+        Checks if the given member has to run through the minutely job. Members who are offline and not in a voice
+        channel can't earn anything, except for a running Felix-Counter.
+
+        :param member: Member to check
+        :param dcUserDb: DiscordUser of the member
+        """
+        return bool(member.voice or member.status != Status.offline or dcUserDb.felix_counter_start)
+
+    # noinspection PyMethodMayBeStatic
+    def _updateDiscordUser(self, member: Member, dcUserDb: DiscordUser):
+        """
+        Copies the quickly changing attributes of the member onto its DiscordUser. Only attributes that actually
+        changed are written, so unchanged users don't end up in the commit.
+
+        :param member: Member to take the attributes from
+        :param dcUserDb: DiscordUser to update
+        """
+        if dcUserDb.username != member.display_name:
+            dcUserDb.username = member.display_name
+
+        if dcUserDb.profile_picture_discord != (avatarUrl := member.display_avatar.url):
+            dcUserDb.profile_picture_discord = avatarUrl
+
+        channelId = str(member.voice.channel.id) if member.voice and member.voice.channel else None
+
+        if dcUserDb.channel_id != channelId:
+            dcUserDb.channel_id = channelId if channelId else null()
 
     async def _runAnniversaryCheck(self, member: Member):
         """
@@ -4,15 +4,14 @@ from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from discord import Client, Member
 from sqlalchemy import select, insert
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.DiscordParameters.ExperienceParameter import ExperienceParameter
 from src.DiscordParameters.NotificationType import NotificationType
 from src.DiscordParameters.QuestParameter import QuestDates
 from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Entity.NotificationSetting import NotificationSetting
 from src.Entities.DiscordUser.Repository.NotificationSettingRepository import getNotificationSettings
-from src.Entities.Experience.Entity.Experience import Experience
-from src.Entities.Experience.Repository.ExperienceRepository import getExperience
 from src.Entities.Newsletter.Entity.Newsletter import Newsletter
 from src.Entities.Newsletter.Entity.NewsletterDiscordMapping import NewsletterDiscordMapping
 from src.Entities.Quest.Entity.Quest import Quest
@@ -22,6 +21,7 @@ from src.Helper.SendDM import separator
 from src.Id.Categories import UniversityCategory
 from src.Manager.DatabaseManager import getSession
 from src.Manager.DmManager import DmManager
+from src.Manager.MemberProfileManager import MemberProfileManager
 from src.Services.ExperienceService import isDoubleWeekend, ExperienceService
 
 logger = logging.getLogger("KVGG_BOT")
@@ -43,13 +43,15 @@ class NotificationService:
                            member: Member,
                            content: str,
                            typeOfMessage: NotificationType | None,
-                           useSeparator: bool = True, ):
+                           useSeparator: bool = True,
+                           settings: NotificationSetting | None = None, ):
         """
         Sends a DM to the user and handles errors.
         This method also checks if the given user wants that kind of message.
 
         :param member: C.F. sendDM
         :param content: C.F. sendDM
+        :param settings: Already loaded notification settings of the member, fetched here if missing
         """
         if member.bot:
             logger.warning(f"not sending DM to {member.display_name} because it's a bot")
@@ -57,10 +59,13 @@ class NotificationService:
             return
 
         if typeOfMessage:
-            if not (session := getSession()):
-                return
+            if not settings:
+                if not (session := getSession()):
+                    return
+
+                settings = getNotificationSettings(member, session)
 
-            settings = getNotificationSettings(member, session)
+                session.close()
 
             if not settings:
                 logger.error(f"no notification settings for {member.display_name}, aborting sending message")
@@ -75,8 +80,6 @@ class NotificationService:
             nameOfSettingType = NotificationType.getSettingNameForType(typeOfMessage)
             content += (f"\n\n`Du kannst diese Art von Benachrichtigungen auf dem Server mit '/notifications "
                         f"{nameOfSettingType.value if nameOfSettingType else '(FEHLER)'}' ein- oder ausschalten.`")
-
-            session.close()
         else:
             content += f"\n\n`Du kannst diese Art von Benachrichtigungen nicht ausschalten.`"
 
@@ -141,13 +144,13 @@ class NotificationService:
                                 f"Dafür hast du einen **XP-Boost** erhalten. Schau mal nach!",
                                 NotificationType.QUEST, )
 
-    async def runNotificationsForMemberUponJoining(self, member: Member, dcUserDb: DiscordUser, session: Session):
+    async def runNotificationsForMemberUponJoining(self, member: Member, dcUserDb: DiscordUser, session: AsyncSession):
         """
         Sends all opted in notifications and advertisements.
 
         :param member: Member, who will receive the messages.
         :param dcUserDb: Database user of the member.
-        :param session: Database session
+        :param session: Async session of the database connection
         """
         answer = ""
 
@@ -176,13 +179,13 @@ class NotificationService:
         await self._sendNewsletter(member, dcUserDb, session)
 
     # noinspection PyMethodMayBeStatic
-    async def _sendNewsletter(self, member: Member, dcUserDb: DiscordUser, session: Session):
+    async def _sendNewsletter(self, member: Member, dcUserDb: DiscordUser, session: AsyncSession):
         """
         Sends the current newsletter(s) to the newly joined member.
 
         :param member: Member, who will receive the newsletter
         :param dcUserDb: DiscordUser of the member
-        :param session: Database session
+        :param session: Async session of the database connection
         """
         answer = ""
         # noinspection PyTypeChecker
@@ -194,10 +197,10 @@ class NotificationService:
                            Newsletter.created_at > (datetime.now() - relativedelta(months=6)), ))
 
         try:
-            newsletters = session.scalars(getQuery).all()
+            newsletters = (await session.scalars(getQuery)).all()
         except Exception as error:
             logger.error(f"couldn't fetch newsletters for {dcUserDb}", exc_info=error)
-            session.rollback()
+            await session.rollback()
 
             return ""
 
@@ -214,8 +217,8 @@ class NotificationService:
                                                                   sent_at=datetime.now(), )
 
             try:
-                session.execute(insertQuery)
-                session.commit()
+                await session.execute(insertQuery)
+                await session.commit()
             except Exception as error:
                 logger.error(f"couldn't insert new NewsletterDiscordMapping for {dcUserDb} and {newsletter}",
                              exc_info=error, )
@@ -231,12 +234,13 @@ class NotificationService:
         logger.debug(f"sent {len(newsletters)} newsletters to {dcUserDb.username}")
         await self._sendMessage(member, answer.rstrip("\n"), None, )
 
-    async def _welcomeBackMessage(self, member: Member, dcUserDb: DiscordUser, session: Session) -> str:
+    async def _welcomeBackMessage(self, member: Member, dcUserDb: DiscordUser, session: AsyncSession) -> str:
         """
         Sends a welcome back notification for users who opted in
 
         :param member: Member, who joined
         :param dcUserDb: Discord User from our database
+        :param session: Async session of the database connection
         :return:
         """
         if not dcUserDb.last_online:
@@ -265,14 +269,17 @@ class NotificationService:
 
             return ""
 
-        onlineTime: str = getFormattedTime(dcUserDb.time_online)
-        streamTime: str = getFormattedTime(dcUserDb.time_streamed)
-        universityTime: str = getFormattedTime(dcUserDb.university_time_online)
-        xp: Experience | None = getExperience(member, session)
+        # shared with the data dump, so a member rejoining several times is loaded once
+        if not (profile := await session.run_sync(lambda syncSession: MemberProfileManager().getProfile(member,
+                                                                                                        syncSession))):
+            logger.error(f"couldn't load profile of {member.display_name} for the welcome back message")
+
+            return ""
 
-        # circular import
-        from src.Services.GameDiscordService import GameDiscordService
-        playTime: str | None = GameDiscordService(self.client).getOverallPlayedTime(member, dcUserDb, session)
+        onlineTime: str = getFormattedTime(profile.timeOnline)
+        streamTime: str = getFormattedTime(profile.timeStreamed)
+        universityTime: str = getFormattedTime(profile.universityTimeOnline)
+        playTime: str | None = getFormattedTime(profile.timePlayed) if profile.games else None
 
         try:
             # circular import
@@ -298,8 +305,8 @@ class NotificationService:
         if universityTime:
             message += f"Du hast außerdem __**{universityTime} Stunden**__ :school_satchel: in der Uni verbracht. "
 
-        if xp:
-            message += (f"Du hast bereits __**{'{:,}'.format(xp.xp_amount).replace(',', '.')} "
+        if profile.xpAmount is not None:
+            message += (f"Du hast bereits __**{'{:,}'.format(profile.xpAmount).replace(',', '.')} "
                         f"XP**__ :star2: gefarmt.")
 
         if quests:
@@ -370,14 +377,15 @@ class NotificationService:
         """
         await self._sendMessage(member, message, NotificationType.STATUS)
 
-    async def sendRetrospect(self, member: Member, message: str):
+    async def sendRetrospect(self, member: Member, message: str, settings: NotificationSetting | None = None):
         """
         Checks and sends the retrospect to the given user.
 
         :param member: The member who will receive the message
         :param message: The message (status report) to send
+        :param settings: Already loaded notification settings of the member
         """
-        await self._sendMessage(member, message, NotificationType.RETROSPECT)
+        await self._sendMessage(member, message, NotificationType.RETROSPECT, settings=settings)
 
     async def sendXpSpinNotification(self, member: Member, message: str):
         """
@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable
+
+logger = logging.getLogger("KVGG_BOT")
+
+# hex digits of the SHA-256 of the image that are part of its file name
+CONTENT_HASH_LENGTH = 16
+# older versions of a plot stay on disk, because already sent messages still link them
+PLOT_VERSIONS_TO_KEEP = 5
+PLOT_FILE_PATTERN = re.compile(rf"^(?P<plot>[a-z0-9_]+)-(?P<hash>[0-9a-f]{{{CONTENT_HASH_LENGTH}}})\.png$")
+
+# name of the plot, e.g. top_5_activities.png -> (hash of the data, file name of the rendered image)
+renderedPlots: dict[str, tuple[str, str]] = {}
+
+
+def _initializeWorker():
+    import matplotlib
+
+    # no GUI backend in the worker, figures are only written to disk
+    matplotlib.use("Agg")
+
+
+def renderDoubleBarDiagram(data: dict[str, Any], savePath: str):
+    """
+    Renders two bars per place, e.g. online and stream time of the top five. Runs in the worker process.
+
+    :param data: Values, labels and names of both bars, see LeaderboardService
+    :param savePath: Path the PNG is written to
+    """
+    import matplotlib.patheffects as pe
+    import numpy as np
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FuncFormatter
+
+    from src.DiscordParameters.Colors import Colors
+    from src.Helper.GetFormattedTime import getFormattedTime
+
+    firstBarValues: list[int] = data["firstBarValues"]
+    secondBarValues: list[int] = data["secondBarValues"]
+    # prepare usernames to fit in the bars
+    xLabelsFirstBar = [textwrap.fill(item, 30) for item in data["namesOfFirstBar"]]
+    xLabelsSecondBar = [textwrap.fill(item, 30) for item in data["namesOfSecondBar"]]
+
+    # a figure without pyplot, so no global state is kept after saving it
+    fig = Figure()
+    ax = fig.subplots()
+    bar_width = 0.4
+
+    # add bars
+    ax.bar(np.arange(len(firstBarValues)),
+           firstBarValues,
+           width=bar_width,
+           color=Colors.MAIN.value,
+           label=data["firstBarLabel"])
+    ax.bar(np.arange(len(secondBarValues)) + bar_width,
+           secondBarValues,
+           width=bar_width,
+           color=Colors.SECONDARY_MAIN.value,
+           label=data["secondBarLabel"])
+
+    # set things
+    ax.set_ylabel(data["yLabel"], labelpad=8)
+    ax.set_title(data["title"])
+
+    # empty x-ticks to insert our values into the bars
+    ax.set_xticks([])
+    ax.set_xticklabels([])
+
+    for i, label in enumerate(xLabelsFirstBar):
+        ax.text(x=i,
+                y=max(firstBarValues) * .05,
+                s=label,
+                ha='center',
+                fontsize=12,
+                color='white',
+                path_effects=[pe.withStroke(linewidth=1.5, foreground='black')],
+                rotation=90, )
+
+    for i, label in enumerate(xLabelsSecondBar):
+        ax.text(x=i + 0.4,
+                # use first values here to have the texts on the same height
+                y=max(firstBarValues) * .05,
+                s=label,
+                ha='center',
+                fontsize=12,
+                color='white',
+                path_effects=[pe.withStroke(linewidth=1.5, foreground='black')],
+                rotation=90, )
+
+    for i in range(data["countOfEntries"]):
+        ax.text(x=i,
+                y=-max(firstBarValues) * .05,
+                s=f"Platz {i + 1}.",
+                color='black', )
+
+    # calculate hours from minutes to display next to the y-axis
+    if data["formatAsTime"]:
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda value, _: getFormattedTime(int(value))))
+    else:
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda value, _: int(value)))
+
+    # show legend in the top right corner
+    ax.legend()
+
+    # adjust positioning
+    fig.subplots_adjust(left=0.15, right=0.95, top=0.90, bottom=0.1)
+    fig.savefig(savePath, dpi=250, format="png")
+
+
+def renderBarDiagram(data: dict[str, Any], savePath: str):
+    """
+    Renders one bar per place with the name inside, e.g. the top five activities. Runs in the worker process.
+
+    :param data: Names and values of the bars, see LeaderboardService
+    :param savePath: Path the PNG is written to
+    """
+    import matplotlib.patheffects as pe
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FuncFormatter
+
+    from src.DiscordParameters.Colors import Colors
+    from src.Helper.GetFormattedTime import getFormattedTime
+
+    names: list[str] = data["names"]
+    values: list[int] = data["values"]
+    # prepare text for the x-axis
+    xLabels = [textwrap.fill(xLabel[:40], 10) for xLabel in names]
+
+    fig = Figure()
+    ax = fig.subplots()
+
+    ax.bar(range(len(names)),
+           values,
+           color=Colors.MAIN.value, )
+    ax.set_xlabel(data["xLabel"], labelpad=10)
+    ax.set_ylabel("Stunden", labelpad=42)
+    ax.set_title(data["title"])
+
+    ax.set_xticks(range(len(names)))
+    ax.set_xticklabels([])
+
+    for i in range(data["countOfEntries"]):
+        ax.text(x=i - .25,
+                y=-max(values) * .05,
+                s=f"Platz {i + 1}.",
+                color='black', )
+
+    # add labels manually to have them in the bar
+    for i, label in enumerate(xLabels):
+        ax.text(x=i,
+                y=max(values) * .1,
+                s=label,
+                ha='center',
+                va='center',
+                fontsize=10,
+                color='white',
+                path_effects=[pe.withStroke(linewidth=1.5, foreground='black')])
+
+    # calculate hours from minutes to display next to the y-axis
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda value, _: getFormattedTime(int(value))))
+
+    fig.subplots_adjust(left=0.15, right=0.95, top=0.90, bottom=0.1)
+    fig.savefig(savePath, dpi=250, format="png")
+
+
+def _renderAtomically(renderer: Callable[[dict[str, Any], str], None], data: dict[str, Any], savePath: str) -> str:
+    # the image is stored under the hash of its content, so a file never changes once it is served
+    plotPath = Path(savePath)
+    temporaryPath = plotPath.with_name(f"{plotPath.stem}.{os.getpid()}.tmp")
+
+    renderer(data, str(temporaryPath))
+
+    with open(temporaryPath, "rb") as file:
+        contentHash = hashlib.sha256(file.read()).hexdigest()[:CONTENT_HASH_LENGTH]
+
+    fileName = f"{plotPath.stem}-{contentHash}{plotPath.suffix}"
+    os.replace(temporaryPath, plotPath.with_name(fileName))
+
+    for version in _getVersions(plotPath)[PLOT_VERSIONS_TO_KEEP:]:
+        version.unlink(missing_ok=True)
+
+    return fileName
+
+
+def _getVersions(plotPath: Path) -> list[Path]:
+    """
+    Returns the rendered versions of the plot, the latest first.
+    """
+    return sorted((version
+                   for version in plotPath.parent.glob(f"{plotPath.stem}-*{plotPath.suffix}")
+                   if (match := PLOT_FILE_PATTERN.match(version.name)) and match.group("plot") == plotPath.stem),
+                  key=lambda version: version.stat().st_mtime,
+                  reverse=True, )
+
+
+def getLatestPlotFileName(plotPath: Path) -> str | None:
+    """
+    Returns the file name of the latest version of the plot, e.g. top_5_activities-<hash>.png for
+    data/plots/top_5_activities.png.
+
+    :param plotPath: Path of the plot without the content hash
+    :return: File name of the latest version, None if the plot was never rendered
+    """
+    if rendered := renderedPlots.get(plotPath.name):
+        return rendered[1]
+
+    # rendered before the bot was restarted
+    try:
+        versions = _getVersions(plotPath)
+    # the worker deleted an old version meanwhile
+    except FileNotFoundError:
+        versions = _getVersions(plotPath)
+
+    return versions[0].name if versions else None
+
+
+class PlotManager:
+    """
+    Renders the plots in a worker process, so matplotlib neither blocks the event loop nor keeps its state in the
+    bot. A plot is only rendered again if its data changed since the last time.
+    """
+    _self = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton-Pattern
+        """
+        if not cls._self:
+            cls._self = super().__new__(cls)
+            cls._self.pool = None
+
+        return cls._self
+
+    def startWorker(self):
+        """
+        Forks the worker. Must be called before the bot starts any thread, a process forked while other threads are
+        running inherits the locks they hold, e.g. the ones of the logging handlers, and could wait for them forever.
+        """
+        # the fork context starts its worker with the first task, not with the executor
+        self._getPool().submit(os.getpid)
+
+    def _getPool(self) -> ProcessPoolExecutor:
+        if not self.pool:
+            # fork explicitly: spawning (and the forkserver) would import main.py in the worker, which creates a
+            # second client and API server. Only a worker that was killed or died is forked by the running bot.
+            self.pool = ProcessPoolExecutor(max_workers=1,
+                                            mp_context=multiprocessing.get_context("fork"),
+                                            initializer=_initializeWorker, )
+
+        return self.pool
+
+    def _killPool(self):
+        """
+        Terminates the worker, the next plot starts a new one.
+        """
+        if not (pool := self.pool):
+            return
+
+        self.pool = None
+
+        # ProcessPoolExecutor has no public way to stop a busy worker before Python 3.14
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def getDataHash(renderer: Callable, data: dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps([renderer.__name__, data], sort_keys=True, default=str).encode()).hexdigest()
+
+    async def render(self,
+                     renderer: Callable[[dict[str, Any], str], None],
+                     data: dict[str, Any],
+                     savePath: Path, ) -> str | None:
+        """
+        Renders the plot with the given renderer next to savePath, unless it was already rendered from the same data.
+        The image is named after the plot and the hash of its content, e.g. top_5_activities-<hash>.png.
+
+        :param renderer: Module-level render function, it is pickled to the worker
+        :param data: Data of the plot, only JSON-serializable values
+        :param savePath: Path of the plot without the content hash
+        :return: File name of the rendered image, None on failure
+        """
+        dataHash = self.getDataHash(renderer, data)
+        rendered = renderedPlots.get(savePath.name)
+
+        if rendered and rendered[0] == dataHash and savePath.with_name(rendered[1]).is_file():
+            logger.debug(f"data of {savePath.name} did not change, using the existing plot")
+
+            return rendered[1]
+
+        try:
+            fileName = await asyncio.get_running_loop().run_in_executor(self._getPool(),
+                                                                        _renderAtomically,
+                                                                        renderer,
+                                                                        data,
+                                                                        str(savePath), )
+        except asyncio.CancelledError:
+            # cancelling the future doesn't stop the worker, it would keep rendering and block the following plots
+            logger.warning(f"rendering {savePath.name} was cancelled, killing the plot worker")
+            self._killPool()
+
+            for temporaryFile in savePath.parent.glob(f"{savePath.stem}.*.tmp"):
+                temporaryFile.unlink(missing_ok=True)
+
+            raise
+        except BrokenProcessPool as error:
+            logger.error(f"plot worker died while rendering {savePath.name}, restarting it", exc_info=error)
+            self.pool = None
+
+            return None
+        except Exception as error:
+            logger.error(f"couldn't render {savePath.name}", exc_info=error)
+
+            return None
+
+        renderedPlots[savePath.name] = (dataHash, fileName)
+        logger.debug(f"rendered {savePath.name} as {fileName}")
+
+        return fileName
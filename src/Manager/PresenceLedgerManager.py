@@ -0,0 +1,464 @@
+from __future__ import annotations
+
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable
+
+import discord
+from discord import Client, Member, VoiceState
+from sqlalchemy import select, insert, update, bindparam, func, or_
+from sqlalchemy.orm import Session
+
+from src.DiscordParameters.PresenceParameter import PresenceType, PresenceParameter
+from src.DiscordParameters.StatisticsParameter import StatisticsParameter
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser
+from src.Entities.Presence.Entity.PresenceInterval import PresenceInterval
+from src.Entities.Statistic.Repository.StatisticRepository import increaseStatisticsForUsers
+from src.Id.Categories import TrackedCategories, UniversityCategory
+from src.Id.GuildId import GuildId
+from src.Manager.DatabaseManager import getSession
+from src.Manager.DiscordUserIdManager import DiscordUserIdManager
+from src.Manager.LeaderboardManager import LeaderboardManager, LeaderboardMetric
+
+logger = logging.getLogger("KVGG_BOT")
+
+# (DiscordUser id, type, reference)
+IntervalKey = tuple[int, str, str | None]
+
+
+class _OpenInterval:
+
+    def __init__(self, key: IntervalKey, startedAt: datetime):
+        self.key = key
+        self.startedAt = startedAt
+        self.endedAt: datetime | None = None
+        # not written to the database yet
+        self.pending = True
+
+    def toRow(self) -> dict:
+        discordId, type, reference = self.key
+
+        return {"discord_id": discordId,
+                "type": type,
+                "reference": reference,
+                "started_at": self.startedAt,
+                "ended_at": self.endedAt,
+                "credited_until": self.startedAt, }
+
+
+class PresenceLedgerManager:
+    """
+    Ledger of the presence intervals (voice, stream, webcam, mute and activity sessions) of all members. The
+    intervals are opened and closed by the voice state and presence updates, so only changed intervals are written.
+    The minutely job marks the open intervals as credited with one statement, which still touches every open
+    interval. Minutes it missed (overrun or skipped ticks) are replayed from the ledger, the time the bot was down is
+    not credited.
+    """
+    _self = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton-Pattern
+        """
+        if not cls._self:
+            cls._self = super().__new__(cls)
+            cls._self.openIntervals: dict[IntervalKey, _OpenInterval] = {}
+            cls._self.pendingIntervals: list[_OpenInterval] = []
+            cls._self.pendingCloses: list[tuple[IntervalKey, datetime]] = []
+            cls._self.failedFlushes = 0
+
+        return cls._self
+
+    @staticmethod
+    def _getVoiceIntervals(voiceState: VoiceState | None) -> dict[str, str | None]:
+        """
+        Returns the types and references of the intervals the given voice state stands for. Only channels of the
+        tracked and the university categories are recorded.
+        """
+        if not voiceState or not (channel := voiceState.channel):
+            return {}
+
+        if channel.category_id in TrackedCategories.getValues():
+            intervals = {PresenceType.ONLINE.value: str(channel.id)}
+        elif channel.category_id in UniversityCategory.getValues():
+            intervals = {PresenceType.UNIVERSITY.value: str(channel.id)}
+        else:
+            return {}
+
+        for type, active in ((PresenceType.STREAM, voiceState.self_stream),
+                             (PresenceType.WEBCAM, voiceState.self_video),
+                             (PresenceType.MUTE, voiceState.self_mute),
+                             (PresenceType.FULL_MUTE, voiceState.self_deaf),):
+            if active:
+                intervals[type.value] = None
+
+        return intervals
+
+    @staticmethod
+    def _getActivityNames(activities: Iterable[discord.BaseActivity]) -> set[str]:
+        return {activity.name for activity in activities
+                if activity.name and not isinstance(activity, (discord.CustomActivity, discord.Streaming))}
+
+    def _getKeys(self, discordId: int, member: Member) -> set[IntervalKey]:
+        """
+        Returns the keys of all intervals the current state of the member stands for.
+        """
+        keys = {(discordId, type, reference) for type, reference in self._getVoiceIntervals(member.voice).items()}
+        keys |= {(discordId, PresenceType.ACTIVITY.value, name) for name in self._getActivityNames(member.activities)}
+
+        return keys
+
+    def _open(self, key: IntervalKey, now: datetime):
+        if key in self.openIntervals:
+            return
+
+        self.openIntervals[key] = interval = _OpenInterval(key, now)
+        self.pendingIntervals.append(interval)
+
+    def _close(self, key: IntervalKey, now: datetime):
+        if not (interval := self.openIntervals.pop(key, None)):
+            return
+
+        if interval.pending:
+            # opened and closed between two flushes, it is inserted closed
+            interval.endedAt = now
+        else:
+            self.pendingCloses.append((key, now,))
+
+    def _apply(self, before: set[IntervalKey], after: set[IntervalKey], now: datetime):
+        for key in before - after:
+            self._close(key, now)
+
+        for key in after - before:
+            self._open(key, now)
+
+    def recordVoiceStateUpdate(self, dcUserDb: DiscordUser, voiceStateBefore: VoiceState, voiceStateAfter: VoiceState):
+        """
+        Opens and closes the voice intervals changed by the VoiceStateUpdate.
+
+        :param dcUserDb: DiscordUser of the member who raised the VoiceStateUpdate
+        :param voiceStateBefore: VoiceState before the update
+        :param voiceStateAfter: VoiceState after the update
+        """
+        discordId = dcUserDb.id
+        before = {(discordId, type, reference)
+                  for type, reference in self._getVoiceIntervals(voiceStateBefore).items()}
+        after = {(discordId, type, reference)
+                 for type, reference in self._getVoiceIntervals(voiceStateAfter).items()}
+
+        self._apply(before, after, datetime.now())
+
+    @staticmethod
+    def _getDiscordId(member: Member) -> int | None:
+        """
+        Returns the id of the DiscordUser of the member. Members without one, e.g. new members, get it created, so
+        their first session isn't lost.
+        """
+        if (discordId := DiscordUserIdManager().ids.get(member.id)) is not None:
+            return discordId
+
+        if not (session := getSession()):
+            return None
+
+        dcUserDb = getDiscordUser(member, session)
+        discordId = dcUserDb.id if dcUserDb else None
+
+        session.close()
+
+        return discordId
+
+    def recordPresenceUpdate(self, before: Member, after: Member):
+        """
+        Opens and closes the activity intervals changed by the presence update.
+        """
+        if after.bot or (discordId := self._getDiscordId(after)) is None:
+            return
+
+        type = PresenceType.ACTIVITY.value
+
+        self._apply({(discordId, type, name) for name in self._getActivityNames(before.activities)},
+                    {(discordId, type, name) for name in self._getActivityNames(after.activities)},
+                    datetime.now(), )
+
+    def reconcile(self, client: Client, session: Session):
+        """
+        Brings the ledger up to the current state of the server after a (re-)start. Nothing shows what happened
+        while the bot was down, so all open intervals are closed at the last time the minutely job credited anything
+        and the current state is opened anew. The downtime is not replayed.
+
+        :param client: Client to read the current state from
+        :param session: The session for the database
+        """
+        # noinspection PyTypeChecker
+        getQuery = select(PresenceInterval).where(PresenceInterval.ended_at.is_(None))
+
+        try:
+            intervals = session.scalars(getQuery).all()
+            lastCredited = session.scalar(select(func.max(PresenceInterval.credited_until)))
+        except Exception as error:
+            logger.error("couldn't fetch open presence intervals", exc_info=error)
+
+            return
+
+        now = datetime.now()
+        self.openIntervals.clear()
+        self.pendingIntervals.clear()
+        self.pendingCloses.clear()
+
+        for interval in intervals:
+            openInterval = _OpenInterval((interval.discord_id, interval.type, interval.reference), interval.started_at)
+            openInterval.pending = False
+            self.openIntervals[openInterval.key] = openInterval
+
+        current: set[IntervalKey] = set()
+        ids = DiscordUserIdManager().ids
+
+        for member in client.get_guild(GuildId.GUILD_KVGG.value).members:
+            if not member.bot and (discordId := ids.get(member.id)) is not None:
+                current |= self._getKeys(discordId, member)
+
+        for key in list(self.openIntervals):
+            self._close(key, max(lastCredited or now, self.openIntervals[key].startedAt))
+
+        # the closes are written before the inserts, so reopening the same key is fine
+        for key in current:
+            self._open(key, now)
+
+        logger.debug(f"reconciled presence ledger: {len(intervals)} intervals closed, "
+                     f"{len(self.pendingIntervals)} opened")
+
+        self.flush(session)
+
+    def flush(self, session: Session) -> bool:
+        """
+        Writes the intervals opened and closed since the last flush, with one statement each. Changes that failed
+        MAX_FLUSH_ATTEMPTS times are written one by one instead, the ones the database still rejects are dropped.
+
+        :param session: The session for the database
+        """
+        intervals = self.pendingIntervals.copy()
+        closes = self.pendingCloses.copy()
+        self.pendingIntervals.clear()
+        self.pendingCloses.clear()
+
+        if not intervals and not closes:
+            return True
+
+        table = PresenceInterval.__table__
+        # noinspection PyTypeChecker
+        closeQuery = (update(table)
+                      .where(table.c.discord_id == bindparam("b_discord_id"),
+                             table.c.type == bindparam("b_type"),
+                             table.c.reference.is_not_distinct_from(bindparam("b_reference")),
+                             table.c.ended_at.is_(None), )
+                      .values(ended_at=bindparam("b_ended_at")))
+
+        try:
+            if closes:
+                session.execute(closeQuery, [{"b_discord_id": discordId,
+                                              "b_type": type,
+                                              "b_reference": reference,
+                                              "b_ended_at": endedAt, }
+                                             for (discordId, type, reference), endedAt in closes])
+
+            if intervals:
+                session.execute(insert(PresenceInterval), [interval.toRow() for interval in intervals])
+
+            session.commit()
+        except Exception as error:
+            logger.error(f"couldn't write {len(intervals)} new and {len(closes)} closed presence intervals",
+                         exc_info=error)
+            session.rollback()
+
+            self.failedFlushes += 1
+
+            if self.failedFlushes < PresenceParameter.MAX_FLUSH_ATTEMPTS.value:
+                # keep them for the next flush
+                self.pendingIntervals = intervals + self.pendingIntervals
+                self.pendingCloses = closes + self.pendingCloses
+            else:
+                self.failedFlushes = 0
+                self._flushOneByOne(intervals, closes, session)
+
+            return False
+
+        self.failedFlushes = 0
+
+        for interval in intervals:
+            interval.pending = False
+
+        logger.debug(f"wrote {len(intervals)} new and {len(closes)} closed presence intervals")
+
+        return True
+
+    # noinspection PyMethodMayBeStatic
+    def _flushOneByOne(self, intervals: list[_OpenInterval], closes: list[tuple[IntervalKey, datetime]],
+                       session: Session):
+        """
+        Writes the given changes in a savepoint each and drops the ones that fail, so a single row the database
+        rejects doesn't block the ledger forever.
+        """
+        table = PresenceInterval.__table__
+        dropped = 0
+
+        for (discordId, type, reference), endedAt in closes:
+            # noinspection PyTypeChecker
+            closeQuery = (update(table)
+                          .where(table.c.discord_id == discordId,
+                                 table.c.type == type,
+                                 table.c.reference.is_not_distinct_from(reference),
+                                 table.c.ended_at.is_(None), )
+                          .values(ended_at=endedAt))
+
+            try:
+                with session.begin_nested():
+                    session.execute(closeQuery)
+            except Exception as error:
+                logger.error(f"dropping close of presence interval {(discordId, type, reference)}", exc_info=error)
+                dropped += 1
+
+        for interval in intervals:
+            try:
+                with session.begin_nested():
+                    session.execute(insert(PresenceInterval), [interval.toRow()])
+            except Exception as error:
+                logger.error(f"dropping presence interval {interval.key}", exc_info=error)
+                dropped += 1
+            else:
+                interval.pending = False
+
+        try:
+            session.commit()
+        except Exception as error:
+            logger.error("couldn't write presence intervals one by one, dropping them", exc_info=error)
+            session.rollback()
+
+            return
+
+        logger.warning(f"wrote presence intervals one by one, dropped {dropped} of {len(intervals) + len(closes)}")
+
+    def replayMissedMinutes(self, session: Session, now: datetime) -> int:
+        """
+        Credits the minutes the minutely job missed, e.g. because a tick overran or was skipped, to the online,
+        university and stream times and statistics. The time the bot was down is not replayed, reconcile closes the
+        intervals at the last credited minute. Replayed minutes don't check the mute limits and grant no xp, quest
+        progress or achievements. Nothing is committed here.
+
+        :param session: The session for the database
+        :param now: Time of the current tick, its minute is credited by the tick itself
+        :return: int - Amount of replayed minutes
+        """
+        threshold = now - timedelta(seconds=PresenceParameter.TICK_TOLERANCE_SECONDS.value)
+        # noinspection PyTypeChecker
+        getQuery = (select(PresenceInterval.discord_id,
+                           PresenceInterval.type,
+                           PresenceInterval.credited_until,
+                           PresenceInterval.ended_at, )
+                    .where(PresenceInterval.type.in_(PresenceType.getCreditedValues()),
+                           PresenceInterval.credited_until < threshold,
+                           or_(PresenceInterval.ended_at.is_(None),
+                               PresenceInterval.credited_until < PresenceInterval.ended_at), ))
+
+        try:
+            intervals = session.execute(getQuery).all()
+        except Exception as error:
+            logger.error("couldn't fetch missed presence intervals", exc_info=error)
+
+            return 0
+
+        if not intervals:
+            return 0
+
+        # streaming and webcam count as one, like in the minutely job
+        kinds = {PresenceType.ONLINE.value: StatisticsParameter.ONLINE,
+                 PresenceType.UNIVERSITY.value: StatisticsParameter.UNIVERSITY,
+                 PresenceType.STREAM.value: StatisticsParameter.STREAM,
+                 PresenceType.WEBCAM.value: StatisticsParameter.STREAM, }
+        windows: defaultdict[tuple[int, StatisticsParameter], list[tuple[datetime, datetime, bool]]] = defaultdict(list)
+
+        for discordId, type, creditedUntil, endedAt in intervals:
+            windows[(discordId, kinds[type])].append((creditedUntil, endedAt or now, endedAt is None,))
+
+        minutes: dict[StatisticsParameter, Counter[int]] = defaultdict(Counter)
+
+        for (discordId, kind), kindWindows in windows.items():
+            seconds = 0.0
+            end: datetime | None = None
+
+            # merge overlapping windows, e.g. streaming with the webcam on
+            for start, stop, _ in sorted(kindWindows):
+                if end and start < end:
+                    start = end
+
+                if stop > start:
+                    seconds += (stop - start).total_seconds()
+                    end = stop if not end or stop > end else end
+
+            amount = int(seconds // 60)
+
+            # the current minute of open intervals is credited by the tick
+            if any(isOpen for _, _, isOpen in kindWindows):
+                amount -= 1
+
+            if (amount := min(amount, PresenceParameter.MAX_REPLAYED_MINUTES.value)) > 0:
+                minutes[kind][discordId] = amount
+
+        if not minutes:
+            return 0
+
+        table = DiscordUser.__table__
+        columns = {StatisticsParameter.ONLINE: table.c.time_online,
+                   StatisticsParameter.UNIVERSITY: table.c.university_time_online,
+                   StatisticsParameter.STREAM: table.c.time_streamed, }
+
+        try:
+            for kind, amounts in minutes.items():
+                column = columns[kind]
+                # noinspection PyTypeChecker
+                updateQuery = (update(table)
+                               .where(table.c.id == bindparam("b_id"))
+                               .values({column: func.coalesce(column, 0) + bindparam("b_minutes")}))
+
+                session.execute(updateQuery, [{"b_id": discordId, "b_minutes": amount}
+                                              for discordId, amount in amounts.items()])
+        except Exception as error:
+            logger.error("couldn't replay missed minutes", exc_info=error)
+
+            return 0
+
+        for kind, metric in ((StatisticsParameter.ONLINE, LeaderboardMetric.ONLINE),
+                             (StatisticsParameter.STREAM, LeaderboardMetric.STREAM),):
+            LeaderboardManager().increaseValues(metric, minutes.get(kind, {}))
+
+        if not increaseStatisticsForUsers({kind: list(amounts.elements()) for kind, amounts in minutes.items()},
+                                          session):
+            logger.error("couldn't replay the statistics of the missed minutes")
+
+        replayed = sum(sum(amounts.values()) for amounts in minutes.values())
+        logger.info(f"replayed {replayed} missed minutes of {len(windows)} presence intervals")
+
+        return replayed
+
+    # noinspection PyMethodMayBeStatic
+    def markCredited(self, session: Session, now: datetime):
+        """
+        Marks everything until now as credited, the minute of the current tick is credited by the tick itself. It is
+        one statement, but it updates every open interval. Nothing is committed here.
+
+        :param session: The session for the database
+        :param now: Time of the current tick
+        """
+        # noinspection PyTypeChecker
+        updateQuery = (update(PresenceInterval)
+                       .where(PresenceInterval.type.in_(PresenceType.getCreditedValues()),
+                              or_(PresenceInterval.ended_at.is_(None),
+                                  PresenceInterval.credited_until < PresenceInterval.ended_at), )
+                       .values(credited_until=func.coalesce(PresenceInterval.ended_at, now))
+                       .execution_options(synchronize_session=False))
+
+        try:
+            session.execute(updateQuery)
+        except Exception as error:
+            logger.error("couldn't mark the presence intervals as credited", exc_info=error)
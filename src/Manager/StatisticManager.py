@@ -1,27 +1,42 @@
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta
+from functools import partial
+from time import perf_counter
 from typing import Sequence
 
 from discord import Member, Client
-from sqlalchemy import select, insert
+from sqlalchemy import select, insert, update, literal, func
 from sqlalchemy.orm import Session
 
 from src.DiscordParameters.StatisticsParameter import StatisticsParameter
 from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Repository.NotificationSettingRepository import getNotificationSettingsForUsers
+from src.Entities.Game.Entity.DiscordGame import DiscordGame
 from src.Entities.Game.Entity.GameDiscordMapping import GameDiscordMapping
 from src.Entities.Statistic.Entity.AllCurrentServerStats import AllCurrentServerStats
 from src.Entities.Statistic.Entity.CurrentDiscordStatistic import CurrentDiscordStatistic
 from src.Entities.Statistic.Entity.StatisticLog import StatisticLog
-from src.Entities.Statistic.Repository.StatisticRepository import getCurrentStatisticsForUser
+from src.Entities.Statistic.Repository.StatisticRepository import getCurrentStatisticsForUser, \
+    increaseStatisticsForUsers
 from src.Helper.GetFormattedTime import getFormattedTime
 from src.Helper.ReadParameters import getParameter, Parameters
 from src.Helper.SplitStringAtMaxLength import splitStringAtMaxLength
 from src.Id.ChannelId import ChannelId
 from src.Id.GuildId import GuildId
-from src.Manager.DatabaseManager import getSession
+from src.Manager.DatabaseManager import getSession, stageChange
 from src.Manager.NotificationManager import NotificationService
 
 logger = logging.getLogger("KVGG_BOT")
+# increments queued by all services, they are written with flushQueuedStatistics
+queuedStatistics: dict[StatisticsParameter, list[int]] = defaultdict(list)
+# order of the statistics within a retrospect
+RETROSPECT_ORDER = [StatisticsParameter.ONLINE.value,
+                    StatisticsParameter.STREAM.value,
+                    StatisticsParameter.ACTIVITY.value,
+                    StatisticsParameter.UNIVERSITY.value,
+                    StatisticsParameter.MESSAGE.value,
+                    StatisticsParameter.COMMAND.value, ]
 
 
 class StatisticManager:
@@ -118,58 +133,55 @@ class StatisticManager:
             logger.debug(f"sent {time.value}-server-statistics")
 
     # noinspection PyMethodMayBeStatic
-    def saveStatisticsToStatisticLog(self, time: StatisticsParameter, session: Session):
+    def saveStatisticsToStatisticLog(self, time: StatisticsParameter, session: Session, skipZeroValues: bool = False):
         """
-        Saves the statistics (currently only online statistic) to the statistic-log database.
+        Copies the statistics of the given period into the statistic-log and resets them, in one transaction and
+        with two statements regardless of the amount of users.
 
         :param time: Time to add statistics to
         :param session: The session to use for the database
+        :param skipZeroValues: Don't log statistics with a value of zero, set by the parameter SKIP_ZERO_STATISTICS
         """
-        for type in StatisticsParameter.getTypeValues():
-            # noinspection PyTypeChecker
-            getQuery = select(CurrentDiscordStatistic).where(CurrentDiscordStatistic.statistic_time == time.value,
-                                                             CurrentDiscordStatistic.statistic_type == type, )
+        start = perf_counter()
+        conditions = [CurrentDiscordStatistic.statistic_time == time.value,
+                      CurrentDiscordStatistic.statistic_type.in_(StatisticsParameter.getTypeValues()), ]
 
-            try:
-                statistics: Sequence[CurrentDiscordStatistic] = session.scalars(getQuery).all()
-            except Exception as error:
-                logger.error(f"couldn't fetch statistics for type:{type} and time: {time}", exc_info=error)
-
-                continue
-
-            if not statistics:
-                logger.error(f"couldn't fetch statistics for type:{type} and time: {time}")
-
-                return
+        if skipZeroValues:
+            conditions.append(CurrentDiscordStatistic.value != 0)
 
-            for statistic in statistics:
-                insertQuery = insert(StatisticLog).values(type=time.value,
-                                                          statistic_type=type,
-                                                          created_at=datetime.now(),
-                                                          discord_user_id=statistic.discord_id,
-                                                          value=statistic.value, )
+        # noinspection PyTypeChecker
+        selectQuery = select(literal(time.value),
+                             CurrentDiscordStatistic.statistic_type,
+                             literal(datetime.now()),
+                             CurrentDiscordStatistic.discord_id,
+                             CurrentDiscordStatistic.value, ).where(*conditions)
+        insertQuery = insert(StatisticLog).from_select(["type",
+                                                        "statistic_type",
+                                                        "created_at",
+                                                        "discord_user_id",
+                                                        "value", ], selectQuery)
+        # reset values so we don't have to insert them again
+        # noinspection PyTypeChecker
+        updateQuery = update(CurrentDiscordStatistic).where(*conditions).values(value=0)
 
-                try:
-                    session.execute(insertQuery)
-                except Exception as error:
-                    logger.error(f"couldn't insert statistics for {statistic.discord_id}, type: {type} and time: "
-                                 f"{time}", exc_info=error)
+        try:
+            insertedRows = session.execute(insertQuery).rowcount
+            resetRows = session.execute(updateQuery).rowcount
+            session.commit()
+        except Exception as error:
+            logger.error(f"couldn't save statistics for time: {time}", exc_info=error)
+            session.rollback()
 
-                    continue
+            return
 
-                # reset value so we don't have to insert it again
-                statistic.value = 0
+        # without the zero values a period nobody was active in leaves nothing to save
+        if not insertedRows and not skipZeroValues:
+            logger.error(f"couldn't fetch statistics for time: {time}")
 
-                try:
-                    session.commit()
-                except Exception as error:
-                    logger.error(f"couldn't commit statistics for {statistic.discord_id}, type: {type} and time: "
-                                 f"{time}", exc_info=error)
+            return
 
-                    continue
-                else:
-                    logger.debug(f"saved statistics for DiscordID: {statistic.discord_id}, type: {type} and time: "
-                                 f"{time.value}")
+        logger.debug(f"saved {insertedRows} and reset {resetRows} statistics for time: {time.value} in "
+                     f"{perf_counter() - start:.2f} s")
 
     # noinspection PyMethodMayBeStatic
     def increaseStatistic(self, type: StatisticsParameter, member: Member, session: Session, value: int = 1):
@@ -206,6 +218,62 @@ class StatisticManager:
 
             return
 
+    # noinspection PyMethodMayBeStatic
+    def queueStatistic(self, type: StatisticsParameter, dcUserDb: DiscordUser):
+        """
+        Queues an increase by one of the given statistic in each time period. It is written with the next
+        flushQueuedStatistics.
+
+        :param type: The type of the statistic
+        :param dcUserDb: The DiscordUser whose statistic is increased
+        """
+        change = partial(queuedStatistics[type].append, dcUserDb.id)
+
+        if not stageChange(change):
+            change()
+
+    # noinspection PyMethodMayBeStatic
+    def increaseStatistics(self, increments: dict[StatisticsParameter, list[int]], session: Session) -> bool:
+        """
+        Increases the given statistics of many users at once in each time period.
+
+        :param increments: Ids of the DiscordUsers per type of statistic, an id occurring n times is increased by n
+        :param session: The session to use for the database
+        :return: bool - Whether the increments were saved
+        """
+        if not any(increments.values()):
+            return True
+
+        if not increaseStatisticsForUsers(increments, session):
+            session.rollback()
+
+            return False
+
+        try:
+            session.commit()
+        except Exception as error:
+            logger.error("couldn't commit increase of statistics", exc_info=error)
+            session.rollback()
+
+            return False
+
+        amounts = ", ".join(f"{type.value}: {len(ids)}" for type, ids in increments.items())
+        logger.debug(f"increased statistics for {amounts}")
+
+        return True
+
+    def flushQueuedStatistics(self, session: Session):
+        """
+        Writes all queued statistic increments to the database.
+
+        :param session: The session to use for the database
+        """
+        increments = {type: ids for type, ids in queuedStatistics.items() if ids}
+        queuedStatistics.clear()
+
+        if not self.increaseStatistics(increments, session):
+            logger.error("couldn't flush queued statistics, they are lost")
+
     async def runRetrospectForUsers(self, time: StatisticsParameter, session: Session):
         """
         Creates a retrospect for all users who have statistics for the given time period.
@@ -213,145 +281,151 @@ class StatisticManager:
         :param time: Time period to send the retrospect for
         :param session: The session to use for the database
         """
-        if time == StatisticsParameter.DAILY:
-            logger.error("daily retrospects are not supported / wanted")
+        match time:
+            case StatisticsParameter.WEEKLY:
+                timePeriod = "die letzte Woche"
+                timeColumn = GameDiscordMapping.week
+            case StatisticsParameter.MONTHLY:
+                timePeriod = "den letzten Monat"
+                timeColumn = GameDiscordMapping.month
+            case StatisticsParameter.YEARLY:
+                timePeriod = "das letzte Jahr"
+                timeColumn = GameDiscordMapping.year
+            case StatisticsParameter.DAILY:
+                logger.error("daily retrospects are not supported / wanted")
 
-            return
+                return
+            case _:
+                logger.error(f"undefined enum entry was reached: {time}")
+
+                return
+
+        amountOfGames = 10 if time == StatisticsParameter.YEARLY else 3
 
-        getQuery = (select(DiscordUser)
-                    .distinct()
+        # noinspection PyTypeChecker
+        getQuery = (select(DiscordUser.id,
+                           DiscordUser.user_id,
+                           CurrentDiscordStatistic.statistic_type,
+                           CurrentDiscordStatistic.value, )
                     .join(CurrentDiscordStatistic)
-                    .where(CurrentDiscordStatistic.statistic_time == time.value))
+                    .where(CurrentDiscordStatistic.statistic_time == time.value,
+                           CurrentDiscordStatistic.value > 0, ))
 
         try:
-            dcUsersDb: Sequence[DiscordUser] = session.scalars(getQuery).all()
+            rows = session.execute(getQuery).all()
         except Exception as error:
-            logger.error("couldn't fetch all users from database to create retrospects", exc_info=error)
+            logger.error("couldn't fetch all statistics from database to create retrospects", exc_info=error)
 
             return
 
+        statistics: dict[int, dict[str, int]] = defaultdict(dict)
+        userIds: dict[int, str] = {}
+
+        for id, userId, statisticType, value in rows:
+            statistics[id][statisticType] = value
+            userIds[id] = userId
+
+        # top games of all users in one query instead of one query (and a lazy load per game) for every user
+        # noinspection PyTypeChecker
+        rankedQuery = (select(GameDiscordMapping.discord_id,
+                              DiscordGame.name,
+                              timeColumn.label("time_played"),
+                              func.row_number()
+                              .over(partition_by=GameDiscordMapping.discord_id, order_by=timeColumn.desc())
+                              .label("game_rank"), )
+                       .join(DiscordGame)
+                       .where(GameDiscordMapping.discord_id.in_(
+                           select(CurrentDiscordStatistic.discord_id)
+                           .where(CurrentDiscordStatistic.statistic_time == time.value,
+                                  CurrentDiscordStatistic.statistic_type == StatisticsParameter.ACTIVITY.value,
+                                  CurrentDiscordStatistic.value > 0, )))
+                       .subquery())
+        # noinspection PyTypeChecker
+        getQuery = (select(rankedQuery.c.discord_id, rankedQuery.c.name, rankedQuery.c.time_played)
+                    .where(rankedQuery.c.game_rank <= amountOfGames)
+                    .order_by(rankedQuery.c.discord_id, rankedQuery.c.game_rank))
+
+        try:
+            gameRows = session.execute(getQuery).all()
+        except Exception as error:
+            logger.error(f"couldn't fetch the top {amountOfGames} games to create retrospects", exc_info=error)
+
+            gameRows = []
+
+        topGames: dict[int, list[tuple[str, int]]] = defaultdict(list)
+
+        for id, name, timePlayed in gameRows:
+            topGames[id].append((name, timePlayed))
+
         if not (guild := self.client.get_guild(GuildId.GUILD_KVGG.value)):
             logger.error(f"couldn't fetch guild from client")
 
             return
 
-        for dcUserDb in dcUsersDb:
-            logger.debug(f"creating retrospect for {dcUserDb}")
+        # (id of the DiscordUser, member, message)
+        retrospects: list[tuple[int, Member, str]] = []
 
-            if not (member := guild.get_member(int(dcUserDb.user_id))):
-                logger.warning(f"couldn't fetch member from guild for {dcUserDb}")
+        for id, userStatistics in statistics.items():
+            if not (member := guild.get_member(int(userIds[id]))):
+                logger.warning(f"couldn't fetch member from guild for DiscordUser {id}")
 
                 continue
 
-            def getCorrectTimePeriod() -> str:
-                match time:
-                    case StatisticsParameter.WEEKLY:
-                        return "die letzte Woche"
-                    case StatisticsParameter.MONTHLY:
-                        return "für den letzten Monat"
-                    case StatisticsParameter.YEARLY:
-                        return "für das letzte Jahr"
-                    case _:
-                        logger.error(f"undefined enum entry was reached: {time}")
-
-                        return "FEHLER"
-
-            statistics: Sequence[CurrentDiscordStatistic | None] = dcUserDb.current_discord_statistics
-            message = f"__**Hey {member.display_name}, hier ist dein Rückblick für {getCorrectTimePeriod()}!**__\n\n"
-            # if there are no statistics, the message will not be sent
-            modified = False
-            # Define the order of the statistics
-            order = {
-                StatisticsParameter.ONLINE.value: 1,
-                StatisticsParameter.STREAM.value: 2,
-                StatisticsParameter.ACTIVITY.value: 3,
-                StatisticsParameter.UNIVERSITY.value: 4,
-                StatisticsParameter.MESSAGE.value: 5,
-                StatisticsParameter.COMMAND.value: 6,
-            }
-            # Sort the statistics based on the defined order
-            sorted_statistics = sorted(statistics, key=lambda s: order.get(s.statistic_type, float('inf')))
-
-            for statistic in sorted_statistics:
-                if statistic.statistic_time != time.value:
-                    continue
-
-                match statistic.statistic_type:
-                    case StatisticsParameter.ONLINE.value:
-                        if statistic.value > 0:
-                            message += f"-\tDu warst {getFormattedTime(statistic.value)} Stunden online.\n"
-                            modified = True
-                    case StatisticsParameter.STREAM.value:
-                        if statistic.value > 0:
-                            message += f"-\tDu hast insgesamt {getFormattedTime(statistic.value)} Stunden gestreamt.\n"
-                            modified = True
-                    case StatisticsParameter.MESSAGE.value:
-                        if statistic.value > 0:
-                            message += f"-\tDu hast {statistic.value} Nachrichten verfasst.\n"
-                            modified = True
-                    case StatisticsParameter.COMMAND.value:
-                        if statistic.value > 0:
-                            message += f"-\tDu hast mich {statistic.value} Mal genutzt (aka. Commands genutzt).\n"
-                            modified = True
-                    case StatisticsParameter.UNIVERSITY.value:
-                        if statistic.value > 0:
-                            message += f"-\tDu hast {getFormattedTime(statistic.value)} Stunden studiert.\n"
-                            modified = True
-                    case StatisticsParameter.ACTIVITY.value:
-                        if statistic.value > 0:
-                            if time == StatisticsParameter.YEARLY:
-                                amountOfGames = 10
-                            else:
-                                amountOfGames = 3
-
-                            message += (f"-\tDu hast {getFormattedTime(statistic.value)} Stunden gespielt oder "
-                                        f"Programme genutzt. Deine Top {amountOfGames}:\n")
-
-                            modified = True
-
-                            match time:
-                                case StatisticsParameter.WEEKLY:
-                                    timeType = GameDiscordMapping.week
-                                    timeKey = "week"
-                                case StatisticsParameter.MONTHLY:
-                                    timeType = GameDiscordMapping.month
-                                    timeKey = "month"
-                                case StatisticsParameter.YEARLY:
-                                    timeType = GameDiscordMapping.year
-                                    timeKey = "year"
-                                case _:
-                                    logger.error(f"undefined enum entry was reached: {time}")
-
-                                    continue
-
-                            # noinspection PyTypeChecker
-                            getQuery = (select(GameDiscordMapping)
-                                        .where(GameDiscordMapping.discord_id == dcUserDb.id, )
-                                        .order_by(timeType.desc())
-                                        .limit(amountOfGames))
-
-                            try:
-                                gameMappings: Sequence[GameDiscordMapping] = session.scalars(getQuery).all()
-                            except Exception as error:
-                                logger.error(f"couldn't fetch game mappings for {dcUserDb}", exc_info=error)
-
-                                continue
-                            else:
-                                logger.debug(f"fetched top {amountOfGames} games for {dcUserDb}")
-
-                                for gameMapping in gameMappings:
-                                    message += (f"\t- \t{gameMapping.discord_game.name} "
-                                                f"({getFormattedTime(gameMapping.__dict__[timeKey])} Stunden)\n")
-                    case _:
-                        logger.error(f"undefined enum entry was reached: {statistic.statistic_type} for {dcUserDb}")
-
-                        continue
-
-            if modified:
-                await self.notificationService.sendRetrospect(member, message.rstrip("\n"))
-                logger.debug(f"sent retrospect to {member.display_name}")
+            message = f"__**Hey {member.display_name}, hier ist dein Rückblick für {timePeriod}!**__\n\n"
+            message += self._renderRetrospectStatistics(userStatistics, topGames[id], amountOfGames)
+            retrospects.append((id, member, message.rstrip("\n"), ))
+
+        # the settings of all recipients at once instead of one query per retrospect
+        settings = getNotificationSettingsForUsers([id for id, _, _ in retrospects], session)
+
+        # the NotificationService only queues the DMs, so they are handed over one after another
+        for id, member, message in retrospects:
+            try:
+                await self.notificationService.sendRetrospect(member, message, settings.get(id))
+            except Exception as error:
+                logger.error(f"couldn't send retrospect to {member.display_name}", exc_info=error)
             else:
-                logger.debug(f"no statistics for {dcUserDb}")
+                logger.debug(f"sent retrospect to {member.display_name}")
+
+        logger.debug(f"sent {len(retrospects)} {time.value}-retrospects")
+
+    # noinspection PyMethodMayBeStatic
+    def _renderRetrospectStatistics(self,
+                                    statistics: dict[str, int],
+                                    topGames: list[tuple[str, int]],
+                                    amountOfGames: int, ) -> str:
+        """
+        Renders the lines of a retrospect in the order of RETROSPECT_ORDER.
+
+        :param statistics: Values of the statistics by their type, only values above zero
+        :param topGames: Names and played time of the most played games
+        :param amountOfGames: Amount of games the top list was limited to
+        """
+        message = ""
+
+        for statisticType in RETROSPECT_ORDER:
+            if not (value := statistics.get(statisticType)):
+                continue
+
+            match statisticType:
+                case StatisticsParameter.ONLINE.value:
+                    message += f"-\tDu warst {getFormattedTime(value)} Stunden online.\n"
+                case StatisticsParameter.STREAM.value:
+                    message += f"-\tDu hast insgesamt {getFormattedTime(value)} Stunden gestreamt.\n"
+                case StatisticsParameter.MESSAGE.value:
+                    message += f"-\tDu hast {value} Nachrichten verfasst.\n"
+                case StatisticsParameter.COMMAND.value:
+                    message += f"-\tDu hast mich {value} Mal genutzt (aka. Commands genutzt).\n"
+                case StatisticsParameter.UNIVERSITY.value:
+                    message += f"-\tDu hast {getFormattedTime(value)} Stunden studiert.\n"
+                case StatisticsParameter.ACTIVITY.value:
+                    message += (f"-\tDu hast {getFormattedTime(value)} Stunden gespielt oder "
+                                f"Programme genutzt. Deine Top {amountOfGames}:\n")
+
+                    for name, timePlayed in topGames:
+                        message += f"\t- \t{name} ({getFormattedTime(timePlayed)} Stunden)\n"
+
+        return message
 
     async def midnightJob(self):
         async def handleStatisticsForTime(time: StatisticsParameter):
@@ -367,13 +441,16 @@ class StatisticManager:
                     logger.error(f"couldn't run {time.value} retrospects", exc_info=error)
 
             try:
-                self.saveStatisticsToStatisticLog(time, session)
+                self.saveStatisticsToStatisticLog(time, session, getParameter(Parameters.SKIP_ZERO_STATISTICS))
             except Exception as error:
                 logger.error(f"couldn't save {time.value} statistics", exc_info=error)
 
         if not (session := getSession()):
             return
 
+        # increments of the last minutes still belong to the old period
+        self.flushQueuedStatistics(session)
+
         logger.debug("running daily statistics")
 
         now = datetime.now()
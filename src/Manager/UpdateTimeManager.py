@@ -13,6 +13,7 @@ from src.Helper.GetChannelsFromCategory import getVoiceChannelsFromCategoryEnum
 from src.Id.Categories import TrackedCategories, UniversityCategory
 from src.Id.GuildId import GuildId
 from src.Manager.AchievementManager import AchievementService
+from src.Manager.LeaderboardManager import LeaderboardManager, LeaderboardMetric
 from src.Manager.StatisticManager import StatisticManager
 from src.Services.ExperienceService import ExperienceService
 from src.Services.QuestService import QuestService, QuestType
@@ -37,6 +38,7 @@ class UpdateTimeService:
         self.achievementService = AchievementService(self.client)
         self.questService = QuestService(self.client)
         self.statisticManager = StatisticManager(self.client)
+        self.leaderboardManager = LeaderboardManager()
 
     def _getChannels(self):
         """
@@ -137,40 +139,41 @@ class UpdateTimeService:
 
         if channelType == "gaming":
             dcUserDb.time_online += 1
+            self.leaderboardManager.setValue(LeaderboardMetric.ONLINE, dcUserDb, dcUserDb.time_online)
 
             await self.questService.addProgressToQuest(member, QuestType.ONLINE_TIME)
             logger.debug(f"checked online-quest for {dcUserDb}")
 
-            await self.experienceService.addExperience(ExperienceParameter.XP_FOR_ONLINE.value, member=member)
-            logger.debug(f"increased online-xp for {dcUserDb}")
+            self.experienceService.queueExperience(member, ExperienceParameter.XP_FOR_ONLINE.value)
+            logger.debug(f"queued online-xp for {dcUserDb}")
 
-            self.statisticManager.increaseStatistic(StatisticsParameter.ONLINE, member, session)
-            logger.debug(f"increased online statistics for {dcUserDb}")
+            self.statisticManager.queueStatistic(StatisticsParameter.ONLINE, dcUserDb)
+            logger.debug(f"queued online statistics for {dcUserDb}")
 
             # increase time for streaming
             if member.voice.self_video or member.voice.self_stream:
                 dcUserDb.time_streamed += 1
+                self.leaderboardManager.setValue(LeaderboardMetric.STREAM, dcUserDb, dcUserDb.time_streamed)
 
                 await self.questService.addProgressToQuest(member, QuestType.STREAM_TIME)
                 logger.debug(f"checked stream-quest for {dcUserDb}")
 
-                await self.experienceService.addExperience(ExperienceParameter.XP_FOR_STREAMING.value,
-                                                           member=member)
-                logger.debug(f"increased stream-xp for {dcUserDb}")
+                self.experienceService.queueExperience(member, ExperienceParameter.XP_FOR_STREAMING.value)
+                logger.debug(f"queued stream-xp for {dcUserDb}")
 
-                self.statisticManager.increaseStatistic(StatisticsParameter.STREAM, member, session)
-                logger.debug(f"increased stream statistics for {dcUserDb}")
+                self.statisticManager.queueStatistic(StatisticsParameter.STREAM, dcUserDb)
+                logger.debug(f"queued stream statistics for {dcUserDb}")
 
-            self.experienceService.reduceXpBoostsTime(member)
-            logger.debug(f"reduced xp boosts for {dcUserDb}")
+            self.experienceService.queueXpBoostsReduction(member)
+            logger.debug(f"queued reduction of xp boosts for {dcUserDb}")
 
             await self._checkForAchievements(member, dcUserDb)
             logger.debug(f"checked for achievements for {dcUserDb}")
         else:
             dcUserDb.university_time_online += 1
 
-            self.statisticManager.increaseStatistic(StatisticsParameter.UNIVERSITY, member, session)
-            logger.debug(f"increased university statistics for {dcUserDb}")
+            self.statisticManager.queueStatistic(StatisticsParameter.UNIVERSITY, dcUserDb)
+            logger.debug(f"queued university statistics for {dcUserDb}")
 
     async def _checkForAchievements(self, member: Member, dcUserDb: DiscordUser):
         """
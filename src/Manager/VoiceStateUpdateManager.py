@@ -6,12 +6,14 @@ from datetime import datetime
 from discord import Member, VoiceState, Client
 from sqlalchemy import null
 
-from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUserAsync
 from src.InheritedCommands.NameCounter.FelixCounter import FelixCounter
 from src.Manager.ChannelManager import ChannelService
-from src.Manager.DatabaseManager import getSession
+from src.Manager.DatabaseManager import getAsyncSession
 from src.Manager.LogManager import Events, LogService
+from src.Manager.MemberProfileManager import MemberProfileManager
 from src.Manager.NotificationManager import NotificationService
+from src.Manager.PresenceLedgerManager import PresenceLedgerManager
 from src.Services.QuestService import QuestService, QuestType
 from src.Services.WhatsAppService import WhatsAppHelper
 
@@ -35,6 +37,7 @@ class VoiceStateUpdateService:
         self.felixCounter = FelixCounter(self.client)
         self.channelService = ChannelService(self.client)
         self.questService = QuestService(self.client)
+        self.presenceLedgerManager = PresenceLedgerManager()
 
     async def handleVoiceStateUpdate(self, member: Member, voiceStateBefore: VoiceState, voiceStateAfter: VoiceState):
         """
@@ -58,15 +61,23 @@ class VoiceStateUpdateService:
 
             return
 
-        if not (session := getSession()):
+        # runs for every voice state update, so the queries must not block the event loop
+        if not (session := getAsyncSession()):
             return
 
-        if not (dcUserDb := getDiscordUser(member, session)):
+        if not (dcUserDb := await getDiscordUserAsync(member, session)):
             logger.error(f"couldn't fetch DiscordUser for {member.display_name}")
-            session.close()
+            await session.close()
 
             return
 
+        # written to the database with the next minutely job
+        self.presenceLedgerManager.recordVoiceStateUpdate(dcUserDb, voiceStateBefore, voiceStateAfter)
+
+        # the last time online changes with joining and leaving
+        if bool(voiceStateBefore.channel) != bool(voiceStateAfter.channel):
+            MemberProfileManager().invalidate(member.id)
+
         async def runLogService(event: Events):
             # runs the log service, so we don't need the exception handling all the time
             try:
@@ -97,10 +108,10 @@ class VoiceStateUpdateService:
 
             # commit here to avoid having a lock on the user
             try:
-                session.commit()
+                await session.commit()
             except Exception as error:
                 logger.error("couldn't commit changes", exc_info=error)
-                session.close()
+                await session.close()
 
                 return
 
@@ -111,21 +122,22 @@ class VoiceStateUpdateService:
 
             try:
                 await self.felixCounter.checkFelixCounterAndSendStopMessage(member, dcUserDb, session)
-                print("finished")
             except Exception as error:
                 logger.error(f"failure while running felix timer for {dcUserDb}", exc_info=error)
 
             # save user so a whatsapp message can be sent properly
             try:
-                session.commit()
+                await session.commit()
             except Exception as error:
                 logger.error(f"couldn't commit changes for {dcUserDb}", exc_info=error)
-                session.close()
+                await session.close()
 
                 return
 
             try:
-                self.waHelper.sendOnlineNotification(dcUserDb, voiceStateAfter, session)
+                await session.run_sync(lambda syncSession: self.waHelper.sendOnlineNotification(dcUserDb,
+                                                                                                voiceStateAfter,
+                                                                                                syncSession, ))
             except Exception as error:
                 logger.error(f"failure while running sendOnlineNotification for {dcUserDb}", exc_info=error)
 
@@ -240,11 +252,15 @@ class VoiceStateUpdateService:
 
                 dcUserDb.channel_id = str(voiceStateAfter.channel.id)
 
+                channelName = voiceStateAfter.channel.name
+
                 try:
-                    self.waHelper.switchChannelFromOutstandingMessages(dcUserDb,
-                                                                       voiceStateAfter.channel.name,
-                                                                       member,
-                                                                       session, )
+                    await session.run_sync(lambda syncSession: self.waHelper.switchChannelFromOutstandingMessages(
+                        dcUserDb,
+                        channelName,
+                        member,
+                        syncSession,
+                    ))
                 except Exception as error:
                     logger.error(f"failure while running switchChannelFromOutstandingMessages for {dcUserDb}",
                                  exc_info=error, )
@@ -262,7 +278,10 @@ class VoiceStateUpdateService:
             logger.debug(f"{member.display_name} left channel")
 
             try:
-                self.waHelper.sendOfflineNotification(dcUserDb, voiceStateBefore, member, session)
+                await session.run_sync(lambda syncSession: self.waHelper.sendOfflineNotification(dcUserDb,
+                                                                                                 voiceStateBefore,
+                                                                                                 member,
+                                                                                                 syncSession, ))
             except Exception as error:
                 logger.error(f"failure while running switchChannelFromOutstandingMessages for {member}",
                              exc_info=error, )
@@ -285,8 +304,8 @@ class VoiceStateUpdateService:
             logger.error(f"unexpected voice state update from {dcUserDb}")
 
         try:
-            session.commit()
+            await session.commit()
         except Exception as error:
             logger.error("couldn't commit changes", exc_info=error)
         finally:
-            session.close()
+            await session.close()
@@ -5,15 +5,15 @@ from discord import Client
 from discord import Member
 from sqlalchemy import select, insert
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.orm.session import Session
 
 from src.DiscordParameters.AchievementParameter import AchievementParameter
 from src.Entities.Counter.Entity.Counter import Counter
-from src.Entities.Counter.Entity.CounterDiscordMapping import CounterDiscordMapping
-from src.Entities.Counter.Repository.CounterRepository import getCounterDiscordMapping
+from src.Entities.Counter.Repository.CounterRepository import getCounterDiscordMapping, getRankingPlace, \
+    getTopPlacesOfCounters
 from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser
 from src.Id.RoleId import RoleId
 from src.Manager.DatabaseManager import getSession
+from src.Manager.MemberProfileManager import MemberProfileManager
 from src.Manager.NotificationManager import NotificationService
 from src.Manager.TTSManager import TTSService
 from src.Services.ExperienceService import ExperienceService
@@ -143,47 +143,20 @@ class CounterService:
 
             return "Es gab einen Fehler!"
 
+        # the counters are still listed if the ranking is not available
+        topPlaces = getTopPlacesOfCounters(session) or {}
         answer = "__Es gibt folgende Counter:__\n\n"
 
         for index, counter in enumerate(counters, 1):
             answer += f"{index}. {counter.name.capitalize()} - {counter.description}\n"
 
+            if places := topPlaces.get(counter.id):
+                answer += "   " + ", ".join(f"{place}. {username} ({value})" for place, username, value in places) + "\n"
+
         session.close()
 
         return answer
 
-    def _getRankingPlace(self, member: Member, counterName: str, session: Session) -> int:
-        """
-        Returns the current place of the given member for the given counter
-
-        :param member: Member to get the ranking place for
-        :param counterName: Counter to get the ranking place for
-        """
-        # noinspection PyTypeChecker
-        getQuery = (select(CounterDiscordMapping)
-                    .where(CounterDiscordMapping.counter_id == (select(Counter.id)
-                                                                .where(Counter.name == counterName.lower())
-                                                                .scalar_subquery()))
-                    .order_by(CounterDiscordMapping.value.desc()))
-        place = -1
-
-        try:
-            # fetch all CounterDiscordMappings for the Counter and find the requestedUser and thus his place in the
-            # ranking
-            counterMapping = session.scalars(getQuery).all()
-        except Exception as error:
-            logger.error(f"couldn't fetch all CounterDiscordMappings for Counter: {counterName}", exc_info=error)
-        else:
-            place = 1
-
-            for mapping in counterMapping:
-                if mapping.discord_user.user_id == str(member.id):
-                    break
-
-                place += 1
-
-        return place
-
     async def accessNameCounterAndEdit(self, counterName: str,
                                        requestedUser: Member,
                                        requestingMember: Member,
@@ -238,8 +211,11 @@ class CounterService:
             return "Es gab einen Fehler!"
 
         if not param:
+            place = getRankingPlace(counterDiscordMapping, session)
+            session.close()
+
             return (f"<@{requestedUser.id}> hat einen {counterName.capitalize()}-Counter von "
-                    f"{counterDiscordMapping.value}{'' if (place := self._getRankingPlace(requestedUser, counterName, session)) == -1 else ' und landet damit auf Platz ' + str(place)}.")
+                    f"{counterDiscordMapping.value}{'' if not place else ' und landet damit auf Platz ' + str(place)}.")
 
         try:
             value: int = int(param)
@@ -307,6 +283,10 @@ class CounterService:
 
             return "Es gab einen Fehler!"
 
+        place = getRankingPlace(counterDiscordMapping, session)
+        session.close()
+        MemberProfileManager().invalidate(requestedUser.id)
+
         if requestedUser.voice and tts:
             logger.debug(f"playing TTS for {requestedUser.name}, because {requestingMember.name} increased "
                          f"the {counterName}-Counter")
@@ -335,5 +315,5 @@ class CounterService:
         return (f"Der {counterName.capitalize()}-Counter von <@{requestedUser.id}> wurde um {value} erhöht! "
                 f"<@{requestedUser.id}> hat nun insgesamt {counterDiscordMapping.value} "
                 f"{counterName.capitalize()}-Counter"
-                f"{'' if (place := self._getRankingPlace(requestedUser, counterName, session)) == -1 else ' und landet damit auf Platz ' + str(place)}."
+                f"{'' if not place else ' und landet damit auf Platz ' + str(place)}."
                 + answerAppendix)
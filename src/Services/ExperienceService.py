@@ -5,20 +5,116 @@ import logging
 import random
 import string
 from datetime import datetime, timedelta
+from functools import partial
 from typing import Any
 
 from discord import Client, Member
-from sqlalchemy import null, select
+from sqlalchemy import null, select, update, case, Null, func, text, ColumnElement, and_
 
 from src.DiscordParameters.AchievementParameter import AchievementParameter
 from src.DiscordParameters.ExperienceParameter import ExperienceParameter
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
 from src.Entities.Experience.Entity.Experience import Experience
-from src.Entities.Experience.Repository.ExperienceRepository import getExperience
+from src.Entities.Experience.Repository.ExperienceRepository import getExperience, getExperiencesForMembers
 from src.Id.GuildId import GuildId
 from src.Manager.AchievementManager import AchievementService
-from src.Manager.DatabaseManager import getSession
+from src.Manager.DatabaseManager import getSession, stageChange
 
 logger = logging.getLogger("KVGG_BOT")
+# xp and boost reductions queued by the minutely job, they are written with flushQueuedExperience
+queuedExperiences: list[tuple[Member, int]] = []
+queuedXpBoostsReductions: list[Member] = []
+
+
+def _getRemainingMinutes(xp: Experience, boost: dict[str, Any]) -> int:
+    """
+    Returns the remaining minutes of an active boost: its duration minus the eligible minutes passed since its
+    activation. Boosts activated before the boost clock existed count from zero.
+    """
+    return boost['remaining'] - (xp.xp_boost_minutes - boost.get('activated_at', 0))
+
+
+def getActiveXpBoosts(xp: Experience) -> list[dict[str, Any]]:
+    """
+    Returns the boosts of the Experience that are still running. Their remaining minutes are calculated from the
+    eligible minutes (xp_boost_minutes) passed since their activation.
+
+    :param xp: Experience to read the boosts from
+    :return: Copies of the running boosts with the actual remaining minutes
+    """
+    return [{**boost, 'remaining': remaining}
+            for boost in xp.active_xp_boosts or []
+            if (remaining := _getRemainingMinutes(xp, boost)) > 0]
+
+
+# columns of the boosts in MySQL, its json_each counterpart JSON_TABLE is not supported by SQLAlchemy
+_MYSQL_BOOSTS = ("FROM JSON_TABLE(experience.active_xp_boosts, '$[*]' COLUMNS ("
+                 "content JSON PATH '$', "
+                 "remaining BIGINT PATH '$.remaining', "
+                 "activated_at BIGINT PATH '$.activated_at' DEFAULT '0' ON EMPTY)) AS boost ")
+_MYSQL_REMAINING = "boost.remaining - (experience.xp_boost_minutes - boost.activated_at)"
+
+
+def _getBoostsAndRemainingMinutes() -> tuple[Any, ColumnElement]:
+    """
+    Returns the boosts of the updated Experience as a table valued json_each and the expression of their remaining
+    minutes.
+    """
+    boost = func.json_each(Experience.active_xp_boosts).table_valued("value").alias("boost")
+    remaining = (func.json_extract(boost.c.value, "$.remaining")
+                 - (Experience.xp_boost_minutes
+                    - func.coalesce(func.json_extract(boost.c.value, "$.activated_at"), 0)))
+
+    return boost, remaining
+
+
+def _getRunningBoosts(dialectName: str) -> ColumnElement:
+    """
+    Returns the boosts of the updated Experience that are still running as a subquery, NULL if none are left.
+
+    :param dialectName: Name of the dialect of the database, the JSON functions differ
+    """
+    if dialectName == "mysql":
+        # JSON_ARRAYAGG returns NULL without rows
+        return text(f"(SELECT JSON_ARRAYAGG(boost.content) {_MYSQL_BOOSTS}WHERE {_MYSQL_REMAINING} > 0)")
+
+    boost, remaining = _getBoostsAndRemainingMinutes()
+
+    # json_group_array returns an empty array without rows
+    return (select(func.nullif(func.json_group_array(func.json(boost.c.value)), "[]"))
+            .where(remaining > 0)
+            .scalar_subquery())
+
+
+def _hasExpiredBoosts(dialectName: str) -> ColumnElement:
+    """
+    Returns whether the updated Experience has boosts without remaining minutes.
+
+    :param dialectName: Name of the dialect of the database, the JSON functions differ
+    """
+    if dialectName == "mysql":
+        return text(f"EXISTS (SELECT 1 {_MYSQL_BOOSTS}WHERE {_MYSQL_REMAINING} <= 0)")
+
+    boost, remaining = _getBoostsAndRemainingMinutes()
+
+    return select(boost.c.value).where(remaining <= 0).exists()
+
+
+def activateXpBoosts(xp: Experience, boosts: list[dict[str, Any]]) -> list[dict[str, Any]] | Null:
+    """
+    Returns the new active boosts of the Experience with the given boosts activated. Expired boosts are dropped.
+
+    :param xp: Experience the boosts are activated for
+    :param boosts: Boosts from the inventory, 'remaining' being their full duration
+    :return: Active boosts to save, null() if there are none
+    """
+    activeBoosts = [boost
+                    for boost in xp.active_xp_boosts or []
+                    if _getRemainingMinutes(xp, boost) > 0]
+    activeBoosts += [{**boost, 'activated_at': xp.xp_boost_minutes} for boost in boosts]
+
+    # otherwise the string "null" would be in the database, not <null>
+    return activeBoosts if activeBoosts else null()
 
 
 def isDoubleWeekend(date: datetime) -> bool:
@@ -425,6 +521,8 @@ class ExperienceService:
 
             return "Es gab einen Fehler!"
 
+        activeBoosts: list[dict[str, Any]] = getActiveXpBoosts(xp)
+
         # list all boosts in the (active) inventory
         if action == 'list':
             logger.debug(f"list-action used by {member.display_name}")
@@ -436,11 +534,10 @@ class ExperienceService:
 
                 reply += "**__Du hast keine XP-Boosts in deinem Inventar!__**"
 
-                if xp.active_xp_boosts:
+                if activeBoosts:
                     reply += "\n\n**__Du hast folgende aktive XP-Boosts__**:\n"
-                    inventory: list[dict[str, Any]] = xp.active_xp_boosts
 
-                    for index, item in enumerate(inventory, start=1):
+                    for index, item in enumerate(activeBoosts, start=1):
                         reply += (f"{index}. {item['description']}-Boost, der noch für {item['remaining']} Minuten "
                                   f"{item['multiplier']}-Fach XP gibt\n")
 
@@ -459,11 +556,10 @@ class ExperienceService:
 
             reply = reply.rstrip("\n")
 
-            if xp.active_xp_boosts:
+            if activeBoosts:
                 reply += "\n\n**__Du hast folgende aktive XP-Boosts__**:\n"
-                activeInventory: list[dict[str, Any]] = xp.active_xp_boosts
 
-                for index, item in enumerate(activeInventory, start=1):
+                for index, item in enumerate(activeBoosts, start=1):
                     reply += (f"{index}. {item['description']}-Boost, der noch für {item['remaining']} Minuten "
                               f"{item['multiplier']}-Fach XP gibt\n")
 
@@ -486,89 +582,33 @@ class ExperienceService:
                 return "Du hast keine XP-Boosts in deinem Inventar!"
 
             # too many xp boosts are active, cant activate another one
-            if xp.active_xp_boosts and len(xp.active_xp_boosts) >= ExperienceParameter.MAX_XP_BOOSTS_INVENTORY.value:
+            if len(activeBoosts) >= ExperienceParameter.MAX_XP_BOOSTS_INVENTORY.value:
                 logger.debug(f"too many boosts active for {member.display_name}")
                 session.close()
 
                 return "Du hast zu viele aktive XP-Boosts! Warte bis einer ausgelaufen ist und probiere " \
                        "es erneut!"
 
+            inventory: list[dict[str, Any]] = copy.deepcopy(xp.xp_boosts_inventory)
+
             # inventory use all
             if row == 'all':
                 logger.debug(f"use all boosts for {member.display_name}")
-                # list to keep track of which boosts will be used
-                usedBoosts = []
-
-                currentInventory: list[dict[str, Any]] | None \
-                    = copy.deepcopy(xp.xp_boosts_inventory) if xp.xp_boosts_inventory else None
-                activeBoosts: list[dict[str, Any]] | None \
-                    = copy.deepcopy(xp.active_xp_boosts) if xp.active_xp_boosts else None
-                maxValue: int = ExperienceParameter.MAX_XP_BOOSTS_INVENTORY.value
-
-                # empty active boosts and fewer then max boosts => can use all boosts at once
-                if currentInventory and not activeBoosts and len(currentInventory) <= maxValue:
-                    logger.debug(f"no active boosts, all will fit for {member.display_name}")
-
-                    xp.active_xp_boosts = copy.deepcopy(xp.xp_boosts_inventory)
-                    usedBoosts = copy.deepcopy(xp.xp_boosts_inventory)
-                    xp.xp_boosts_inventory = None
-                # xp boosts can fit into active
-                elif currentInventory and activeBoosts and (len(currentInventory) + len(activeBoosts) <= maxValue):
-                    logger.debug(f"active boosts present, but new ones fit for {member.display_name}")
-
-                    usedBoosts = copy.deepcopy(xp.xp_boosts_inventory)
-                    inventory: list[dict[str, Any]] | None = copy.deepcopy(xp.xp_boosts_inventory)
-                    activeBoosts: list[dict[str, Any]] = copy.deepcopy(xp.active_xp_boosts)
-                    xp.active_xp_boosts = activeBoosts + inventory
-                    xp.xp_boosts_inventory = None
-                # not all xp-boosts fit into active ones
-                else:
-                    logger.debug(f"active boosts, choose only fitting ones for {member.display_name}")
-
-                    if not activeBoosts:
-                        activeBoosts = []
-
-                    currentPosInInventory = 0
-                    numXpBoosts = len(activeBoosts)
-                    inventoryAfter: list[dict[str, Any]] = copy.deepcopy(xp.xp_boosts_inventory)
-
-                    while (numXpBoosts < ExperienceParameter.MAX_XP_BOOSTS_INVENTORY.value
-                           and currentPosInInventory < len(currentInventory)):
-                        currentBoost = currentInventory[currentPosInInventory]
-
-                        usedBoosts.append(currentBoost)
-                        activeBoosts.append(currentBoost)
-                        inventoryAfter.remove(currentBoost)
-
-                        currentPosInInventory += 1
-                        numXpBoosts += 1
-
-                    xp.xp_boosts_inventory = inventoryAfter if len(inventoryAfter) > 0 else None
-                    xp.active_xp_boosts = activeBoosts
+
+                # only as many boosts as there are free active slots, the rest stays in the inventory
+                freeSlots = ExperienceParameter.MAX_XP_BOOSTS_INVENTORY.value - len(activeBoosts)
+                usedBoosts: list[dict[str, Any]] = inventory[:freeSlots]
+                inventory = inventory[freeSlots:]
 
                 answer = "**__Alle (möglichen) XP-Boosts wurden eingesetzt:__**\n"
 
                 for index, boost in enumerate(usedBoosts, start=1):
                     answer += (f"{index}. {boost['description']}-Boost, der für {boost['remaining']} Minuten "
                                f"{boost['multiplier']}-Fach XP gibt\n")
-
             # !inventory use 1
             else:
                 logger.debug(f"using boosts in specific row for {member.display_name}")
 
-                # inventory empty
-                if not xp.xp_boosts_inventory:
-                    logger.debug(f"no boosts in inventory for {member.display_name}")
-
-                    return "Du hast keine XP-Boosts in deinem Inventar!"
-                # active inventory full
-                elif (xp.active_xp_boosts
-                      and len(xp.active_xp_boosts) >= ExperienceParameter.MAX_XP_BOOSTS_INVENTORY.value):
-                    logger.debug(f"too many active boosts for {member.display_name}")
-                    session.close()
-
-                    return "Du hast zu viele aktive XP-Boosts! Warte bis einer ausgelaufen ist und probiere es erneut!"
-
                 try:
                     if not row:
                         raise ValueError
@@ -579,40 +619,21 @@ class ExperienceService:
 
                     return "Bitte gib eine korrekte Zeilennummer ein!"
 
-                inventory: list[dict[str, Any]] = copy.deepcopy(xp.xp_boosts_inventory)
-
-                if len(inventory) >= row > 0:
-                    chosenXpBoost = inventory[row - 1]
-
-                    if not xp.active_xp_boosts:
-                        activeXpBoosts: list[dict[str, Any]] = []
-                    else:
-                        activeXpBoosts: list[dict[str, Any]] = copy.deepcopy(xp.active_xp_boosts)
-
-                    inventory.remove(chosenXpBoost)
-                    activeXpBoosts.append(chosenXpBoost)
-
-                    if not inventory:
-                        xp.xp_boosts_inventory = None
-                    else:
-                        xp.xp_boosts_inventory = inventory
-
-                    xp.active_xp_boosts = activeXpBoosts
-
-                    answer = (f"Dein XP-Boost wurde eingesetzt! Für die nächsten {chosenXpBoost['remaining']} "
-                              f"Minuten bekommst du {chosenXpBoost['multiplier']}-Fach XP!")
-                else:
+                if not len(inventory) >= row > 0:
                     logger.debug(f"number out of range for {member.display_name}")
                     session.close()
 
                     return "Deine Eingabe war ungültig!"
 
-        # otherwise the string "null" would be in the database, not <null>
-        if xp.xp_boosts_inventory is None:
-            xp.xp_boosts_inventory = null()
+                chosenXpBoost = inventory.pop(row - 1)
+                usedBoosts = [chosenXpBoost]
+
+                answer = (f"Dein XP-Boost wurde eingesetzt! Für die nächsten {chosenXpBoost['remaining']} "
+                          f"Minuten bekommst du {chosenXpBoost['multiplier']}-Fach XP!")
 
-        if xp.active_xp_boosts is None:
-            xp.active_xp_boosts = null()
+            # otherwise the string "null" would be in the database, not <null>
+            xp.xp_boosts_inventory = inventory if inventory else null()
+            xp.active_xp_boosts = activateXpBoosts(xp, usedBoosts)
 
         try:
             session.commit()
@@ -637,105 +658,203 @@ class ExperienceService:
         """
         logger.debug(f"{member.display_name} gets XP")
 
+        await self.addExperiences([(member, experienceParameter)])
+
+    async def addExperiences(self, experiences: list[tuple[Member, int]]):
+        """
+        Adds the given amounts of xp to the given members. All Experiences are loaded at once, multiplied by their
+        active boosts (and the double-xp-weekend) and added to the stored amounts with a single UPDATE.
+
+        :param experiences: Pairs of member and base amount of xp, a member may occur multiple times
+        """
+        if not experiences:
+            return
+
         if not (session := getSession()):
             return
 
-        xp = getExperience(member, session)
+        xps = getExperiencesForMembers((member for member, _ in experiences), session)
+        doubleWeekend = isDoubleWeekend(datetime.now())
+        # snowflake -> (member, added amount)
+        deltas: dict[int, tuple[Member, int]] = {}
 
-        if not xp:
-            logger.error("couldn't fetch experience")
+        for member, experienceParameter in experiences:
+            if not (xp := xps.get(member.id)):
+                logger.error(f"couldn't fetch experience for {member.display_name}")
 
-            return
+                continue
 
-        xpAmountBefore = xp.xp_amount
-        toBeAddedXpAmount = experienceParameter
+            _, delta = deltas.get(member.id, (member, 0))
+            deltas[member.id] = (member,
+                                 delta + self._calculateExperience(experienceParameter,
+                                                                   getActiveXpBoosts(xp),
+                                                                   doubleWeekend, ), )
 
-        if xp.active_xp_boosts:
-            logger.debug("multiply xp with active boosts")
+        if not deltas:
+            session.close()
 
-            for boost in xp.active_xp_boosts:
-                # don't add the base experience everytime
-                toBeAddedXpAmount += experienceParameter * boost['multiplier'] - experienceParameter
+            return
 
-        if toBeAddedXpAmount == experienceParameter:
-            if isDoubleWeekend(datetime.now()):
-                xp.xp_amount = xpAmountBefore + experienceParameter * ExperienceParameter.XP_WEEKEND_VALUE.value
-            else:
-                xp.xp_amount = xpAmountBefore + experienceParameter
-        else:
-            if isDoubleWeekend(datetime.now()):
-                xp.xp_amount = (xpAmountBefore + toBeAddedXpAmount
-                                + experienceParameter * ExperienceParameter.XP_WEEKEND_VALUE.value)
-            else:
-                xp.xp_amount = xpAmountBefore + toBeAddedXpAmount
+        idsBySnowflake = {memberId: xps[memberId].id for memberId in deltas}
+        # added by the database, xp granted concurrently (e.g. by a command) can't be overwritten
+        # noinspection PyTypeChecker
+        updateQuery = (update(Experience)
+                       .where(Experience.id.in_(idsBySnowflake.values()))
+                       .values(xp_amount=func.coalesce(Experience.xp_amount, 0)
+                                         + case({idsBySnowflake[memberId]: delta
+                                                 for memberId, (_, delta) in deltas.items()},
+                                                value=Experience.id, ))
+                       .execution_options(synchronize_session=False))
 
-        # convert to int because of worst meme boost
-        xp.xp_amount = int(xp.xp_amount)
+        if returning := session.get_bind().dialect.update_returning:
+            updateQuery = updateQuery.returning(Experience.id, Experience.xp_amount)
 
         try:
+            result = session.execute(updateQuery)
+
+            if returning:
+                xpAmountsById: dict[int, int] = dict(result.all())
+            else:
+                # MySQL can't return the updated amounts, concurrently granted xp is not seen for the achievements
+                xpAmountsById = {xps[memberId].id: (xps[memberId].xp_amount or 0) + delta
+                                 for memberId, (_, delta) in deltas.items()}
+
             session.commit()
         except Exception as error:
-            logger.error(f"error while committing increased experience for {member.display_name}", exc_info=error)
-
-        # 99 mod 10 > 101 mod 10 -> achievement for 100
-        if (xpAmountBefore % AchievementParameter.XP_AMOUNT.value
-                > xp.xp_amount % AchievementParameter.XP_AMOUNT.value):
-            await (self
-                   .achievementService
-                   .sendAchievementAndGrantBoost(member,
-                                                 AchievementParameter.XP,
-                                                 (xp.xp_amount -
-                                                  (xp.xp_amount % AchievementParameter.XP_AMOUNT.value))))
+            logger.error(f"error while committing increased experience for {len(deltas)} members", exc_info=error)
+            session.rollback()
+            session.close()
+
+            return
 
         session.close()
+        logger.debug(f"increased experience for {len(deltas)} members")
+
+        for memberId, (member, delta) in deltas.items():
+            xpAmount = xpAmountsById[idsBySnowflake[memberId]]
+            xpAmountBefore = xpAmount - delta
+
+            # 99 mod 10 > 101 mod 10 -> achievement for 100
+            if (xpAmountBefore % AchievementParameter.XP_AMOUNT.value
+                    > xpAmount % AchievementParameter.XP_AMOUNT.value):
+                await (self
+                       .achievementService
+                       .sendAchievementAndGrantBoost(member,
+                                                     AchievementParameter.XP,
+                                                     (xpAmount - (xpAmount % AchievementParameter.XP_AMOUNT.value))))
+
+    # noinspection PyMethodMayBeStatic
+    def _calculateExperience(self,
+                             experienceParameter: int,
+                             activeBoosts: list[dict[str, Any]] | None,
+                             doubleWeekend: bool, ) -> int:
+        """
+        Calculates the amount of xp to add for the given base amount, the active boosts and the double-xp-weekend.
 
-    def reduceXpBoostsTime(self, member: Member):
+        :param experienceParameter: Base amount of xp
+        :param activeBoosts: Active xp boosts of the member
+        :param doubleWeekend: Whether it is double-xp-weekend
+        :return: int - converted to int because of worst meme boost
         """
-        Reduces the active boosts time from the given member.
+        toBeAddedXpAmount = experienceParameter
+
+        if activeBoosts:
+            # don't add the base experience everytime
+            toBeAddedXpAmount += sum(experienceParameter * boost['multiplier'] - experienceParameter
+                                     for boost in activeBoosts)
+
+        if toBeAddedXpAmount == experienceParameter:
+            if doubleWeekend:
+                return int(experienceParameter * ExperienceParameter.XP_WEEKEND_VALUE.value)
+
+            return int(experienceParameter)
+
+        if doubleWeekend:
+            return int(toBeAddedXpAmount + experienceParameter * ExperienceParameter.XP_WEEKEND_VALUE.value)
 
-        :param member:
+        return int(toBeAddedXpAmount)
+
+    # noinspection PyMethodMayBeStatic
+    def queueExperience(self, member: Member, experienceParameter: int):
         """
-        if not (session := getSession()):
-            return
+        Queues the given amount of xp for the member, it is added with the next flushQueuedExperience.
 
-        if not (xp := getExperience(member, session)):
-            logger.error(f"couldn't fetch Experience for {member.display_name}")
-            session.close()
+        :param member: Member who gets the xp
+        :param experienceParameter: Base amount of xp
+        """
+        change = partial(queuedExperiences.append, (member, experienceParameter,))
 
-            return
+        if not stageChange(change):
+            change()
 
-        if not xp.active_xp_boosts:
-            logger.debug(f"no boosts to reduce for {member.display_name}")
-            session.close()
+    # noinspection PyMethodMayBeStatic
+    def queueXpBoostsReduction(self, member: Member):
+        """
+        Queues the reduction of the active boosts of the member, it is run with the next flushQueuedExperience after
+        the queued xp was added.
 
-            return
+        :param member: Member whose boosts are reduced
+        """
+        change = partial(queuedXpBoostsReductions.append, member)
+
+        if not stageChange(change):
+            change()
 
-        boosts = copy.deepcopy(xp.active_xp_boosts)
-        editedBoosts = []
+    async def flushQueuedExperience(self):
+        """
+        Adds all queued xp and reduces the queued boosts afterward, so boosts count for the minute they expire in.
+        """
+        experiences = queuedExperiences.copy()
+        reductions = queuedXpBoostsReductions.copy()
+        queuedExperiences.clear()
+        queuedXpBoostsReductions.clear()
 
-        for boost in boosts:
-            boost['remaining'] = boost['remaining'] - 1
+        await self.addExperiences(experiences)
+        self.reduceXpBoostsTime(reductions)
 
-            if boost['remaining'] > 0:
-                editedBoosts.append(boost)
+    # noinspection PyMethodMayBeStatic
+    def reduceXpBoostsTime(self, members: list[Member]):
+        """
+        Reduces the active boosts time of the given members by advancing their boost clock by one minute. The
+        boosts themselves are only rewritten for the members whose boosts expired with this minute.
 
-        if len(editedBoosts) == 0:
-            boosts = None
-        else:
-            boosts = editedBoosts
+        :param members: Members who spent an eligible minute online
+        """
+        if not members:
+            return
 
-        xp.active_xp_boosts = boosts
+        if not (session := getSession()):
+            return
+
+        dialectName = session.get_bind().dialect.name
+        # noinspection PyTypeChecker
+        isBoosted = and_(Experience.active_xp_boosts.is_not(None),
+                         Experience.discord_user_id.in_(select(DiscordUser.id)
+                                                        .where(DiscordUser.user_id.in_([str(member.id)
+                                                                                        for member in members]))
+                                                        .scalar_subquery()), )
+        # noinspection PyTypeChecker
+        advanceQuery = (update(Experience)
+                        .where(isBoosted)
+                        .values(xp_boost_minutes=Experience.xp_boost_minutes + 1)
+                        .execution_options(synchronize_session=False))
+        # runs after the clock was advanced, so the remaining minutes already include this minute
+        # noinspection PyTypeChecker
+        removeQuery = (update(Experience)
+                       .where(isBoosted, _hasExpiredBoosts(dialectName))
+                       .values(active_xp_boosts=_getRunningBoosts(dialectName))
+                       .execution_options(synchronize_session=False))
 
         try:
+            session.execute(advanceQuery)
+            session.execute(removeQuery)
             session.commit()
         except Exception as error:
-            logger.error(f"couldn't save Experience for {member.display_name}", exc_info=error)
+            logger.error(f"couldn't reduce xp boosts for {len(members)} members", exc_info=error)
             session.rollback()
 
             return
         finally:
             session.close()
 
-        logger.debug(f"reduced xp boosts for {member.display_name}")
-
-        return
+        logger.debug(f"reduced xp boosts for {len(members)} members")
@@ -1,27 +1,37 @@
 import logging
+from collections import defaultdict, Counter
 from datetime import datetime
 from pathlib import Path
 
 import discord
 from discord import Client
 from discord import Member
-from sqlalchemy import select, update
+from sqlalchemy import select, update, tuple_
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from src.DiscordParameters.AchievementParameter import AchievementParameter
 from src.DiscordParameters.StatisticsParameter import StatisticsParameter
 from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUserId
 from src.Entities.Game.Entity.DiscordGame import DiscordGame
 from src.Entities.Game.Entity.GameDiscordMapping import GameDiscordMapping
-from src.Entities.Game.Repository.DiscordGameRepository import getGameDiscordRelation
+from src.Entities.Game.Repository.DiscordGameRepository import getGameDiscordRelation, getDiscordGameId
 from src.Helper.GetFormattedTime import getFormattedTime
 from src.Manager.AchievementManager import AchievementService
-from src.Manager.DatabaseManager import getSession
+from src.Manager.DatabaseManager import getSession, stageChange
+from src.Manager.LeaderboardManager import LeaderboardManager, LeaderboardMetric
 from src.Manager.StatisticManager import StatisticManager
 from src.Services.QuestService import QuestService, QuestType
 
 logger = logging.getLogger("KVGG_BOT")
+# DiscordUser id -> {DiscordGame id: time_played_online} of the relations marked as currently playing, None until
+# loaded from the database
+currentlyPlaying: defaultdict[int, dict[int, int]] | None = None
+# (DiscordUser id, DiscordGame id) -> whether the minute was played online, written with flushGameRelations
+queuedGameMinutes: dict[tuple[int, int], bool] = {}
+# relations that are not played anymore and still have to be unmarked
+stoppedGames: set[tuple[int, int]] = set()
 
 
 class GameDiscordService:
@@ -34,55 +44,22 @@ class GameDiscordService:
         self.statisticManager = StatisticManager(self.client)
         self.achievementService = AchievementService(self.client)
 
-    async def increaseGameRelationsForMember(self, member: Member, session: Session):
+    async def increaseGameRelationsForMember(self, member: Member, dcUserDb: DiscordUser, session: Session):
         """
-        Increases the value of all current activities from the given member.
+        Increases the value of all current activities from the given member. Only games the member started or
+        stopped playing touch the database here, the minutes themselves are queued and written by
+        flushGameRelations.
 
         :param member: The member to increase the values
+        :param dcUserDb: DiscordUser of the given member
         :param session:
         """
-        now = datetime.now()
-        canIncreaseStatistic = False
-        # noinspection PyTypeChecker
-        getQuery = (select(GameDiscordMapping)
-                    .where(GameDiscordMapping.discord_id == (select(DiscordUser.id)
-                                                             .where(DiscordUser.user_id == str(member.id))
-                                                             .scalar_subquery()),
-                           GameDiscordMapping.currently_playing.is_(True), ))
-
-        try:
-            activeRelations = session.scalars(getQuery).all()
-        except Exception as error:
-            logger.error(f"couldn't fetch active relations for {member.display_name}", exc_info=error)
-
+        if (playing := self._getCurrentlyPlaying(session)) is None:
             return
-        else:
-            # empty all active relations
-            if activeRelations:
-                for relation in activeRelations:
-                    relation.currently_playing = False
-
-                try:
-                    session.commit()
-                except Exception as error:
-                    logger.error(f"couldn't update active relations for {member.display_name}", exc_info=error)
-                    session.rollback()
-                    session.close()
-
-                    return
-                else:
-                    logger.debug(f"reset {len(activeRelations)} active relations for {member.display_name}")
-            else:
-                logger.debug(f"no relations found for reset active relations for {member.display_name}")
 
-            try:
-                session.commit()
-            except Exception as error:
-                logger.error(f"couldn't update active relations for {member.display_name}", exc_info=error)
-                session.rollback()
-                session.close()
-
-                return
+        previousGames = playing.get(dcUserDb.id, {})
+        games: dict[int, int] = {}
+        minutes: dict[tuple[int, int], bool] = {}
 
         for activity in member.activities:
             if isinstance(activity, discord.CustomActivity):
@@ -95,65 +72,181 @@ class GameDiscordService:
 
                 continue
 
-            if relation := getGameDiscordRelation(session, member, activity):
-                if member.voice:
-                    relation.time_played_online += 1
-
-                    await self.questService.addProgressToQuest(member, QuestType.ACTIVITY_TIME)
-
-                    if (relation.time_played_online % (AchievementParameter.TIME_PLAYED_HOURS.value * 60)) == 0:
-                        await self.achievementService.sendAchievementAndGrantBoost(member,
-                                                                                   AchievementParameter.TIME_PLAYED,
-                                                                                   relation.time_played_online,
-                                                                                   gameName=relation.discord_game.name, )
-                else:
-                    relation.time_played_offline += 1
-
-                relation.week += 1
-                relation.month += 1
-                relation.year += 1
-                relation.last_played = now
-                canIncreaseStatistic = True
-                relation.currently_playing = True
-
-                try:
-                    session.commit()
-                except Exception as error:
-                    logger.error(f"couldn't save GameDiscordMapping for {member.display_name} and {activity.name}",
-                                 exc_info=error, )
-                    session.rollback()
+            if not (gameId := getDiscordGameId(activity, session)):
+                logger.error("couldn't fetch game, continuing")
 
-                    continue
-                else:
-                    logger.debug(f"increased {activity.name} for {member.display_name}")
+                continue
+
+            # the same game can show up as several activities
+            if gameId in games:
+                continue
+
+            if gameId in previousGames:
+                games[gameId] = previousGames[gameId]
+            # started playing: the relation is fetched (and created if necessary) only once
+            elif relation := getGameDiscordRelation(session, member, activity):
+                games[gameId] = relation.time_played_online
+                logger.debug(f"{member.display_name} started playing {activity.name}")
             else:
                 logger.error("couldn't fetch game_discord_relation, continuing")
 
                 continue
 
-        if canIncreaseStatistic:
-            self.statisticManager.increaseStatistic(StatisticsParameter.ACTIVITY, member, session)
-            logger.debug(f"increased activity statistics for {member.display_name}")
+            if member.voice:
+                games[gameId] += 1
 
-    # noinspection PyMethodMayBeStatic
-    def getOverallPlayedTime(self, member: Member, dcUserDb: DiscordUser, session: Session) -> str | None:
+                await self.questService.addProgressToQuest(member, QuestType.ACTIVITY_TIME)
+
+                if (games[gameId] % (AchievementParameter.TIME_PLAYED_HOURS.value * 60)) == 0:
+                    await self.achievementService.sendAchievementAndGrantBoost(member,
+                                                                               AchievementParameter.TIME_PLAYED,
+                                                                               games[gameId],
+                                                                               gameName=session.get(DiscordGame,
+                                                                                                    gameId).name, )
+
+            minutes[(dcUserDb.id, gameId)] = bool(member.voice)
+            logger.debug(f"queued {activity.name} for {member.display_name}")
+
+        stopped = {(dcUserDb.id, gameId) for gameId in previousGames.keys() - games.keys()}
+
+        if stopped:
+            logger.debug(f"{member.display_name} stopped playing {len(stopped)} games")
+
+        def change():
+            queuedGameMinutes.update(minutes)
+            stoppedGames.difference_update(minutes.keys())
+            stoppedGames.update(stopped)
+
+            if games:
+                playing[dcUserDb.id] = games
+            else:
+                playing.pop(dcUserDb.id, None)
+
+        if not stageChange(change):
+            change()
+
+        if games:
+            self.statisticManager.queueStatistic(StatisticsParameter.ACTIVITY, dcUserDb)
+            logger.debug(f"queued activity statistics for {member.display_name}")
+
+    @staticmethod
+    def _getCurrentlyPlaying(session: Session) -> dict[int, dict[int, int]] | None:
+        """
+        Returns the relations marked as currently playing, they are loaded from the database on the first call.
         """
-        Returns the overall played time of the given member
+        global currentlyPlaying
+
+        if currentlyPlaying is not None:
+            return currentlyPlaying
+
+        # noinspection PyTypeChecker
+        getQuery = (select(GameDiscordMapping.discord_id,
+                           GameDiscordMapping.discord_game_id,
+                           GameDiscordMapping.time_played_online, )
+                    .where(GameDiscordMapping.currently_playing.is_(True)))
+
+        try:
+            relations = session.execute(getQuery).all()
+        except Exception as error:
+            logger.error("couldn't fetch currently played games", exc_info=error)
+
+            return None
+
+        currentlyPlaying = defaultdict(dict)
+
+        for discordId, gameId, timePlayedOnline in relations:
+            currentlyPlaying[discordId][gameId] = timePlayedOnline
+
+        logger.debug(f"loaded {len(relations)} currently played games")
+
+        return currentlyPlaying
+
+    @staticmethod
+    def resetCurrentlyPlaying(session: Session):
+        """
+        Unmarks all games, e.g. after a restart: members who went offline while the bot was down never run through
+        the minutely job again to unmark theirs. Games still played are marked again in the next minute.
 
-        :param member: The member to get the overall played time
-        :param dcUserDb: DiscordUser of the given member
         :param session: The session for the database
         """
+        global currentlyPlaying
+
+        # noinspection PyTypeChecker
+        updateQuery = (update(GameDiscordMapping)
+                       .where(GameDiscordMapping.currently_playing.is_(True))
+                       .values(currently_playing=False)
+                       .execution_options(synchronize_session=False))
+
         try:
-            result = session.query(text("SUM(time_played_online) + SUM(time_played_offline) "
-                                        "FROM game_discord_mapping "
-                                        "WHERE discord_id = :id")).params(id=dcUserDb.id)
+            result = session.execute(updateQuery)
+            session.commit()
         except Exception as error:
-            logger.error(f"couldn't get overall played time for {member.display_name}", exc_info=error)
+            logger.error("couldn't unmark the currently played games", exc_info=error)
+            session.rollback()
 
-            return None
+            return
+
+        currentlyPlaying = defaultdict(dict)
+        stoppedGames.clear()
+        logger.debug(f"unmarked {result.rowcount} currently played games")
+
+    @staticmethod
+    def flushGameRelations(session: Session) -> bool:
+        """
+        Writes the queued minutes of all members with one UPDATE per online and offline minutes and unmarks the
+        games that are not played anymore.
+
+        :param session: The session for the database
+        """
+        minutes = queuedGameMinutes.copy()
+        stopped = stoppedGames.copy()
+        queuedGameMinutes.clear()
+        stoppedGames.clear()
+
+        if not minutes and not stopped:
+            return True
+
+        now = datetime.now()
+        relation = tuple_(GameDiscordMapping.discord_id, GameDiscordMapping.discord_game_id)
+
+        try:
+            for online, column in ((True, GameDiscordMapping.time_played_online),
+                                   (False, GameDiscordMapping.time_played_offline),):
+                if not (relations := [key for key, playedOnline in minutes.items() if playedOnline == online]):
+                    continue
+
+                # noinspection PyTypeChecker
+                updateQuery = (update(GameDiscordMapping)
+                               .where(relation.in_(relations))
+                               .values({column: column + 1,
+                                        GameDiscordMapping.week: GameDiscordMapping.week + 1,
+                                        GameDiscordMapping.month: GameDiscordMapping.month + 1,
+                                        GameDiscordMapping.year: GameDiscordMapping.year + 1,
+                                        GameDiscordMapping.last_played: now,
+                                        GameDiscordMapping.currently_playing: True, })
+                               .execution_options(synchronize_session=False))
+                session.execute(updateQuery)
+
+            if stopped:
+                # noinspection PyTypeChecker
+                updateQuery = (update(GameDiscordMapping)
+                               .where(relation.in_(list(stopped)))
+                               .values(currently_playing=False)
+                               .execution_options(synchronize_session=False))
+                session.execute(updateQuery)
+
+            session.commit()
+        except Exception as error:
+            logger.error(f"couldn't write {len(minutes)} played minutes, they are lost", exc_info=error)
+            session.rollback()
+
+            return False
+
+        LeaderboardManager().increaseValues(LeaderboardMetric.ACTIVITIES,
+                                            Counter(gameId for _, gameId in minutes.keys()))
+        logger.debug(f"wrote {len(minutes)} played minutes and {len(stopped)} stopped games")
 
-        return getFormattedTime(result[0][0])
+        return True
 
     def chooseRandomGameInChannel(self, member: Member):
         """
@@ -264,9 +357,7 @@ class GameDiscordService:
         for member in members:
             # noinspection PyTypeChecker
             getQuery = (select(GameDiscordMapping)
-                        .where(GameDiscordMapping.discord_id == (select(DiscordUser.id)
-                                                                 .where(DiscordUser.user_id == str(member.id))
-                                                                 .scalar_subquery())))
+                        .where(GameDiscordMapping.discord_id == getDiscordUserId(member)))
             try:
                 relations = session.scalars(getQuery).all()
                 member_game_relations[member.id] = relations
@@ -9,7 +9,7 @@ from sqlalchemy import select
 from sqlalchemy.exc import NoResultFound
 
 from src.DiscordParameters.StatisticsParameter import StatisticsParameter
-from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUserId
 from src.Entities.Statistic.Entity.StatisticLog import StatisticLog
 from src.Manager.DatabaseManager import getEngine
 from src.Services.ProcessUserInput import getTagStringFromId
@@ -30,11 +30,7 @@ class PredictionService:
             getQuery = (
                 select(StatisticLog.created_at, StatisticLog.value)
                 .where(
-                    StatisticLog.discord_user_id == (
-                        select(DiscordUser.id)
-                        .where(DiscordUser.user_id == str(member.id))
-                        .scalar_subquery()
-                    ),
+                    StatisticLog.discord_user_id == getDiscordUserId(member),
                     StatisticLog.statistic_type == StatisticsParameter.ONLINE.value,
                     StatisticLog.type == StatisticsParameter.DAILY.value,
                 )
@@ -6,11 +6,12 @@ from datetime import datetime, timedelta
 
 import discord
 from discord import Message, Client, Member, VoiceChannel
-from sqlalchemy import null
+from sqlalchemy import null, update
 
 from src.DiscordParameters.ExperienceParameter import ExperienceParameter
 from src.DiscordParameters.StatisticsParameter import StatisticsParameter
-from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser, getDiscordUserAsync
 from src.Helper.GetChannelsFromCategory import getVoiceChannelsFromCategoryEnum
 from src.Helper.MoveMembesToVoicechannel import moveMembers
 from src.Helper.ReadParameters import getParameter, Parameters
@@ -21,7 +22,9 @@ from src.Id.GuildId import GuildId
 from src.Id.RoleId import RoleId
 from src.InheritedCommands.NameCounter import FelixCounter as FelixCounterKeyword
 from src.InheritedCommands.Times import UniversityTime, StreamTime, OnlineTime
-from src.Manager.DatabaseManager import getSession
+from src.Manager.DatabaseManager import getSession, getAsyncSession
+from src.Manager.LeaderboardManager import LeaderboardManager, LeaderboardMetric
+from src.Manager.MemberProfileManager import MemberProfileManager
 from src.Manager.NotificationManager import NotificationService
 from src.Manager.StatisticManager import StatisticManager
 from src.Manager.TTSManager import TTSService
@@ -84,10 +87,12 @@ class ProcessUserInput:
         self.notificationService = NotificationService(self.client)
         self.voiceClientService = VoiceClientService(self.client)
         self.ttsService = TTSService()
+        self.leaderboardManager = LeaderboardManager()
 
     async def raiseMessageCounter(self, member: Member, channel, command: bool = False):
         """
-        Increases the message count if the given user if he / she used an interaction
+        Increases the message count if the given user if he / she used an interaction. The xp of a message is not
+        written here, it's queued and credited together with the xp of the next minutely job.
 
         :param member: Member, who called the interaction
         :param channel: Channel, where the interaction was used
@@ -108,37 +113,69 @@ class ProcessUserInput:
 
             return
 
-        if not (session := getSession()):
+        # runs for every message, so the queries must not block the event loop
+        if not (session := getAsyncSession()):
             return
 
-        if not (dcUserDb := getDiscordUser(member, session)):
+        if not (dcUserDb := await getDiscordUserAsync(member, session)):
             logger.error("couldn't fetch DiscordUser!")
+            await session.close()
 
             return
 
-        if channel.id != ChannelId.CHANNEL_BOT_TEST_ENVIRONMENT.value or not getParameter(Parameters.PRODUCTION):
-            logger.debug(f"can grant an increase of the message counter for {dcUserDb}")
+        if channel.id == ChannelId.CHANNEL_BOT_TEST_ENVIRONMENT.value and getParameter(Parameters.PRODUCTION):
+            logger.debug(f"can't grant an increase of the message counter for {dcUserDb}")
 
-            if command:
-                self.statisticManager.increaseStatistic(StatisticsParameter.COMMAND, member, session)
+            try:
+                await session.commit()
+            except Exception as error:
+                logger.error(f"could not commit: {dcUserDb}", exc_info=error)
+            finally:
+                await session.close()
 
-                dcUserDb.command_count_all_time += 1
-            else:
-                await self.questService.addProgressToQuest(member, QuestType.MESSAGE_COUNT)
-                self.statisticManager.increaseStatistic(StatisticsParameter.MESSAGE, member, session)
-                await self.experienceService.addExperience(ExperienceParameter.XP_FOR_MESSAGE.value,
-                                                           member=member, )
+            return
+
+        logger.debug(f"can grant an increase of the message counter for {dcUserDb}")
 
-                dcUserDb.message_count_all_time += 1
+        if command:
+            column, metric, statistic = (DiscordUser.command_count_all_time,
+                                         LeaderboardMetric.COMMAND,
+                                         StatisticsParameter.COMMAND,)
         else:
-            logger.debug(f"can't grant an increase of the message counter for {dcUserDb}")
+            column, metric, statistic = (DiscordUser.message_count_all_time,
+                                         LeaderboardMetric.MESSAGE,
+                                         StatisticsParameter.MESSAGE,)
+
+        # increased by the database, concurrent messages of the same member can't overwrite each other
+        # noinspection PyTypeChecker
+        updateQuery = (update(DiscordUser)
+                       .where(DiscordUser.id == dcUserDb.id)
+                       .values({column: column + 1})
+                       .execution_options(synchronize_session=False))
 
         try:
-            session.commit()
+            await session.execute(updateQuery)
+            await session.commit()
         except Exception as error:
-            logger.error(f"could not commit: {dcUserDb}", exc_info=error)
-        finally:
-            session.close()
+            logger.error(f"could not increase the message counter of {dcUserDb}", exc_info=error)
+            await session.rollback()
+            await session.close()
+
+            return
+
+        self.statisticManager.queueStatistic(statistic, dcUserDb)
+        self.leaderboardManager.increaseValues(metric, {dcUserDb.id: 1})
+
+        if not command:
+            # loaded here, so the quest progress below doesn't query synchronously
+            await session.run_sync(lambda syncSession: self.questService.loadQuestStates(member, syncSession))
+
+        await session.close()
+
+        if not command:
+            # added with the xp of this minute by the minutely job
+            self.experienceService.queueExperience(member, ExperienceParameter.XP_FOR_MESSAGE.value)
+            await self.questService.addProgressToQuest(member, QuestType.MESSAGE_COUNT)
 
     async def moveUsers(self, channel: VoiceChannel, member: Member) -> str:
         """
@@ -279,6 +316,11 @@ class ProcessUserInput:
 
                 return "Die korrigierte Zahl ist kleiner als 0! Bitte verwende eine andere Korrektur!"
 
+            if isinstance(time, OnlineTime.OnlineTime):
+                self.leaderboardManager.setValue(LeaderboardMetric.ONLINE, dcUserDb, onlineAfter)
+            elif isinstance(time, StreamTime.StreamTime):
+                self.leaderboardManager.setValue(LeaderboardMetric.STREAM, dcUserDb, onlineAfter)
+
             try:
                 session.commit()
             except Exception as error:
@@ -289,6 +331,8 @@ class ProcessUserInput:
             finally:
                 session.close()
 
+            MemberProfileManager().invalidate(user.id)
+
             if isinstance(time, OnlineTime.OnlineTime):
                 self.statisticManager.increaseStatistic(StatisticsParameter.ONLINE, user, session, correction)
 
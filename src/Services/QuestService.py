@@ -1,27 +1,31 @@
-import asyncio
 import logging
 import random
 from datetime import datetime
+from functools import partial
 from enum import Enum
 
 from discord import Client, Member
-from sqlalchemy import select, null, insert, delete
+from sqlalchemy import select, insert, delete, update, bindparam
 from sqlalchemy.orm import Session
 
 from src.DiscordParameters.AchievementParameter import AchievementParameter
 from src.DiscordParameters.QuestParameter import QuestDates
-from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
-from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUsersForMembers, getDiscordUserId, \
+    getDiscordUser
 from src.Entities.Quest.Entity.Quest import Quest
 from src.Entities.Quest.Entity.QuestDiscordMapping import QuestDiscordMapping
 from src.Entities.Quest.Repository.QuestDiscordMappingRepository import getQuestDiscordMapping
 from src.Id.GuildId import GuildId
-from src.Manager.DatabaseManager import getSession
+from src.Manager.DatabaseManager import getSession, stageChange
 from src.Manager.NotificationManager import NotificationService
 from src.Services.ExperienceService import ExperienceService
 
 logger = logging.getLogger("KVGG_BOT")
-lock = asyncio.Lock()
+
+# snowflake -> detached QuestDiscordMappings of the member, the source of truth for the progress until flushed
+questStates: dict[int, list[QuestDiscordMapping]] = {}
+# id of QuestDiscordMapping -> changed QuestDiscordMapping that still has to be written to the database
+dirtyQuests: dict[int, QuestDiscordMapping] = {}
 
 
 class QuestType(Enum):
@@ -45,113 +49,188 @@ class QuestService:
         self.notificationService = NotificationService(self.client)
         self.experienceService = ExperienceService(self.client)
 
+    @staticmethod
+    def loadQuestStates(member: Member, session: Session | None = None) -> list[QuestDiscordMapping] | None:
+        """
+        Loads the quests of the member into the in-memory store if they are not cached yet.
+
+        :param member: Member, whose quests will be loaded
+        :param session: Session to load them with, e.g. the one of an AsyncSession via run_sync. If missing, a
+        session of the current unit of work is used.
+        :return: list[QuestDiscordMapping] | None - Cached (detached) quests of the member
+        """
+        if (quests := questStates.get(member.id)) is not None:
+            return quests
+
+        ownSession = session is None
+
+        # joins a running unit of work, a separate transaction could wait for the locks of the unit
+        if ownSession and not (session := getSession()):
+            return None
+
+        # create new quests if necessary - dirty, but easy
+        quests = getQuestDiscordMapping(member, session)
+
+        if quests:
+            # detach the quests, so they keep their state after the commit and are written back by
+            # flushQuestProgress
+            for loadedObject in {*quests, *(quest.quest for quest in quests)}:
+                session.expunge(loadedObject)
+
+        if ownSession:
+            session.close()
+
+        if not quests:
+            logger.error(f"couldn't fetch quests for {member.display_name}")
+
+            return None
+
+        questStates[member.id] = quests
+        logger.debug(f"loaded quests of {member.display_name} into the quest store")
+
+        return quests
+
     async def addProgressToQuest(self, member: Member, questType: QuestType, value: int = 1):
         """
-        Based on the type of quest, the member will earn progress for this quest.
+        Based on the type of quest, the member will earn progress for this quest. The progress is only applied in
+        memory and written to the database by flushQuestProgress.
 
         :param member: Member, whose quests will be checked
         :param questType: Type of quest
         :param value: Optional value to overwrite the standard increase of one
-        :raise ConnectionError: If the database connection cant be established
         """
-        if not (session := getSession()):
-            return
+        change = partial(self._addProgressToQuest, member, questType, value)
 
-        # create new quests if necessary - dirty, but easy
-        if not getQuestDiscordMapping(member, session):
-            logger.error(f"couldn't fetch quests for {member.display_name}")
+        if not stageChange(change):
+            await change()
 
+    async def _addProgressToQuest(self, member: Member, questType: QuestType, value: int):
+        if not (quests := self.loadQuestStates(member)):
             return
 
-        # noinspection PyTypeChecker
-        getQuery = (select(QuestDiscordMapping)
-                    .where(QuestDiscordMapping.quest_id.in_(select(Quest.id)
-                                                            .where(Quest.type == questType.value)
-                                                            .scalar_subquery()),
-                           QuestDiscordMapping.discord_id == (select(DiscordUser.id)
-                                                              .where(DiscordUser.user_id == str(member.id))
-                                                              .scalar_subquery()), ))
-
-        # use lock here to avoid giving spammers more boosts
-        async with lock:
-            try:
-                quests = session.scalars(getQuery).all()
-            except Exception as error:
-                logger.error("failure to fetch quests from database", exc_info=error)
-                session.close()
-
-                return
+        # no lock per member is needed: the progress of all quests is applied before the first await, so concurrent
+        # progress of the member already sees them finished and spammers can't collect more boosts
+        finishedQuests: list[QuestDiscordMapping] = []
 
-            for quest in quests:
-                lastUpdated: datetime | None = quest.time_updated
+        for quest in quests:
+            if quest.quest.type != questType.value:
+                continue
 
-                # special checks for special quests
-                if questType == QuestType.DAYS_ONLINE:
-                    # if its same day the count cant be increased
-                    if lastUpdated and lastUpdated.day == datetime.now().day:
-                        logger.debug(f"lastUpdated: {lastUpdated.day} == now: {datetime.now().day} for {member.name}, "
-                                     f"continuing loop")
+            lastUpdated: datetime | None = quest.time_updated
+
+            # special checks for special quests
+            if questType == QuestType.DAYS_ONLINE:
+                # if its same day the count cant be increased
+                if lastUpdated and lastUpdated.day == datetime.now().day:
+                    logger.debug(f"lastUpdated: {lastUpdated.day} == now: {datetime.now().day} for {member.name}, "
+                                 f"continuing loop")
+
+                    continue
+                else:
+                    logger.debug(f"no lastUpdated or lastUpdated: {lastUpdated.day if lastUpdated else 'None'} "
+                                 f"== current day, continuing to give value")
+
+            elif questType == QuestType.ONLINE_STREAK:
+                # if its same day the count cant be increased
+                if lastUpdated and datetime.now().day == lastUpdated.day:
+                    logger.debug(f"lastUpdated: {lastUpdated.day} == now: {datetime.now().day} for {member.name}, "
+                                 f"continuing loop")
+
+                    continue
+                else:
+                    logger.debug(f"no lastUpdated or lastUpdated: {lastUpdated.day if lastUpdated else 'None'} "
+                                 f"== current day, continuing to give value")
+
+                # if the difference is too big, the progress will be lost
+                if lastUpdated and datetime.now().day - lastUpdated.day > 1:
+                    # if the streak was broken and the value fulfilled, don't reset to zero and continue
+                    if quest.current_value >= quest.quest.value_to_reach:
+                        logger.debug("streak broken, saving current state")
 
                         continue
-                    else:
-                        logger.debug(f"no lastUpdated or lastUpdated: {lastUpdated.day if lastUpdated else 'None'} "
-                                     f"== current day, continuing to give value")
 
-                elif questType == QuestType.ONLINE_STREAK:
-                    # if its same day the count cant be increased
-                    if lastUpdated and datetime.now().day == lastUpdated.day:
-                        logger.debug(f"lastUpdated: {lastUpdated.day} == now: {datetime.now().day} for {member.name}, "
-                                     f"continuing loop")
+                    # reset value due to loss in streak
+                    quest.current_value = 0
 
-                        continue
-                    else:
-                        logger.debug(f"no lastUpdated or lastUpdated: {lastUpdated.day if lastUpdated else 'None'} "
-                                     f"== current day, continuing to give value")
+            # the progress can jump over the goal, so a quest is finished once it reaches it for the first time
+            finished = quest.current_value >= quest.quest.value_to_reach
+
+            quest.current_value += value
+            quest.time_updated = datetime.now()
+            dirtyQuests[quest.id] = quest
 
-                    # if the difference is too big, the progress will be lost
-                    if lastUpdated and datetime.now().day - lastUpdated.day > 1:
-                        # if the streak was broken and the value fulfilled, don't reset to zero and continue
-                        if quest.current_value >= quest.quest.value_to_reach:
-                            logger.debug("streak broken, saving current state")
+            if not finished and quest.current_value >= quest.quest.value_to_reach:
+                finishedQuests.append(quest)
 
-                            continue
+        for quest in finishedQuests:
+            await self._rewardFinishedQuest(member, quest)
 
-                        # reset value due to loss in streak
-                        quest.current_value = 0
-                        quest.time_updated = null()
+    @staticmethod
+    def flushQuestProgress() -> bool:
+        """
+        Writes the progress of all changed quests to the database in one batch.
+
+        :return: bool - Whether all changes were written
+        """
+        if not dirtyQuests:
+            return True
 
-                quest.current_value += value
-                quest.time_updated = datetime.now()
+        # values are copied before leaving the event loop, so progress made meanwhile stays marked as dirty
+        quests = list(dirtyQuests.values())
+        dirtyQuests.clear()
+
+        if not (session := getSession()):
+            for quest in quests:
+                dirtyQuests.setdefault(quest.id, quest)
 
-                await self._checkForFinishedQuest(member, quest)
+            return False
 
-                try:
-                    session.commit()
-                except Exception as error:
-                    logger.error(f"failure to save quest_discord_mapping to database: {quest}",
-                                 exc_info=error, )
-                    session.rollback()
+        table = QuestDiscordMapping.__table__
+        # a Core executemany, unlike the ORM bulk update by primary key it doesn't fail on quests deleted meanwhile
+        # noinspection PyTypeChecker
+        updateQuery = (update(table)
+                       .where(table.c.id == bindparam("b_id"))
+                       .values(current_value=bindparam("b_current_value"),
+                               time_updated=bindparam("b_time_updated")))
 
+        try:
+            session.execute(updateQuery, [{"b_id": quest.id,
+                                           "b_current_value": quest.current_value,
+                                           "b_time_updated": quest.time_updated, } for quest in quests], )
+            session.commit()
+        except Exception as error:
+            logger.error(f"couldn't write progress of {len(quests)} quests to the database", exc_info=error)
+            session.rollback()
             session.close()
 
-    async def _checkForFinishedQuest(self, member: Member, qdm: QuestDiscordMapping):
+            # retry with the next flush
+            for quest in quests:
+                dirtyQuests.setdefault(quest.id, quest)
+
+            return False
+
+        session.close()
+        logger.debug(f"wrote progress of {len(quests)} quests to the database")
+
+        return True
+
+    async def _rewardFinishedQuest(self, member: Member, qdm: QuestDiscordMapping):
         """
-        If a quest was finished a xp-boost will be given to the user.
+        A xp-boost will be given to the user for the finished quest.
 
         :param member: Member, who completed the quest and will get the boost
-        :param qdm: QuestDiscordMapping
+        :param qdm: QuestDiscordMapping that was just finished
         """
-        if qdm.current_value == qdm.quest.value_to_reach:
-            await self.notificationService.sendQuestFinishNotification(member, qdm.quest)
+        await self.notificationService.sendQuestFinishNotification(member, qdm.quest)
 
-            if qdm.quest.time_type == "daily":
-                boost = AchievementParameter.DAILY_QUEST
-            elif qdm.quest.time_type == "weekly":
-                boost = AchievementParameter.WEEKLY_QUEST
-            else:
-                boost = AchievementParameter.MONTHLY_QUEST
+        if qdm.quest.time_type == "daily":
+            boost = AchievementParameter.DAILY_QUEST
+        elif qdm.quest.time_type == "weekly":
+            boost = AchievementParameter.WEEKLY_QUEST
+        else:
+            boost = AchievementParameter.MONTHLY_QUEST
 
-            await self.experienceService.grantXpBoost(member, boost)
+        await self.experienceService.grantXpBoost(member, boost)
 
     async def resetQuests(self, time: QuestDates):
         """
@@ -159,6 +238,9 @@ class QuestService:
 
         :param time: Time to reset the quests and create new ones
         """
+        # write pending progress first, otherwise it would be written into the deleted quests
+        self.flushQuestProgress()
+
         if not (session := getSession()):
             return
 
@@ -178,24 +260,24 @@ class QuestService:
         else:
             logger.debug(f"deleted {time.value}-quests")
 
+        # the cached quests contain the deleted ones, they will be reloaded on the next progress
+        questStates.clear()
+
+        # progress on the deleted quests has nothing to be written to anymore
+        for id in [id for id, quest in dirtyQuests.items() if quest.quest.time_type == time.value]:
+            del dirtyQuests[id]
+
         await self._createQuestsForAllUsers(time, session)
 
-    async def _informMemberAboutNewQuests(self,
-                                          member: Member,
-                                          time: QuestDates,
-                                          session: Session):
+    async def _informMemberAboutNewQuests(self, member: Member, time: QuestDates):
         """
-        Fetches all current quests from the given time and informs user about them.
+        Informs the member about the new quests of the given time. The quests are loaded into the quest store, where
+        the following progress finds them.
 
         :param member: Member, who will be informed
         :param time: Type of quests
-        :param session:
         """
-        # if the member is not online
-        if not member.voice:
-            return
-
-        if not (quests := getQuestDiscordMapping(member, session)):
+        if not (quests := self.loadQuestStates(member)):
             logger.error(f"couldn't fetch quests for {member.display_name}")
 
             return
@@ -208,85 +290,101 @@ class QuestService:
 
     async def _createQuestsForAllUsers(self, time: QuestDates, session: Session):
         """
-        Creates new quests for all online users, so they have new ones right at zero 'o clock.
+        Creates new quests for all users, so they have new ones right at zero 'o clock. All assignments are drawn in
+        memory and written with one statement, only members in a voice channel are informed about them.
 
         :param time: Type of quests
+        :param session:
         """
-        members = self.client.get_guild(GuildId.GUILD_KVGG.value).members
+        members = [member for member in self.client.get_guild(GuildId.GUILD_KVGG.value).members if not member.bot]
+        dcUsersDb = getDiscordUsersForMembers(members, session)
 
-        for member in members:
-            if member.bot:
-                continue
+        if (questIds := self._getQuestIds(time, session)) is None:
+            return
 
-            if not (dcUserDb := getDiscordUser(member, session)):
-                logger.error(f"couldn't fetch DiscordUser for {member.display_name}")
+        now = datetime.now()
+        # noinspection PyTypeChecker
+        mappings = [{"quest_id": questId, "time_created": now, "discord_id": dcUserDb.id, }
+                    for dcUserDb in dcUsersDb.values()
+                    for questId in self._drawQuestIds(questIds, time)]
 
-                return
+        if not mappings:
+            logger.warning(f"no {time.value}-quests to create")
 
-            await self._createQuestForMember(member, dcUserDb, time, session)
+            return
 
-            # if member is not online don't add progress to certain quests
-            if not member.voice:
+        try:
+            session.execute(insert(QuestDiscordMapping), mappings)
+            session.commit()
+        except Exception as error:
+            logger.error(f"couldn't save new {time.value}-quests for {len(dcUsersDb)} users", exc_info=error)
+            session.rollback()
+
+            return
+        else:
+            logger.debug(f"added {len(mappings)} {time.value}-quests for {len(dcUsersDb)} users")
+
+        for member in members:
+            # members who are not online are neither informed nor get progress for certain quests
+            if not member.voice or member.id not in dcUsersDb:
                 continue
 
+            await self._informMemberAboutNewQuests(member, time)
+
             # weil wir die online user hier sowieso schon haben: checke direkt auf streak und online
             await self.addProgressToQuest(member, QuestType.ONLINE_STREAK)
             logger.debug(f"added progress for {member.name} for online streak if applicable")
             await self.addProgressToQuest(member, QuestType.DAYS_ONLINE)
             logger.debug(f"added progress for {member.name} for days online if applicable")
 
-    @classmethod
-    def insertNewQuestsForMember(cls, member: Member, time: QuestDates, session: Session) -> bool:
-        if member.bot:
-            logger.warning("cant add quests for a bot")
-
-            return False
-
+    @staticmethod
+    def _getQuestIds(time: QuestDates, session: Session) -> list[int] | None:
+        """
+        Returns the ids of all quests of the given time.
+        """
         # noinspection PyTypeChecker
-        getQuery = select(Quest).where(Quest.time_type == time.value)
+        getQuery = select(Quest.id).where(Quest.time_type == time.value)
 
         try:
-            quests = session.scalars(getQuery).all()
+            return list(session.scalars(getQuery).all())
         except Exception as error:
             logger.error("couldn't fetch quests from database", exc_info=error)
 
-            return False
+            return None
 
-        usedIndices = []
-        stop = False
-        currentAmount = 0
+    @staticmethod
+    def _drawQuestIds(questIds: list[int], time: QuestDates) -> list[int]:
+        """
+        Draws the amount of quests of the given time without duplicates.
+        """
+        return random.sample(questIds, min(QuestDates.getQuestAmountForDate(time), len(questIds)))
 
-        # use bool because of continues
-        while not stop:
-            randomNumber = random.randint(0, len(quests) - 1)
+    @classmethod
+    def insertNewQuestsForMember(cls, member: Member, time: QuestDates, session: Session) -> bool:
+        if member.bot:
+            logger.warning("cant add quests for a bot")
 
-            # don't add same two quests into the list
-            if randomNumber in usedIndices:
-                continue
+            return False
 
-            # noinspection PyTypeChecker
-            insertQuery = insert(QuestDiscordMapping).values(quest_id=quests[randomNumber].id,
-                                                             time_created=datetime.now(),
-                                                             discord_id=(select(DiscordUser.id)
-                                                                         .where(DiscordUser.user_id == str(member.id))
-                                                                         .scalar_subquery()), )
+        if (questIds := cls._getQuestIds(time, session)) is None:
+            return False
 
-            try:
-                session.execute(insertQuery)
-            except Exception as error:
-                logger.error(f"couldn't save quest_discord_mapping to database", exc_info=error)
+        # executemany parameters can't bind the subquery of a member whose id is not known yet
+        if not isinstance(discordUserId := getDiscordUserId(member), int):
+            if not (dcUserDb := getDiscordUser(member, session)):
+                logger.error(f"couldn't fetch DiscordUser to add quests for {member.display_name}")
 
                 return False
 
-            logger.debug(f"added {quests[randomNumber]} to {member.display_name} quests")
-            usedIndices.append(randomNumber)
+            discordUserId = dcUserDb.id
 
-            currentAmount += 1
-
-            if currentAmount == QuestDates.getQuestAmountForDate(time):
-                stop = True
+        now = datetime.now()
+        # noinspection PyTypeChecker
+        mappings = [{"quest_id": questId, "time_created": now, "discord_id": discordUserId, }
+                    for questId in cls._drawQuestIds(questIds, time)]
 
         try:
+            session.execute(insert(QuestDiscordMapping), mappings)
             session.commit()
         except Exception as error:
             logger.error(f"couldn't save new quests for {member.display_name}", exc_info=error)
@@ -298,21 +396,6 @@ class QuestService:
 
             return True
 
-    async def _createQuestForMember(self, member: Member, dcUserDb: DiscordUser, time: QuestDates, session: Session):
-        """
-        Creates new quests for the given member and time.
-
-        :param member: Member, who will get new quests.
-        :param time: Type of quests
-        :param session:
-        """
-        if not self.insertNewQuestsForMember(member, time, session):
-            logger.error(f"couldn't insert new quests for {dcUserDb} and time: {time}")
-
-            return
-
-        await self._informMemberAboutNewQuests(member, time, session)
-
     def listQuests(self, member: Member) -> str:
         """
         Lists all the quests from a user.
@@ -322,6 +405,9 @@ class QuestService:
         if member.bot:
             return "Bots haben keine Quests!"
 
+        # show the progress that was not written yet
+        self.flushQuestProgress()
+
         if not (session := getSession()):
             return "Es gab einen Fehler!"
 
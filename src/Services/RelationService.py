@@ -1,18 +1,21 @@
 import asyncio
 import logging
 from enum import Enum
+from itertools import combinations
 
 import discord
 from discord import ChannelType, Member, Client, VoiceChannel
-from sqlalchemy.orm import Session
 
 from src.DiscordParameters.AchievementParameter import AchievementParameter
-from src.Entities.UserRelation.Repository.DiscordUserRelationRepository import getRelationBetweenUsers
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUsersForMembers
+from src.Entities.UserRelation.Repository.DiscordUserRelationRepository import increaseRelations, \
+    getRelationsReachingThreshold
 from src.Helper.GetChannelsFromCategory import getVoiceChannelsFromCategoryEnum
 from src.Id.Categories import TrackedCategories, UniversityCategory
 from src.Id.GuildId import GuildId
 from src.Manager.AchievementManager import AchievementService
 from src.Manager.DatabaseManager import getSession
+from src.Manager.LeaderboardManager import LeaderboardManager
 
 logger = logging.getLogger("KVGG_BOT")
 
@@ -46,141 +49,110 @@ class RelationService:
 
         self.achievementService = AchievementService(self.client)
 
-    async def increaseRelation(self,
-                               member_1: Member,
-                               member_2: Member,
-                               type: RelationTypeEnum,
-                               session: Session,
-                               value: int = 1):
-        """
-        Raises a relation of a specific couple. It creates a new relation if possible and if there is none.
-
-        :param member_2:
-        :param member_1:
-        :param type: Type of the relation
-        :param value: Value to be increased
-        :param session:
-        :return:
-        """
-        if relation := getRelationBetweenUsers(member_1, member_2, type, session):
-            relation.value += value
-
-            # check for grant-able achievements
-            match type:
-                case RelationTypeEnum.ONLINE:
-                    if (relation.value % (AchievementParameter.RELATION_ONLINE_TIME_HOURS.value * 60)) == 0:
-                        await self.achievementService.sendAchievementAndGrantBoostForRelation(
-                            member_1,
-                            member_2,
-                            AchievementParameter.RELATION_ONLINE,
-                            relation.value,
-                        )
-                case RelationTypeEnum.STREAM:
-                    if (relation.value % (AchievementParameter.RELATION_STREAM_TIME_HOURS.value * 60)) == 0:
-                        await self.achievementService.sendAchievementAndGrantBoostForRelation(
-                            member_1,
-                            member_2,
-                            AchievementParameter.RELATION_STREAM,
-                            relation.value,
-                        )
-                case RelationTypeEnum.UNIVERSITY:
-                    pass
-                case RelationTypeEnum.ACTIVITY:
-                    if (relation.value % (AchievementParameter.RELATION_ACTIVITY_TIME_HOURS.value * 60)) == 0:
-                        await self.achievementService.sendAchievementAndGrantBoostForRelation(
-                            member_1,
-                            member_2,
-                            AchievementParameter.RELATION_ACTIVITY,
-                            relation.value,
-                        )
-                case _:
-                    logger.error(f"undefined enum-entry was reached: {type}")
-
-            try:
-                session.commit()
-            except Exception as error:
-                logger.error(f"couldn't save DiscordUserRelation for {member_1.display_name} and "
-                             f"{member_2.display_name}",
-                             exc_info=error, )
-        else:
-            if member_1.bot or member_2.bot:
-                logger.warning(f"couldn't fetch DiscordUserRelation for {member_1.display_name} and "
-                               f"{member_2.display_name}")
-            else:
-                logger.error(f"couldn't fetch DiscordUserRelation for {member_1.display_name} and "
-                             f"{member_2.display_name}")
-
     async def increaseAllRelations(self):
         """
-        Increases all relations at the same time on this server
+        Increases all relations at the same time on this server. The couples are collected in memory and written
+        with a single upsert, afterward only the relations reaching an achievement are fetched.
 
         :return:
         """
         whatsappChannels: list[VoiceChannel] = getVoiceChannelsFromCategoryEnum(self.client, TrackedCategories)
         universityChannels: list[VoiceChannel] = getVoiceChannelsFromCategoryEnum(self.client, UniversityCategory)
         allTrackedChannels: list[VoiceChannel] = whatsappChannels + universityChannels
-
-        if not (session := getSession()):
-            return
+        # (member 1, member 2, type)
+        couples: list[tuple[Member, Member, RelationTypeEnum]] = []
 
         for channel in self.client.get_guild(GuildId.GUILD_KVGG.value).channels:
             # skip none voice channels
             if channel.type != ChannelType.voice:
                 continue
 
-            # skip empty or less than 2 member channels
-            if len(channel.members) <= 1:
-                # logger.debug("channel %s empty or with less than 2" % channel.name)
-
-                continue
-
             # skip none tracked channels
             if channel not in allTrackedChannels:
                 continue
 
-            members = channel.members
-            activityOfMembers: dict = {}
+            members = [member for member in channel.members if not member.bot]
+
+            # skip empty or less than 2 member channels
+            if len(members) <= 1:
+                continue
+
+            # depending on the channel increase correct relation
+            relationType = RelationTypeEnum.ONLINE if channel in whatsappChannels else RelationTypeEnum.UNIVERSITY
+            streaming = {member.id: bool(member.voice.self_stream or member.voice.self_video) for member in members}
+            playing = {member.id: any(not isinstance(activity, (discord.CustomActivity, discord.Streaming,))
+                                      for activity in member.activities)
+                       for member in members}
 
             # for every member with every member
-            for i in range(len(members)):
-                for j in range(i + 1, len(members)):
-                    logger.debug(f"looking at {members[i].display_name} and {members[j].display_name}")
-
-                    # depending on the channel increase correct relation
-                    relation_type = (RelationTypeEnum.ONLINE
-                                     if channel in whatsappChannels
-                                     else RelationTypeEnum.UNIVERSITY)
-                    await self.increaseRelation(members[i], members[j], relation_type, session)
-
-                    # increase streaming relation if both are streaming at the same time
-                    if ((members[i].voice.self_stream or members[i].voice.self_video)
-                            and (members[j].voice.self_stream or members[j].voice.self_video)):
-                        logger.debug(f"{members[i].display_name} and {members[j].display_name} are also "
-                                     f"streaming together")
-                        await self.increaseRelation(members[i], members[j], RelationTypeEnum.STREAM, session)
-
-                    if members[i].activities and members[i].activities:
-                        def cache_activities(member: Member):
-                            # don't compare against None;
-                            # an empty list will evaluate to True,
-                            # thus the caching would be performed every time
-                            if not isinstance(activityOfMembers.get(member.id, None), list):
-                                activityOfMembers[member.id] = [activity for activity in member.activities
-                                                                if not isinstance(activity,
-                                                                                  (discord.CustomActivity,
-                                                                                   discord.Streaming,))]
-                                logger.debug(f"cached activities for {member.display_name}")
-
-                        # if the values are not cached yet, cache them
-                        cache_activities(members[i])
-                        cache_activities(members[j])
-
-                        # if no allowed activities were found, don't increase the relation
-                        if len(activityOfMembers[members[i].id]) == 0 or len(activityOfMembers[members[j].id]) == 0:
-                            logger.debug(f"{members[i].display_name} or {members[j].display_name} "
-                                         f"had no (allowed) activity")
-                            continue
-
-                        logger.debug(f"{members[i].display_name} and {members[j].display_name} are also "
-                                     f"playing together")
-                        await self.increaseRelation(members[i], members[j], RelationTypeEnum.ACTIVITY, session)
+            for member_1, member_2 in combinations(members, 2):
+                couples.append((member_1, member_2, relationType))
+
+                # increase streaming relation if both are streaming at the same time
+                if streaming[member_1.id] and streaming[member_2.id]:
+                    logger.debug(f"{member_1.display_name} and {member_2.display_name} are also streaming together")
+                    couples.append((member_1, member_2, RelationTypeEnum.STREAM))
+
+                # increase activity relation if both have an allowed activity at the same time
+                if playing[member_1.id] and playing[member_2.id]:
+                    logger.debug(f"{member_1.display_name} and {member_2.display_name} are also playing together")
+                    couples.append((member_1, member_2, RelationTypeEnum.ACTIVITY))
+
+        if not couples:
+            return
+
+        if not (session := getSession()):
+            return
+
+        dcUsersDb = getDiscordUsersForMembers({member for couple in couples for member in couple[:2]}, session)
+        relations: list[tuple[int, int, str]] = []
+        # (id 1, id 2) -> (member 1, member 2), with the ids being ordered like in the database
+        membersByIds: dict[tuple[int, int], tuple[Member, Member]] = {}
+
+        for member_1, member_2, type in couples:
+            if not (dcUserDb_1 := dcUsersDb.get(member_1.id)) or not (dcUserDb_2 := dcUsersDb.get(member_2.id)):
+                logger.warning(f"couldn't increase relation for {member_1.display_name} and {member_2.display_name}")
+
+                continue
+
+            relations.append((dcUserDb_1.id, dcUserDb_2.id, type.value))
+            membersByIds[(min(dcUserDb_1.id, dcUserDb_2.id), max(dcUserDb_1.id, dcUserDb_2.id))] = (member_1, member_2)
+
+        if not increaseRelations(relations, session):
+            session.rollback()
+            session.close()
+
+            return
+
+        try:
+            session.commit()
+        except Exception as error:
+            logger.error(f"couldn't save {len(relations)} relations", exc_info=error)
+            session.rollback()
+            session.close()
+
+            return
+
+        LeaderboardManager().increaseRelations(relations)
+
+        achievements = {
+            RelationTypeEnum.ONLINE.value: AchievementParameter.RELATION_ONLINE,
+            RelationTypeEnum.STREAM.value: AchievementParameter.RELATION_STREAM,
+            RelationTypeEnum.ACTIVITY.value: AchievementParameter.RELATION_ACTIVITY,
+        }
+        thresholds = {
+            RelationTypeEnum.ONLINE.value: AchievementParameter.RELATION_ONLINE_TIME_HOURS.value * 60,
+            RelationTypeEnum.STREAM.value: AchievementParameter.RELATION_STREAM_TIME_HOURS.value * 60,
+            RelationTypeEnum.ACTIVITY.value: AchievementParameter.RELATION_ACTIVITY_TIME_HOURS.value * 60,
+        }
+
+        # check for grant-able achievements
+        for relation in getRelationsReachingThreshold(relations, thresholds, session):
+            member_1, member_2 = membersByIds[(relation.discord_user_id_1, relation.discord_user_id_2)]
+
+            await self.achievementService.sendAchievementAndGrantBoostForRelation(member_1,
+                                                                                  member_2,
+                                                                                  achievements[relation.type],
+                                                                                  relation.value, )
+
+        session.close()
@@ -8,7 +8,7 @@ from discord import Member
 from sqlalchemy import select, insert, null, delete
 from sqlalchemy.orm import Session
 
-from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUserId
 from src.Entities.DiscordUser.Repository.WhatsappSettingRepository import getWhatsappSetting
 from src.Entities.MessageQueue.Entity.MessageQueue import MessageQueue
 from src.Entities.Reminder.Entity.Reminder import Reminder
@@ -57,9 +57,7 @@ class ReminderService:
         now = datetime.now()
         timeToSent = now + timedelta(minutes=minutes)
 
-        insertQuery = insert(Reminder).values(discord_user_id=(select(DiscordUser.id)
-                                                               .where(DiscordUser.user_id == str(member.id))
-                                                               .scalar_subquery()),
+        insertQuery = insert(Reminder).values(discord_user_id=getDiscordUserId(member),
                                               content=name,
                                               time_to_sent=timeToSent,
                                               sent_at=null(),
@@ -189,9 +187,7 @@ class ReminderService:
                                               sent_at=null(),
                                               whatsapp=whatsapp,
                                               repeat_in_minutes=minutesLeft,
-                                              discord_user_id=(select(DiscordUser.id)
-                                                               .where(DiscordUser.user_id == str(member.id))
-                                                               .scalar_subquery()), )
+                                              discord_user_id=getDiscordUserId(member), )
 
         try:
             session.execute(insertQuery)
@@ -220,9 +216,7 @@ class ReminderService:
 
         # noinspection PyTypeChecker
         getQuery = (select(Reminder)
-                    .where(Reminder.discord_user_id == (select(DiscordUser.id)
-                                                        .where(DiscordUser.user_id == str(member.id))
-                                                        .scalar_subquery()),
+                    .where(Reminder.discord_user_id == getDiscordUserId(member),
                            Reminder.time_to_sent.is_not(None), )
                     .order_by(Reminder.time_to_sent.asc(), ))
 
@@ -331,9 +325,7 @@ class ReminderService:
             return "Bitte gib eine korrekte ID ein!"
 
         getQuery = (select(Reminder)
-                    .where(Reminder.discord_user_id == (select(DiscordUser.id)
-                                                        .where(DiscordUser.user_id == str(member.id))
-                                                        .scalar_subquery()),
+                    .where(Reminder.discord_user_id == getDiscordUserId(member),
                            Reminder.time_to_sent.is_not(None), ))
 
         try:
@@ -392,9 +384,7 @@ class ReminderService:
             message = f"Hier ist {'deine Erinnerung' if not reminder.is_timer else 'dein Timer'}:\n\n{reminder.content}"
             # noinspection PyTypeChecker
             insertQuery = insert(MessageQueue).values(message=message,
-                                                      trigger_user_id=(select(DiscordUser.id)
-                                                                       .where(DiscordUser.user_id == str(member.id))
-                                                                       .scalar_subquery()),
+                                                      trigger_user_id=getDiscordUserId(member),
                                                       created_at=datetime.now(),
                                                       user_id=(select(User.id)
                                                                .where(User.discord_user_id == reminder.discord_user_id)
@@ -17,6 +17,7 @@ from sqlalchemy.orm.exc import NoResultFound
 from src.DiscordParameters.WhatsAppParameter import WhatsAppParameter
 from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
 from src.Entities.DiscordUser.Entity.WhatsappSetting import WhatsappSetting
+from src.Entities.DiscordUser.Repository.DiscordUserRepository import getDiscordUserId
 from src.Entities.DiscordUser.Repository.WhatsappSettingRepository import getWhatsappSetting
 from src.Entities.MessageQueue.Entity.MessageQueue import MessageQueue
 from src.Entities.MessageQueue.Repository.MessageQueueRepository import getUnsentMessagesFromTriggerUser
@@ -376,9 +377,7 @@ class WhatsAppHelper:
 
         # noinspection PyTypeChecker
         getQuery = (select(WhatsappSetting)
-                    .where(WhatsappSetting.discord_user_id == (select(DiscordUser.id)
-                                                               .where(DiscordUser.user_id == str(member.id))
-                                                               .scalar_subquery())))
+                    .where(WhatsappSetting.discord_user_id == getDiscordUserId(member)))
 
         try:
             whatsappSetting = session.scalars(getQuery).one()
@@ -474,9 +473,7 @@ class WhatsAppHelper:
 
         # noinspection PyTypeChecker
         getQuery = (select(WhatsappSetting)
-                    .where(WhatsappSetting.discord_user_id == (select(DiscordUser.id)
-                                                               .where(DiscordUser.user_id == str(member.id))
-                                                               .scalar_subquery())))
+                    .where(WhatsappSetting.discord_user_id == getDiscordUserId(member)))
 
         try:
             whatsappSetting = session.scalars(getQuery).one()
@@ -570,9 +567,7 @@ class WhatsAppHelper:
 
         # noinspection PyTypeChecker
         getQuery = (select(WhatsappSetting)
-                    .where(WhatsappSetting.discord_user_id == (select(DiscordUser.id)
-                                                               .where(DiscordUser.user_id == str(member.id))
-                                                               .scalar_subquery())))
+                    .where(WhatsappSetting.discord_user_id == getDiscordUserId(member)))
 
         try:
             whatsappSetting = session.scalars(getQuery).one()
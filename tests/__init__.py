@@ -0,0 +1,129 @@
+"""
+Tests run against a throwaway SQLite database, the synchronous and the async (aiosqlite) engine share its file:
+
+    python -m unittest discover -s tests -t .
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+databaseFile = Path(tempfile.gettempdir()).joinpath("kvgg_tests.db")
+
+# must be set before the DatabaseManager creates its engines
+os.environ["DATABASE_URL"] = f"sqlite:///{databaseFile}"
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{databaseFile}"
+os.environ.setdefault("PRODUCTION", "0")
+os.environ.setdefault("API_PORT", "8000")
+
+from sqlalchemy import BigInteger, insert  # noqa: E402
+from sqlalchemy.ext.compiler import compiles  # noqa: E402
+
+from benchmark.FakeDiscord import createGuild  # noqa: E402
+
+basepath = Path(__file__).parent.parent
+
+
+# SQLite only autoincrements INTEGER PRIMARY KEY columns
+# noinspection PyUnusedLocal
+@compiles(BigInteger, "sqlite")
+def _compileBigIntegerForSqlite(type_, compiler, **kwargs):
+    return "INTEGER"
+
+
+def resetDatabase(client):
+    """
+    Creates an empty schema with the quests, the Felix-Counter and a DiscordUser for every member of the client and
+    clears the process-wide caches and queues.
+    """
+    # all entities have to be imported, so the schema can be created from their metadata
+    for path in basepath.joinpath("src/Entities").glob("*/Entity/*.py"):
+        __import__(".".join(path.relative_to(basepath).with_suffix("").parts))
+
+    from src.DiscordParameters.QuestParameter import QuestDates
+    from src.Entities.BaseClass import Base, getTables
+    from src.Entities.Counter.Entity.Counter import Counter
+    from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+    from src.Entities.Quest.Entity.Quest import Quest
+    from src.Manager.DatabaseManager import getEngine, getSession
+    from src.Manager.DiscordUserIdManager import DiscordUserIdManager
+    from src.Manager.GameCatalogueManager import GameCatalogueManager
+    from src.Manager.LeaderboardManager import LeaderboardManager
+    from src.Manager.MemberProfileManager import MemberProfileManager
+    from src.Manager.PresenceLedgerManager import PresenceLedgerManager
+    from src.Manager.StatisticManager import queuedStatistics
+    from src.Services import ExperienceService, GameDiscordService, QuestService
+    from src.Services.QuestService import QuestType
+
+    Base.metadata.drop_all(getEngine(), tables=getTables())
+    Base.metadata.create_all(getEngine(), tables=getTables())
+
+    session = getSession()
+    session.execute(insert(Quest), [{"time_type": time.value,
+                                     "type": questType.value,
+                                     "description": f"{questType.value} ({time.value})",
+                                     "value_to_reach": 60 * 24, } for time in QuestDates for questType in QuestType])
+    session.execute(insert(Counter).values(name="felix", description="Felix-Counter"))
+    session.execute(insert(DiscordUser), [{"guild_id": str(member.guild.id),
+                                           "user_id": str(member.id),
+                                           "username": member.display_name,
+                                           "discord_name": member.name,
+                                           "created_at": datetime.now(),
+                                           "university_time_online": 0, }
+                                          for member in client.get_all_members()])
+    session.commit()
+    session.close()
+
+    DiscordUserIdManager().ids.clear()
+    GameCatalogueManager()._reset()
+    LeaderboardManager()._reset()
+    QuestService.questStates.clear()
+    QuestService.dirtyQuests.clear()
+    MemberProfileManager().profiles.clear()
+    queuedStatistics.clear()
+    GameDiscordService.currentlyPlaying = None
+    GameDiscordService.queuedGameMinutes.clear()
+    GameDiscordService.stoppedGames.clear()
+    ExperienceService.queuedExperiences.clear()
+    ExperienceService.queuedXpBoostsReductions.clear()
+
+    ledger = PresenceLedgerManager()
+    ledger.openIntervals.clear()
+    ledger.pendingIntervals.clear()
+    ledger.pendingCloses.clear()
+
+
+class _GuildFixture:
+    """
+    A synthetic guild in client, its first member in member and an empty schema for it, see resetDatabase.
+    """
+    # arguments of createGuild, None for tests creating their guilds themselves
+    guildArguments: dict | None = {"memberCount": 2, "channelCount": 1, "maxActivities": 0, }
+
+    def _setUpGuild(self):
+        if self.guildArguments is None:
+            return
+
+        self.client = createGuild(**self.guildArguments)
+        self.member = next(iter(self.client.get_all_members()))
+
+        resetDatabase(self.client)
+
+
+class DatabaseTestCase(_GuildFixture, unittest.TestCase):
+
+    def setUp(self):
+        self._setUpGuild()
+
+
+class AsyncDatabaseTestCase(_GuildFixture, unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._setUpGuild()
+
+    async def asyncTearDown(self):
+        from src.Manager.DatabaseManager import getAsyncEngine
+
+        # the async engine is bound to the event loop of this test
+        await getAsyncEngine().dispose()
@@ -0,0 +1,43 @@
+import unittest
+
+from tests import DatabaseTestCase
+
+from sqlalchemy import insert, inspect, select
+
+from src.Entities.Counter.Entity.Counter import Counter
+from src.Entities.Counter.Entity.CounterDiscordMapping import CounterDiscordMapping
+from src.Entities.Counter.Repository.CounterRepository import getRankingPlace
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Manager.DatabaseManager import getEngine, getSession
+
+
+class RankingPlaceTest(DatabaseTestCase):
+    guildArguments = {"memberCount": 4, "channelCount": 1, "maxActivities": 0, }
+
+    def setUp(self):
+        super().setUp()
+
+        self.session = getSession()
+        counterId = self.session.scalar(select(Counter.id))
+        discordIds = self.session.scalars(select(DiscordUser.id).order_by(DiscordUser.id)).all()
+
+        self.session.execute(insert(CounterDiscordMapping), [{"counter_id": counterId,
+                                                              "discord_id": discordId,
+                                                              "value": value, }
+                                                             for discordId, value in zip(discordIds, [5, 3, 3, 1])])
+        self.session.commit()
+
+        self.mappings = self.session.scalars(select(CounterDiscordMapping).order_by(CounterDiscordMapping.id)).all()
+
+    def tearDown(self):
+        self.session.close()
+
+    def testMembersWithTheSameValueShareThePlace(self):
+        self.assertEqual([1, 2, 2, 4], [getRankingPlace(mapping, self.session) for mapping in self.mappings])
+
+    def testViewIsNotCreatedAsTable(self):
+        self.assertNotIn("counter_ranking", inspect(getEngine()).get_table_names())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+from unittest import mock
+
+from tests import AsyncDatabaseTestCase, DatabaseTestCase
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.dialects import mysql
+
+from src.DiscordParameters.AchievementParameter import AchievementParameter
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.Experience.Entity.Experience import Experience
+from src.Manager.DatabaseManager import getEngine, getSession
+from src.Services import ExperienceService as ExperienceServiceModule
+from src.Services.ExperienceService import ExperienceService, getActiveXpBoosts, _getRunningBoosts, _hasExpiredBoosts
+
+
+class BoostClockTest(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.service = ExperienceService(self.client)
+
+        session = getSession()
+        discordUserId = session.scalar(select(DiscordUser.id).where(DiscordUser.user_id == str(self.member.id)))
+        session.execute(insert(Experience).values(discord_user_id=discordUserId,
+                                                  xp_amount=0,
+                                                  xp_boost_minutes=0,
+                                                  active_xp_boosts=[{"multiplier": 2, "remaining": 2},
+                                                                    {"multiplier": 3, "remaining": 3,
+                                                                     "activated_at": 1}, ], ))
+        session.commit()
+        session.close()
+
+        # rows changed by UPDATEs that rewrite the boosts
+        self.rewrittenRows = []
+
+        # noinspection PyUnusedLocal
+        def afterCursorExecute(connection, cursor, statement, parameters, context, executemany):
+            if statement.startswith("UPDATE experience SET active_xp_boosts"):
+                self.rewrittenRows.append(cursor.rowcount)
+
+        event.listen(getEngine(), "after_cursor_execute", afterCursorExecute)
+        self.addCleanup(event.remove, getEngine(), "after_cursor_execute", afterCursorExecute)
+
+    def _getExperience(self) -> Experience:
+        session = getSession()
+        xp = session.scalars(select(Experience)).one()
+        session.close()
+
+        return xp
+
+    def testBoostsAreOnlyRewrittenWhenTheyExpire(self):
+        self.service.reduceXpBoostsTime([self.member])
+
+        xp = self._getExperience()
+
+        self.assertEqual(1, xp.xp_boost_minutes)
+        self.assertEqual([0], self.rewrittenRows)
+        self.assertEqual([{"multiplier": 2, "remaining": 1}, {"multiplier": 3, "remaining": 3, "activated_at": 1}],
+                         getActiveXpBoosts(xp))
+
+        # the first boost expires
+        self.service.reduceXpBoostsTime([self.member])
+
+        xp = self._getExperience()
+
+        self.assertEqual(2, xp.xp_boost_minutes)
+        self.assertEqual([0, 1], self.rewrittenRows)
+        self.assertEqual([{"multiplier": 3, "remaining": 3, "activated_at": 1}], xp.active_xp_boosts)
+        self.assertEqual([{"multiplier": 3, "remaining": 2, "activated_at": 1}], getActiveXpBoosts(xp))
+
+        self.service.reduceXpBoostsTime([self.member])
+        self.service.reduceXpBoostsTime([self.member])
+
+        xp = self._getExperience()
+
+        self.assertEqual(4, xp.xp_boost_minutes)
+        self.assertEqual([0, 1, 0, 1], self.rewrittenRows)
+        self.assertIsNone(xp.active_xp_boosts)
+
+        # members without boosts are not counted anymore
+        self.service.reduceXpBoostsTime([self.member])
+
+        self.assertEqual(4, self._getExperience().xp_boost_minutes)
+
+    def testMySqlStatementSetsOnlyTheBoosts(self):
+        # no MySQL server is available in the tests, the clock must not depend on the order of the SET clause
+        statement = str(update(Experience)
+                        .where(_hasExpiredBoosts("mysql"))
+                        .values(active_xp_boosts=_getRunningBoosts("mysql"))
+                        .compile(dialect=mysql.dialect()))
+
+        self.assertNotIn("xp_boost_minutes=", statement)
+        self.assertIn("boost.remaining - (experience.xp_boost_minutes - boost.activated_at) <= 0", statement)
+
+
+class AddExperiencesTest(AsyncDatabaseTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+
+        self.service = ExperienceService(self.client)
+
+        session = getSession()
+        discordUserId = session.scalar(select(DiscordUser.id).where(DiscordUser.user_id == str(self.member.id)))
+        session.execute(insert(Experience).values(discord_user_id=discordUserId,
+                                                  xp_amount=AchievementParameter.XP_AMOUNT.value - 15, ))
+        session.commit()
+        session.close()
+
+    def _getXpAmount(self) -> int:
+        session = getSession()
+        xpAmount = session.scalar(select(Experience.xp_amount))
+        session.close()
+
+        return xpAmount
+
+    async def testConcurrentlyGrantedXpIsKept(self):
+        getExperiencesForMembers = ExperienceServiceModule.getExperiencesForMembers
+
+        def loadAndGrantConcurrently(members, session):
+            xps = getExperiencesForMembers(members, session)
+
+            # e.g. a command granting xp between loading and writing the minutely xp
+            otherSession = getSession()
+            otherSession.execute(update(Experience).values(xp_amount=Experience.xp_amount + 10))
+            otherSession.commit()
+            otherSession.close()
+
+            return xps
+
+        with (mock.patch.object(ExperienceServiceModule, "getExperiencesForMembers", loadAndGrantConcurrently),
+              mock.patch.object(ExperienceServiceModule, "isDoubleWeekend", return_value=False),
+              mock.patch.object(self.service.achievementService, "sendAchievementAndGrantBoost") as sendAchievement):
+            await self.service.addExperiences([(self.member, 5), (self.member, 5)])
+
+        self.assertEqual(AchievementParameter.XP_AMOUNT.value + 5, self._getXpAmount())
+        # the achievement is derived from the returned amount, not from the one loaded before the concurrent xp
+        sendAchievement.assert_awaited_once_with(self.member,
+                                                 AchievementParameter.XP,
+                                                 AchievementParameter.XP_AMOUNT.value, )
+
+
+if __name__ == "__main__":
+    unittest.main()
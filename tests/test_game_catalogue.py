@@ -0,0 +1,90 @@
+import unittest
+
+from tests import DatabaseTestCase
+
+from sqlalchemy import insert, select
+
+from benchmark.FakeDiscord import FakeActivity
+from src.Entities.Game.Entity.DiscordGame import DiscordGame
+from src.Entities.Game.Repository.DiscordGameRepository import getDiscordGameId
+from src.Manager.DatabaseManager import assertStatementBudget, getSession
+from src.Manager.GameCatalogueManager import GameCatalogueManager, MAX_DISTANCE, _BkTree
+
+
+class BkTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = _BkTree()
+
+        for name in ["minecraft", "minecraft dungeons", "valorant", "dota 2", "dota", "factorio"]:
+            self.tree.add(name)
+
+    def testSearchFindsAllNamesWithinTheDistance(self):
+        self.assertEqual([(0, "dota 2"), (2, "dota")], sorted(self.tree.search("dota 2", 2)))
+        self.assertEqual([(1, "minecraft")], self.tree.search("minecaft", 2))
+
+    def testSearchIgnoresNamesBeyondTheDistance(self):
+        self.assertEqual([], self.tree.search("valorantt", 0))
+        self.assertEqual([], self.tree.search("satisfactory", 2))
+
+    def testDuplicatesAreAddedOnce(self):
+        self.tree.add("valorant")
+
+        self.assertEqual([(0, "valorant")], self.tree.search("valorant", 0))
+
+
+class GameCatalogueTest(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        session = getSession()
+        session.execute(insert(DiscordGame), [{"name": "Minecraft", "external_game_id": 10, },
+                                              {"name": "Valorant", "external_game_id": None, },
+                                              {"name": "Dota", "external_game_id": None, },
+                                              {"name": "Data", "external_game_id": None, }, ])
+        session.commit()
+
+        self.ids = dict(session.execute(select(DiscordGame.name, DiscordGame.id)).all())
+        self.catalogue = GameCatalogueManager()
+        self.catalogue.load(session)
+
+        session.close()
+
+    def testSimilarNamesWithinTheThresholdMatch(self):
+        self.assertEqual(self.ids["Valorant"], self.catalogue.getIdBySimilarName("VALORANT!!"))
+        self.assertIsNone(self.catalogue.getIdBySimilarName("Valorant" + "!" * (MAX_DISTANCE + 1)))
+
+    def testClosestAndThenOldestGameWins(self):
+        self.assertEqual(self.ids["Dota"], self.catalogue.getIdBySimilarName("dota 2"))
+        # same distance to both games
+        self.assertEqual(self.ids["Dota"], self.catalogue.getIdBySimilarName("Duta"))
+
+    def testRememberedMissIsForgottenByNewGames(self):
+        self.assertIsNone(self.catalogue.getIdBySimilarName("Factorio"))
+        self.assertIsNone(self.catalogue.getIdBySimilarName("Factorio"))
+        self.assertEqual((1, 1), (self.catalogue.hits, self.catalogue.misses))
+
+        self.catalogue.addGame(100, "Factorio", None)
+
+        self.assertEqual(100, self.catalogue.getIdBySimilarName("Factorio"))
+
+    def testExternalIdIsWrittenOnce(self):
+        session = getSession()
+
+        with assertStatementBudget(1):
+            self.assertEqual(self.ids["Valorant"], getDiscordGameId(FakeActivity("Valorant", 20), session))
+
+        # resolved by the external id now, games with another external id aren't updated
+        with assertStatementBudget(0):
+            self.assertEqual(self.ids["Valorant"], getDiscordGameId(FakeActivity("Valorant", 20), session))
+            self.assertEqual(self.ids["Minecraft"], getDiscordGameId(FakeActivity("Minecraft", 11), session))
+
+        self.assertEqual(20, session.scalar(select(DiscordGame.external_game_id)
+                                            .where(DiscordGame.id == self.ids["Valorant"])))
+
+        session.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
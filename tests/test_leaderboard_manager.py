@@ -0,0 +1,103 @@
+import unittest
+
+from tests import DatabaseTestCase
+
+from sqlalchemy import select, update
+
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Manager.DatabaseManager import assertStatementBudget, getSession
+from src.Manager.LeaderboardManager import LEADERBOARD_SIZE, LeaderboardManager, LeaderboardMetric, _TopK
+
+
+class TopKTest(unittest.TestCase):
+
+    def setUp(self):
+        self.board = _TopK(2)
+        self.board.seed([("a", 10, "A"), ("b", 8, "B"), ("c", 5, "C")])
+
+    def testIncreasesBelowTheTopKeepItExact(self):
+        self.board.increase("c", 2)
+        self.board.increase("d", 3)
+        self.board.increase("c", 1)
+
+        # c might have reached b, but not overtaken it
+        self.assertFalse(self.board.dirty)
+        self.assertEqual([("A", 10), ("B", 8)], self.board.get())
+
+        self.board.increase("c", 1)
+
+        self.assertTrue(self.board.dirty)
+
+    def testIncreasesWithinTheTopAreApplied(self):
+        self.board.increase("b", 5)
+
+        self.assertFalse(self.board.dirty)
+        self.assertEqual([("B", 13), ("A", 10)], self.board.get())
+
+    def testHigherValueEvictsTheLastPlace(self):
+        self.board.set("c", 9, "C")
+
+        self.assertFalse(self.board.dirty)
+        self.assertEqual([("A", 10), ("C", 9)], self.board.get())
+
+        # b is outside the top now and bounds everything below, its next increase could overtake c
+        self.board.increase("b", 2)
+
+        self.assertTrue(self.board.dirty)
+
+    def testLowerValueWithinTheTopMakesTheBoardDirty(self):
+        self.board.set("a", 4, "A")
+
+        self.assertTrue(self.board.dirty)
+
+    def testReseedingCleansTheBoard(self):
+        self.board.set("a", 4, "A")
+        self.board.seed([("b", 8, "B"), ("c", 5, "C"), ("a", 4, "A")])
+
+        self.assertFalse(self.board.dirty)
+        self.assertEqual(4, self.board.floor)
+        self.assertEqual([("B", 8), ("C", 5)], self.board.get())
+
+
+class LeaderboardReseedingTest(DatabaseTestCase):
+    guildArguments = {"memberCount": LEADERBOARD_SIZE + 2, "channelCount": 1, "maxActivities": 0, }
+
+    def setUp(self):
+        super().setUp()
+
+        self.session = getSession()
+        self.users = self.session.execute(select(DiscordUser.id, DiscordUser.username).order_by(DiscordUser.id)).all()
+        self.session.execute(update(DiscordUser), [{"id": id, "time_online": 10 * (len(self.users) - index), }
+                                                   for index, (id, _) in enumerate(self.users)])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def testDirtyBoardIsLoadedOnce(self):
+        leaderboardManager = LeaderboardManager()
+        expected = [(username, 10 * (len(self.users) - index))
+                    for index, (_, username) in enumerate(self.users[:LEADERBOARD_SIZE])]
+
+        with assertStatementBudget(1):
+            self.assertEqual(expected, leaderboardManager.getTop(LeaderboardMetric.ONLINE))
+
+        with assertStatementBudget(0):
+            self.assertEqual(expected, leaderboardManager.getTop(LeaderboardMetric.ONLINE))
+
+    def testOvertakingFromBelowReloadsTheBoard(self):
+        leaderboardManager = LeaderboardManager()
+        leaderboardManager.getTop(LeaderboardMetric.ONLINE)
+        lastId, lastUsername = self.users[-1]
+
+        # e.g. the time of an earlier minute written at once
+        self.session.execute(update(DiscordUser).where(DiscordUser.id == lastId).values(time_online=1000))
+        self.session.commit()
+        leaderboardManager.increaseValues(LeaderboardMetric.ONLINE, {lastId: 990})
+
+        with assertStatementBudget(1):
+            self.assertEqual((lastUsername, 1000), leaderboardManager.getTop(LeaderboardMetric.ONLINE)[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from tests import DatabaseTestCase
+
+from sqlalchemy import delete
+
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Manager.DatabaseManager import getSession
+from src.Manager.MemberProfileManager import MemberProfileManager
+
+
+class MemberProfileTest(DatabaseTestCase):
+
+    def testProfileOfMemberWithoutDiscordUserIsCreated(self):
+        session = getSession()
+        session.execute(delete(DiscordUser).where(DiscordUser.user_id == str(self.member.id)))
+        session.commit()
+
+        profile = MemberProfileManager().getProfile(self.member, session)
+
+        self.assertIsNotNone(profile)
+        self.assertEqual(self.member.display_name, profile.username)
+        self.assertEqual([], profile.games)
+
+        session.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
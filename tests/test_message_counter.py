@@ -0,0 +1,55 @@
+import asyncio
+import unittest
+
+from tests import AsyncDatabaseTestCase
+
+from sqlalchemy import select
+
+from benchmark.FakeDiscord import FakeTextChannel
+from src.DiscordParameters.StatisticsParameter import StatisticsParameter
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Manager import StatisticManager
+from src.Manager.DatabaseManager import getSession
+from src.Services import ExperienceService
+from src.Services.ProcessUserInput import ProcessUserInput
+
+
+class MessageCounterTest(AsyncDatabaseTestCase):
+    """
+    raiseMessageCounter against async SQLite
+    """
+    guildArguments = {"memberCount": 5, "channelCount": 1, "maxActivities": 0, }
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+
+        self.channel = FakeTextChannel(1)
+        self.processUserInput = ProcessUserInput(self.client)
+
+    def _getCounts(self) -> tuple[int, int]:
+        session = getSession()
+        counts = session.execute(select(DiscordUser.message_count_all_time, DiscordUser.command_count_all_time)
+                                 .where(DiscordUser.user_id == str(self.member.id))).one()
+        session.close()
+
+        return counts[0], counts[1]
+
+    async def testConcurrentMessagesAreAllCounted(self):
+        await asyncio.gather(*[self.processUserInput.raiseMessageCounter(self.member, self.channel)
+                               for _ in range(5)])
+
+        self.assertEqual((5, 0), self._getCounts())
+        self.assertEqual(5, len(StatisticManager.queuedStatistics[StatisticsParameter.MESSAGE]))
+        # the xp is added by the minutely job
+        self.assertEqual(5, len(ExperienceService.queuedExperiences))
+
+    async def testCommandsAreCountedSeparately(self):
+        await self.processUserInput.raiseMessageCounter(self.member, self.channel, command=True)
+        await self.processUserInput.raiseMessageCounter(self.member, self.channel)
+
+        self.assertEqual((1, 1), self._getCounts())
+        self.assertEqual(1, len(ExperienceService.queuedExperiences))
+
+
+if __name__ == "__main__":
+    unittest.main()
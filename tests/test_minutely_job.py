@@ -0,0 +1,64 @@
+import unittest
+from unittest import mock
+
+from tests import AsyncDatabaseTestCase
+
+from sqlalchemy import select, func
+
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.Game.Entity.GameDiscordMapping import GameDiscordMapping
+from src.Entities.Statistic.Entity.CurrentDiscordStatistic import CurrentDiscordStatistic
+from src.Manager.DatabaseManager import getSession
+from src.Manager.MinutelyJobRunner import MinutelyJobRunner
+from src.Services import GameDiscordService
+
+
+class FailingMemberTest(AsyncDatabaseTestCase):
+    """
+    A member whose savepoint is rolled back must not leave changes in the in-memory state either
+    """
+    guildArguments = {"memberCount": 30, "channelCount": 5, "maxActivities": 3, "seed": 1, "voiceShare": 0.5, }
+
+    async def testFailingMemberLeavesNoChanges(self):
+        runner = MinutelyJobRunner(self.client)
+        members = [member for member in self.client.get_all_members() if member.voice and member.activities]
+        failing, succeeding = members[0], members[1]
+        updateFelixCounter = runner.felixCounter.updateFelixCounter
+
+        async def failFor(member, dcUserDb, session):
+            if member == failing:
+                raise RuntimeError("failing member")
+
+            await updateFelixCounter(member, dcUserDb, session)
+
+        with mock.patch.object(runner.felixCounter, "updateFelixCounter", failFor):
+            await runner.run()
+
+        session = getSession()
+        ids = dict(session.execute(select(DiscordUser.user_id, DiscordUser.id)).all())
+        failingId, succeedingId = ids[str(failing.id)], ids[str(succeeding.id)]
+
+        def countStatistics(discordId: int) -> int:
+            return session.scalar(select(func.count())
+                                  .select_from(CurrentDiscordStatistic)
+                                  .where(CurrentDiscordStatistic.discord_id == discordId))
+
+        def countPlayedGames(discordId: int) -> int:
+            return session.scalar(select(func.count())
+                                  .select_from(GameDiscordMapping)
+                                  .where(GameDiscordMapping.discord_id == discordId,
+                                         GameDiscordMapping.currently_playing.is_(True)))
+
+        self.assertEqual(0, countStatistics(failingId))
+        self.assertEqual(0, countPlayedGames(failingId))
+        self.assertNotIn(failingId, GameDiscordService.currentlyPlaying)
+
+        self.assertLess(0, countStatistics(succeedingId))
+        self.assertLess(0, countPlayedGames(succeedingId))
+        self.assertIn(succeedingId, GameDiscordService.currentlyPlaying)
+
+        session.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
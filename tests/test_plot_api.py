@@ -0,0 +1,111 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+from pathlib import Path
+from unittest import mock
+
+from src.Manager import PlotManager
+
+
+def _getPlotName(contentHash: str, plot: str = "top_5_activities") -> str:
+    return f"{plot}-{contentHash * PlotManager.CONTENT_HASH_LENGTH}.png"
+
+
+@unittest.skipUnless(importlib.util.find_spec("fastapi"), "the API needs fastapi")
+class PlotApiTest(unittest.TestCase):
+
+    def setUp(self):
+        from src.API import main
+
+        self.api = main
+        self.directory = tempfile.TemporaryDirectory()
+        self.plots = Path(self.directory.name).joinpath("data/plots")
+        self.plots.mkdir(parents=True)
+
+        for patch in (mock.patch.object(main, "basepath", Path(self.directory.name)),
+                      mock.patch.object(main, "cachedPlots", OrderedDict()),
+                      mock.patch.object(main, "cachedPlotBytes", 0), ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        PlotManager.renderedPlots.clear()
+        self.addCleanup(PlotManager.renderedPlots.clear)
+        self.addCleanup(self.directory.cleanup)
+
+    def _writePlot(self, name: str, content: bytes = b"png", modified: int = 100):
+        path = self.plots.joinpath(name)
+        path.write_bytes(content)
+        os.utime(path, (modified, modified))
+
+    @staticmethod
+    def _getRequest(ifNoneMatch: str | None = None):
+        from fastapi import Request
+
+        headers = [(b"if-none-match", ifNoneMatch.encode())] if ifNoneMatch else []
+
+        return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, })
+
+    def testPlotIsServedWithItsHashAsETag(self):
+        self._writePlot(name := _getPlotName("a"), b"image")
+
+        response = self.api.get_plot(name, self._getRequest())
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b"image", response.body)
+        self.assertEqual(f'"{"a" * PlotManager.CONTENT_HASH_LENGTH}"', response.headers["etag"])
+        self.assertEqual(self.api.PLOT_CACHE_CONTROL, response.headers["cache-control"])
+
+    def testKnownETagIsAnsweredWithoutReadingThePlot(self):
+        eTag = f'"{"a" * PlotManager.CONTENT_HASH_LENGTH}"'
+
+        # the file doesn't even have to exist, the name is the hash of its content
+        for ifNoneMatch in (eTag, f"W/{eTag}", f'"other", {eTag}', "*"):
+            response = self.api.get_plot(_getPlotName("a"), self._getRequest(ifNoneMatch))
+
+            self.assertEqual(304, response.status_code)
+            self.assertEqual(eTag, response.headers["etag"])
+
+        self._writePlot(_getPlotName("a"))
+
+        self.assertEqual(200, self.api.get_plot(_getPlotName("a"), self._getRequest('"other"')).status_code)
+
+    def testInvalidOrMissingPlotsAreNotFound(self):
+        self.assertEqual(404, self.api.get_plot("../parameters.env", self._getRequest()).status_code)
+        self.assertEqual(404, self.api.get_plot(_getPlotName("b"), self._getRequest()).status_code)
+
+    def testLeastRecentlyUsedPlotsAreEvicted(self):
+        names = [_getPlotName(contentHash) for contentHash in "abc"]
+
+        for name in names:
+            self._writePlot(name, b"1234")
+
+        with mock.patch.object(self.api, "PLOT_CACHE_MAX_BYTES", 10):
+            for name in (names[0], names[1], names[0], names[2]):
+                self.assertEqual(b"1234", self.api._getCachedPlot(name))
+
+        self.assertEqual([names[0], names[2]], list(self.api.cachedPlots))
+        self.assertEqual(8, self.api.cachedPlotBytes)
+
+        # served from memory
+        self.plots.joinpath(names[0]).unlink()
+
+        self.assertEqual(b"1234", self.api._getCachedPlot(names[0]))
+
+    def testLegacyLinkServesTheLatestVersion(self):
+        self._writePlot(_getPlotName("a"), b"old", 100)
+        self._writePlot(_getPlotName("b"), b"new", 200)
+
+        response = self.api.get_latest_plot("top_5_activities.png", "123", self._getRequest())
+
+        self.assertEqual(b"new", response.body)
+        self.assertEqual(f'"{"b" * PlotManager.CONTENT_HASH_LENGTH}"', response.headers["etag"])
+        self.assertEqual(self.api.LEGACY_PLOT_CACHE_CONTROL, response.headers["cache-control"])
+
+        self.assertEqual(404, self.api.get_latest_plot("../top_5_activities.png", "123", self._getRequest())
+                         .status_code)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.Manager import PlotManager
+from src.Manager.PlotManager import getLatestPlotFileName
+
+
+class LatestPlotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.plotPath = Path(self.directory.name).joinpath("top_5_activities.png")
+
+        PlotManager.renderedPlots.clear()
+
+    def tearDown(self):
+        self.directory.cleanup()
+        PlotManager.renderedPlots.clear()
+
+    def _writeVersion(self, contentHash: str, modified: int, plot: str = "top_5_activities"):
+        path = self.plotPath.with_name(f"{plot}-{contentHash}.png")
+        path.write_bytes(b"png")
+        os.utime(path, (modified, modified))
+
+    def testLatestVersionOnDiskIsFound(self):
+        self._writeVersion("0" * 16, 100)
+        self._writeVersion("1" * 16, 200)
+        # another plot whose name starts with the name of this one
+        self._writeVersion("2" * 16, 300, "top_5_activities_weekly")
+
+        self.assertEqual(f"top_5_activities-{'1' * 16}.png", getLatestPlotFileName(self.plotPath))
+
+    def testRenderedPlotIsPreferred(self):
+        self._writeVersion("1" * 16, 200)
+        PlotManager.renderedPlots[self.plotPath.name] = ("hash of the data", f"top_5_activities-{'0' * 16}.png")
+
+        self.assertEqual(f"top_5_activities-{'0' * 16}.png", getLatestPlotFileName(self.plotPath))
+
+    def testPlotWithoutVersions(self):
+        self.assertIsNone(getLatestPlotFileName(self.plotPath))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import copy
+import unittest
+from datetime import datetime, timedelta
+
+from tests import DatabaseTestCase
+
+from sqlalchemy import insert, select
+
+from src.DiscordParameters.PresenceParameter import PresenceParameter, PresenceType
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.Presence.Entity.PresenceInterval import PresenceInterval
+from src.Manager.DatabaseManager import getSession
+from src.Manager.PresenceLedgerManager import PresenceLedgerManager
+
+
+class PresenceLedgerTest(DatabaseTestCase):
+    guildArguments = {"memberCount": 10, "channelCount": 2, "maxActivities": 0, "seed": 1, "voiceShare": 0.5, }
+
+    def setUp(self):
+        super().setUp()
+
+        self.member = next(member for member in self.client.get_all_members() if member.voice)
+        self.ledger = PresenceLedgerManager()
+
+        self.session = getSession()
+        self.dcUserDb = self.session.scalars(select(DiscordUser)
+                                             .where(DiscordUser.user_id == str(self.member.id))).one()
+
+    def tearDown(self):
+        self.session.close()
+
+    def _getIntervals(self) -> dict[str, datetime | None]:
+        # type -> ended_at
+        return dict(self.session.execute(select(PresenceInterval.type, PresenceInterval.ended_at)).all())
+
+    def _insertInterval(self, type: PresenceType, creditedUntil: datetime, endedAt: datetime | None):
+        self.session.execute(insert(PresenceInterval).values(discord_id=self.dcUserDb.id,
+                                                             type=type.value,
+                                                             started_at=creditedUntil,
+                                                             ended_at=endedAt,
+                                                             credited_until=creditedUntil, ))
+
+    def testOnlyChangedIntervalsAreOpenedAndClosed(self):
+        notInChannel = copy.copy(self.member.voice)
+        notInChannel.channel = None
+        streaming = copy.copy(self.member.voice)
+        streaming.self_stream = True
+        streaming.self_video = streaming.self_mute = streaming.self_deaf = False
+        notStreaming = copy.copy(streaming)
+        notStreaming.self_stream = False
+
+        self.ledger.recordVoiceStateUpdate(self.dcUserDb, notInChannel, streaming)
+        self.ledger.recordVoiceStateUpdate(self.dcUserDb, streaming, notStreaming)
+
+        # the stream was opened and closed between two flushes, it is inserted closed
+        self.assertTrue(self.ledger.flush(self.session))
+
+        intervals = self._getIntervals()
+
+        self.assertIsNone(intervals[PresenceType.ONLINE.value])
+        self.assertIsNotNone(intervals[PresenceType.STREAM.value])
+
+        self.ledger.recordVoiceStateUpdate(self.dcUserDb, notStreaming, notStreaming)
+
+        self.assertEqual([], self.ledger.pendingIntervals + self.ledger.pendingCloses)
+
+        self.ledger.recordVoiceStateUpdate(self.dcUserDb, notStreaming, notInChannel)
+
+        self.assertTrue(self.ledger.flush(self.session))
+        self.assertIsNotNone(self._getIntervals()[PresenceType.ONLINE.value])
+
+    def testOverlappingWindowsAreCreditedOnce(self):
+        now = datetime.now()
+
+        # streaming with the webcam on counts once
+        self._insertInterval(PresenceType.STREAM, now - timedelta(minutes=10), now - timedelta(minutes=2))
+        self._insertInterval(PresenceType.WEBCAM, now - timedelta(minutes=8), now - timedelta(minutes=4))
+
+        self.assertEqual(8, self.ledger.replayMissedMinutes(self.session, now))
+
+        self.session.refresh(self.dcUserDb)
+        self.assertEqual(8, self.dcUserDb.time_streamed)
+
+    def testReplayedMinutesAreCapped(self):
+        now = datetime.now()
+
+        self._insertInterval(PresenceType.ONLINE, now - timedelta(hours=10), None)
+
+        self.assertEqual(PresenceParameter.MAX_REPLAYED_MINUTES.value,
+                         self.ledger.replayMissedMinutes(self.session, now))
+
+        self.session.refresh(self.dcUserDb)
+        self.assertEqual(PresenceParameter.MAX_REPLAYED_MINUTES.value, self.dcUserDb.time_online)
+
+    def testCurrentMinuteOfOpenIntervalsIsLeftToTheTick(self):
+        now = datetime.now()
+
+        self._insertInterval(PresenceType.ONLINE, now - timedelta(minutes=5), None)
+
+        self.assertEqual(4, self.ledger.replayMissedMinutes(self.session, now))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from tests import AsyncDatabaseTestCase, DatabaseTestCase
+
+from sqlalchemy import select, func
+
+from src.DiscordParameters.QuestParameter import QuestDates
+from src.Entities.Quest.Entity.QuestDiscordMapping import QuestDiscordMapping
+from src.Manager.DatabaseManager import assertStatementBudget, getSession
+from src.Manager.DiscordUserIdManager import DiscordUserIdManager
+from src.Services import QuestService as QuestServiceModule
+from src.Services.QuestService import QuestService, QuestType
+
+
+class InsertNewQuestsTest(DatabaseTestCase):
+
+    def testQuestsAreInsertedForMembersWithoutKnownId(self):
+        self.assertNotIn(self.member.id, DiscordUserIdManager().ids)
+
+        session = getSession()
+
+        self.assertTrue(QuestService.insertNewQuestsForMember(self.member, QuestDates.DAILY, session))
+        self.assertEqual(QuestDates.getQuestAmountForDate(QuestDates.DAILY),
+                         session.scalar(select(func.count()).select_from(QuestDiscordMapping)))
+
+        session.close()
+
+
+class _QuestsOfMemberTest(AsyncDatabaseTestCase):
+    """
+    The member has all quests instead of drawn ones, questsOfType are its online quests of every time
+    """
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+
+        self.service = QuestService(self.client)
+        session = getSession()
+
+        with mock.patch.object(QuestService, "_drawQuestIds", side_effect=lambda questIds, time: questIds):
+            for time in QuestDates:
+                QuestService.insertNewQuestsForMember(self.member, time, session)
+
+        session.close()
+
+        self.quests = QuestService.loadQuestStates(self.member)
+        # days online and the online streak only progress once a day
+        self.questType = QuestType.ONLINE_TIME
+        self.questsOfType = [quest for quest in self.quests if quest.quest.type == self.questType.value]
+
+
+class QuestProgressTest(_QuestsOfMemberTest):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+
+        for quest in self.questsOfType:
+            quest.current_value = quest.quest.value_to_reach - 1
+
+    async def testQuestIsRewardedOnceForConcurrentProgress(self):
+        async def reward(member, quest):
+            # the notification and the boost await the database and discord
+            await asyncio.sleep(0)
+
+        with mock.patch.object(self.service, "_rewardFinishedQuest", side_effect=reward) as rewardFinishedQuest:
+            # jumps over the goal
+            await asyncio.gather(self.service.addProgressToQuest(self.member, self.questType, 5),
+                                 self.service.addProgressToQuest(self.member, self.questType, 5), )
+
+        self.assertEqual(len(self.questsOfType), rewardFinishedQuest.await_count)
+        self.assertEqual({quest.id for quest in self.questsOfType},
+                         {call.args[1].id for call in rewardFinishedQuest.await_args_list})
+
+
+class QuestWriteBehindTest(_QuestsOfMemberTest):
+
+    def _getWrittenValues(self) -> dict[int, int]:
+        session = getSession()
+        values = dict(session.execute(select(QuestDiscordMapping.id, QuestDiscordMapping.current_value)).all())
+        session.close()
+
+        return values
+
+    async def testProgressIsWrittenByTheFlush(self):
+        await self.service.addProgressToQuest(self.member, self.questType, 3)
+
+        self.assertEqual({quest.id for quest in self.questsOfType}, set(QuestServiceModule.dirtyQuests))
+        self.assertEqual({0}, set(self._getWrittenValues().values()))
+
+        # one executemany for all quests
+        with assertStatementBudget(2):
+            self.assertTrue(QuestService.flushQuestProgress())
+
+        values = self._getWrittenValues()
+
+        self.assertEqual({}, QuestServiceModule.dirtyQuests)
+        self.assertTrue(all(values[quest.id] == 3 for quest in self.questsOfType))
+        self.assertEqual(len(self.quests) - len(self.questsOfType), list(values.values()).count(0))
+
+        with assertStatementBudget(0):
+            self.assertTrue(QuestService.flushQuestProgress())
+
+    async def testFailedFlushIsRetried(self):
+        await self.service.addProgressToQuest(self.member, self.questType, 3)
+
+        with mock.patch.object(QuestServiceModule, "getSession", return_value=None):
+            self.assertFalse(QuestService.flushQuestProgress())
+
+        # progress made until the next flush is written with it
+        await self.service.addProgressToQuest(self.member, self.questType, 2)
+
+        self.assertTrue(QuestService.flushQuestProgress())
+
+        values = self._getWrittenValues()
+
+        self.assertTrue(all(values[quest.id] == 5 for quest in self.questsOfType))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from tests import AsyncDatabaseTestCase, resetDatabase
+
+from sqlalchemy import text
+
+from benchmark.FakeDiscord import createGuild
+from src.Manager.DatabaseManager import assertStatementBudget, getEngine
+from src.Manager.MinutelyJobRunner import MinutelyJobRunner
+
+# statements of a minute that don't depend on the amount of members (ledger, one per type of statistic, experience,
+# boost clock, relations, ...)
+MINUTELY_FIXED_STATEMENTS = 21
+# statements per member who is credited in a minute (savepoint, times, commit)
+MINUTELY_STATEMENTS_PER_ACTIVE_MEMBER = 3
+
+
+class MinutelyStatementBudgetTest(AsyncDatabaseTestCase):
+    """
+    The minutely job must not fall back to queries per member and row
+    """
+    # every size gets its own guild
+    guildArguments = None
+
+    async def _assertMinutelyBudget(self, members: int):
+        client = createGuild(members, 5, 2, 1, voiceShare=0.5)
+        resetDatabase(client)
+        runner = MinutelyJobRunner(client)
+
+        # the first minute creates the quests and games of the members
+        await runner.run()
+
+        budget = MINUTELY_FIXED_STATEMENTS + MINUTELY_STATEMENTS_PER_ACTIVE_MEMBER * len(runner.activeMembers)
+
+        with assertStatementBudget(budget, f"minutely with {members} members"):
+            await runner.run()
+
+    async def testSmallGuild(self):
+        await self._assertMinutelyBudget(10)
+
+    async def testLargeGuild(self):
+        await self._assertMinutelyBudget(100)
+
+    def testBudgetIsExceeded(self):
+        with self.assertRaises(AssertionError):
+            with assertStatementBudget(1):
+                with getEngine().connect() as connection:
+                    connection.execute(text("SELECT 1"))
+                    connection.execute(text("SELECT 2"))
+
+
+class StatementTimingTest(unittest.TestCase):
+
+    def testFailingStatementsDontLeakTheirStart(self):
+        with getEngine().connect() as connection:
+            with self.assertRaises(Exception):
+                connection.execute(text("SELECT * FROM missing_table"))
+
+            self.assertEqual({}, connection.info["statementStarts"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+from tests import DatabaseTestCase
+
+from sqlalchemy import func, insert, select
+
+from src.DiscordParameters.StatisticsParameter import StatisticsParameter
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Entities.Statistic.Entity.CurrentDiscordStatistic import CurrentDiscordStatistic
+from src.Entities.Statistic.Entity.StatisticLog import StatisticLog
+from src.Helper.ReadParameters import getParameter
+from src.Manager.DatabaseManager import getSession
+from src.Manager.StatisticManager import StatisticManager
+
+
+class StatisticLogTest(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.statisticManager = StatisticManager(self.client)
+        self.session = getSession()
+        discordIds = self.session.scalars(select(DiscordUser.id)).all()
+        # one active and one inactive member per type, and a weekly statistic that stays untouched
+        self.session.execute(insert(CurrentDiscordStatistic),
+                             [{"discord_id": discordId,
+                               "statistic_type": type,
+                               "statistic_time": StatisticsParameter.DAILY.value,
+                               "value": value, }
+                              for discordId, value in zip(discordIds, [5, 0])
+                              for type in [StatisticsParameter.ONLINE.value, StatisticsParameter.MESSAGE.value]]
+                             + [{"discord_id": discordIds[0],
+                                 "statistic_type": StatisticsParameter.ONLINE.value,
+                                 "statistic_time": StatisticsParameter.WEEKLY.value,
+                                 "value": 7, }])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def _countLoggedRows(self) -> int:
+        return self.session.scalar(select(func.count()).select_from(StatisticLog))
+
+    def _getCurrentValues(self) -> list[int]:
+        return self.session.scalars(select(CurrentDiscordStatistic.value).order_by(CurrentDiscordStatistic.id)).all()
+
+    def testAllValuesAreLogged(self):
+        with self.assertLogs("KVGG_BOT", "DEBUG") as logs:
+            self.statisticManager.saveStatisticsToStatisticLog(StatisticsParameter.DAILY, self.session)
+
+        self.assertTrue(any("saved 4 and reset 4 statistics for time: DAY" in line for line in logs.output))
+        self.assertEqual(4, self._countLoggedRows())
+        self.assertEqual([0, 0, 0, 0, 7], self._getCurrentValues())
+
+    def testZeroValuesAreSkipped(self):
+        with self.assertLogs("KVGG_BOT", "DEBUG") as logs:
+            self.statisticManager.saveStatisticsToStatisticLog(StatisticsParameter.DAILY, self.session, True)
+
+        self.assertTrue(any("saved 2 and reset 2 statistics for time: DAY" in line for line in logs.output))
+        self.assertEqual(2, self._countLoggedRows())
+        self.assertEqual([0, 0, 0, 0, 7], self._getCurrentValues())
+
+        # nobody was active since, that's not an error
+        with self.assertNoLogs("KVGG_BOT", "ERROR"):
+            self.statisticManager.saveStatisticsToStatisticLog(StatisticsParameter.DAILY, self.session, True)
+
+        self.assertEqual(2, self._countLoggedRows())
+
+    def testMidnightJobTakesTheParameter(self):
+        getParameter.cache_clear()
+        self.addCleanup(getParameter.cache_clear)
+
+        with (mock.patch.dict(os.environ, {"SKIP_ZERO_STATISTICS": "1"}),
+              mock.patch.object(self.statisticManager, "sendCurrentServerStatistics"),
+              mock.patch.object(self.statisticManager, "runRetrospectForUsers"),
+              mock.patch.object(self.statisticManager, "saveStatisticsToStatisticLog") as saveStatistics):
+            asyncio.run(self.statisticManager.midnightJob())
+
+        self.assertTrue(all(call.args[2] is True for call in saveStatistics.call_args_list))
+        self.assertEqual(StatisticsParameter.DAILY, saveStatistics.call_args_list[0].args[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
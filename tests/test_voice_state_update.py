@@ -0,0 +1,65 @@
+import copy
+import unittest
+
+from tests import AsyncDatabaseTestCase
+
+from sqlalchemy import select
+
+from src.Entities.DiscordUser.Entity.DiscordUser import DiscordUser
+from src.Manager.DatabaseManager import getSession
+from src.Manager.MemberProfileManager import MemberProfileManager
+from src.Manager.VoiceStateUpdateManager import VoiceStateUpdateService
+
+
+class VoiceStateUpdateTest(AsyncDatabaseTestCase):
+    guildArguments = {"memberCount": 10, "channelCount": 2, "maxActivities": 0, "seed": 1, "voiceShare": 0.5, }
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+
+        self.member = next(member for member in self.client.get_all_members() if member.voice)
+        self.inChannel = self.member.voice
+        self.notInChannel = copy.copy(self.inChannel)
+        self.notInChannel.channel = None
+
+        self.service = VoiceStateUpdateService(self.client)
+
+    def _getDiscordUser(self) -> DiscordUser:
+        session = getSession()
+        # noinspection PyTypeChecker
+        dcUserDb = session.scalars(select(DiscordUser).where(DiscordUser.user_id == str(self.member.id))).one()
+        session.close()
+
+        return dcUserDb
+
+    async def testLeavingAndJoiningIsWritten(self):
+        await self.service.handleVoiceStateUpdate(self.member, self.inChannel, self.notInChannel)
+
+        dcUserDb = self._getDiscordUser()
+
+        self.assertIsNone(dcUserDb.channel_id)
+        self.assertIsNotNone(dcUserDb.last_online)
+
+        await self.service.handleVoiceStateUpdate(self.member, self.notInChannel, self.inChannel)
+
+        dcUserDb = self._getDiscordUser()
+
+        self.assertEqual(str(self.inChannel.channel.id), dcUserDb.channel_id)
+        self.assertIsNotNone(dcUserDb.joined_at)
+
+    async def testJoiningAndLeavingInvalidatesTheProfile(self):
+        for voiceStateBefore, voiceStateAfter in ((self.inChannel, self.notInChannel),
+                                                  (self.notInChannel, self.inChannel),):
+            session = getSession()
+            MemberProfileManager().getProfile(self.member, session)
+            session.close()
+
+            self.assertIn(self.member.id, MemberProfileManager().profiles)
+
+            await self.service.handleVoiceStateUpdate(self.member, voiceStateBefore, voiceStateAfter)
+
+            self.assertNotIn(self.member.id, MemberProfileManager().profiles)
+
+
+if __name__ == "__main__":
+    unittest.main()